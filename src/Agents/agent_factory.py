@@ -0,0 +1,127 @@
+####################################################################
+# Per-session Agent Factory
+#
+# Builds the twelve agents for one student session. Prompts and
+# descriptions are class attributes and the LLM client handles come
+# from the shared ClientPool, so a session only allocates its
+# conversation state: message histories, context windows, reply
+# function lists and usage counters.
+#
+# memory_report() estimates what one session's agents hold beyond the
+# shared parts, by walking the agents' object graph and skipping
+# everything shared between sessions: the process-wide services and
+# the session's manager and GUI, which are not agent state. It walks
+# every object, so it runs on request (dashboard, simulation report),
+# not when a session starts.
+#####################################################################
+import sys
+import types
+from typing import Dict, Iterable, Optional
+
+from src.Models import client_pool
+from src.Models.conversation_store import ConversationStore
+from src.Models.event_loop import BlockingPool, LoopLagMonitor
+from src.Models.llm_cache import LLMResponseCache
+from src.Models.llm_scheduler import LLMScheduler
+from src.Models.mock_llm import CassetteRecorder, MockBackend
+from src.Models.model_router import ModelRouter
+from src.Models.persistence_worker import PersistenceWorker
+from .fsm_engine import TransitionTimer
+from .student_agent import StudentAgent
+from .knowledge_tracer_agent import KnowledgeTracerAgent
+from .teacher_agent import TeacherAgent
+from .tutor_agent import TutorAgent
+from .problem_generator_agent import ProblemGeneratorAgent
+from .solution_verifier_agent import SolutionVerifierAgent
+from .programmer_agent import ProgrammerAgent
+from .code_runner_agent import CodeRunnerAgent
+from .learner_model_agent import LearnerModelAgent
+from .level_adapter_agent import LevelAdapterAgent
+from .motivator_agent import MotivatorAgent
+from .gamification_agent import GamificationAgent
+
+
+# agents_dict key -> (class, constructor kwargs)
+AGENT_SPECS = {
+    "student": (StudentAgent, {}),
+    "knowledge_tracer": (KnowledgeTracerAgent, {}),
+    "teacher": (TeacherAgent, {}),
+    "tutor": (TutorAgent, {}),
+    "problem_generator": (ProblemGeneratorAgent, {}),
+    "solution_verifier": (SolutionVerifierAgent, {}),
+    "programmer": (ProgrammerAgent, {}),
+    "code_runner": (CodeRunnerAgent, {}),
+    "learner_model": (LearnerModelAgent, {}),
+    "level_adapter": (LevelAdapterAgent, {}),
+    "motivator": (MotivatorAgent, {}),
+    "gamification": (GamificationAgent, {"name": "GamificationAgent"}),
+}
+
+# Not owned by a session: code, classes and modules, and the process-wide services every session uses
+SHARED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+                CassetteRecorder, ConversationStore, BlockingPool, LoopLagMonitor, LLMResponseCache, LLMScheduler, MockBackend,
+                ModelRouter, PersistenceWorker, TransitionTimer)
+
+# Agent attributes pointing at the session's manager and GUI
+SESSION_LINKS = ("groupchat_manager", "reactive_chat")
+
+
+def deep_size(obj, seen: set) -> int:
+    '''
+        Bytes reachable from obj that are not already in seen. seen is updated.
+    '''
+    size = 0
+    pending = [obj]
+    while pending:
+        current = pending.pop()
+        if id(current) in seen or isinstance(current, SHARED_TYPES):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current, 0)
+        if isinstance(current, dict):
+            pending.extend(current.keys())
+            pending.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            pending.extend(current)
+        elif hasattr(current, "__dict__"):
+            pending.append(vars(current))
+    return size
+
+
+class AgentFactory:
+    def __init__(self, specs: Optional[Dict] = None):
+        self.specs = AGENT_SPECS if specs is None else specs
+
+    def create(self) -> Dict:
+        return {key: cls(**kwargs) for key, (cls, kwargs) in self.specs.items()}
+
+    def shared_objects(self) -> list:
+        # Prompts, descriptions and other class attributes, plus the pooled client handles
+        shared = list(client_pool.get_client_pool().shared_objects())
+        for cls, _ in self.specs.values():
+            for klass in cls.__mro__:
+                shared.extend(vars(klass).values())
+        return shared
+
+    def memory_report(self, agents_dict: Dict, exclude: Iterable = ()) -> Dict[str, int]:
+        '''
+            Bytes per agent owned by this session. The agents' groupchat manager and GUI are not
+            counted. exclude: other objects the agents point to that should not be counted.
+        '''
+        seen = {id(obj) for obj in self.shared_objects()}
+        seen.update(id(obj) for obj in exclude)
+        seen.update(id(getattr(agent, link, None)) for agent in agents_dict.values() for link in SESSION_LINKS)
+        # The agents reference each other through the groupchat, so each is counted once
+        seen.update(id(agent) for agent in agents_dict.values())
+        report = {}
+        for key, agent in agents_dict.items():
+            seen.discard(id(agent))
+            report[key] = deep_size(agent, seen)
+        report["total"] = sum(report.values())
+        return report
+
+
+_agent_factory = AgentFactory()
+
+def get_agent_factory() -> AgentFactory:
+    return _agent_factory
@@ -1,5 +1,6 @@
 import autogen
 import os
+from typing import Dict
 from .base_agent import MyBaseAgent
 from .conversable_agent import MyConversableAgent
 from .student_agent import StudentAgent
@@ -14,13 +15,24 @@ from .learner_model_agent import LearnerModelAgent
 from .level_adapter_agent import LevelAdapterAgent
 from .motivator_agent import MotivatorAgent
 from .gamification_agent import GamificationAgent
+from .agent_factory import get_agent_factory
 
 from src.Models.llm_config import gpt3_config
 
 
 os.environ["AUTOGEN_USE_DOCKER"] = "False"
 
-# Agents
+
+def create_agents() -> Dict:
+    '''
+        A fresh set of agents for one student session. Agents keep their conversation
+        history, so sessions must never share them. Prompts and client handles are shared.
+    '''
+    return get_agent_factory().create()
+
+
+# Agents shared by the console and Deprecated UIs, which serve a single student.
+# The Panel apps create their own per session with create_agents().
 student = StudentAgent()
 knowledge_tracer = KnowledgeTracerAgent()
 teacher = TeacherAgent()
@@ -45,71 +45,202 @@
     # Tutor: Ask the student if they want more test questions
     # Teacher: Start the next lesson at the Student's request
 
-from typing import Dict
+import re
+from typing import Dict, Optional
 from src.KnowledgeGraphs.math_graph import KnowledgeGraph
 import src.KnowledgeGraphs.math_taxonomy as mt
+from src.Agents.concurrent_states import ConcurrentStates
+from src.Agents.problem_prefetcher import ProblemPrefetcher
+from src.Agents.fsm_engine import compile_flow, FSMEngine, get_transition_timer
+from src.Models.event_bus import MasteryUpdated, StateChanged
+from src.Models.event_loop import run_blocking
 
 
-class FSM:
+# States after VerifyingAnswer, in the order their replies are merged into the groupchat,
+# and the states each one needs replies from. The rest only need the verified answer.
+POST_VERIFICATION_STATES = {
+    "VisualizingAnswer": "programmer",
+    "RunningCode": "code_runner",
+    "UpdatingModel": "learner_model",
+    "AdaptingLevel": "level_adapter",
+    "Motivating": "motivator",
+}
+POST_VERIFICATION_DEPENDENCIES = {
+    "RunningCode": ["VisualizingAnswer"],
+    "AdaptingLevel": ["UpdatingModel"],
+}
+
+# Each state: the agent that speaks, the state that follows, and the FSM method run before speaking
+LESSON_FLOW = compile_flow("Lesson", {
+    "initial": "AwaitingTopic",
+    "states": {
+        "AwaitingTopic":     {"speaker": "teacher",           "next": "PresentingLesson", "action": "choose_topic"},
+        "PresentingLesson":  {"speaker": "tutor",             "next": "AwaitingProblem"},
+        "AwaitingProblem":   {"speaker": "problem_generator", "next": "AwaitingAnswer"},
+        "AwaitingAnswer":    {"speaker": "student",           "next": "VerifyingAnswer"},
+        "VerifyingAnswer":   {"speaker": "solution_verifier", "next": "VisualizingAnswer"},
+        "VisualizingAnswer": {"speaker": "programmer",        "next": "RunningCode", "action": "start_concurrent_states"},
+        "RunningCode":       {"speaker": "code_runner",       "next": "UpdatingModel"},
+        "UpdatingModel":     {"speaker": "learner_model",     "next": "AdaptingLevel"},
+        "AdaptingLevel":     {"speaker": "level_adapter",     "next": "Motivating"},
+        "Motivating":        {"speaker": "motivator",         "next": "PresentingLesson"},  #TODO: Need more complicated state machine
+    },
+})
+
+CONSOLE_TRACER_FLOW = compile_flow("Console Tracer", {
+    "initial": "Initial",
+    "states": {
+        "Initial":            {"speaker": "knowledge_tracer",  "next": "GenerateQuestion",   "action": "announce_topic"},
+        "GenerateQuestion":   {"speaker": "problem_generator", "next": "AwaitStudentAnswer", "action": "request_problem"},
+        "AwaitStudentAnswer": {"speaker": "solution_verifier", "next": "VerifySolution",     "action": "read_student_answer"},
+        "VerifySolution":     {"speaker": "knowledge_tracer",  "next": "AdaptLevel",         "action": "verify_answer"},
+        "AdaptLevel":         {"speaker": "knowledge_tracer",  "next": "GenerateQuestion",   "action": "adapt_level"},
+    },
+})
+
+GUI_TRACER_FLOW = compile_flow("Graph Tracer", {
+    "initial": "InitialDelayed",
+    "states": {
+        "InitialDelayed":     {"speaker": "knowledge_tracer",  "next": "Initial"},
+        "Initial":            {"speaker": "knowledge_tracer",  "next": "SelectTopic",        "action": "share_topic"},
+        "SelectTopic":        {"speaker": "problem_generator", "next": "GenerateQuestion"},
+        "GenerateQuestion":   {"speaker": "student",           "next": "AwaitStudentAnswer", "action": "prefetch_next_problem"},
+        "AwaitStudentAnswer": {"speaker": "solution_verifier", "next": "VerifySolution"},
+        "VerifySolution":     {"speaker": "knowledge_tracer",  "next": "AdaptLevel",         "action": "read_verdict"},
+        "AdaptLevel":         {"speaker": "problem_generator", "next": "GenerateQuestion",   "action": "adapt_level"},
+    },
+})
+
+
+def flatten_topics(topics: Dict) -> Dict[int, str]:
+    # Replace the subsubsub_topics "key" with an integer denoting level of difficulty
+    # Each dictionary value is a list. Flatten it and increment the key
+    # TODO: Update this code in graph_builder.py
+    kg = {}
+    i = 0  # Start with a counter at 0
+    for key, value_list in topics.items():
+        for value in value_list:
+            kg[i] = value
+            i += 1
+    return kg
+
+
+def starting_skill_level(kg: Dict[int, str], prefix: str = "Algebra") -> int:
+    # pick a graph edge - start with Algebra
+    for key, value in kg.items():
+        if value.startswith(prefix):
+            return key
+    return 0
+
+
+# Read-only, shared by every session
+TOPICS_BY_LEVEL = flatten_topics(mt.subsubsub_topics)
+
+
+def topic_labels() -> Dict[str, str]:
+    # Every taxonomy node with the name a student would use for it. Longest names first, so
+    # "permutations with repetition" is not read as "permutations", and for names used on several
+    # levels the most general node first.
+    levels = [list(mt.topics_and_subtopics)] + [[name for names in topics.values() for name in names]
+                                                for topics in (mt.topics_and_subtopics, mt.subsub_topics, mt.subsubsub_topics)]
+    labels = {name: name.rsplit('->', 1)[-1].replace('_', ' ').lower() for level in levels for name in level}
+    return dict(sorted(labels.items(), key=lambda item: -len(item[1])))
+
+TOPIC_LABELS = topic_labels()
+
+
+def topic_from_text(text: str) -> Optional[str]:
+    # The taxonomy node the student named ("I want to learn about quadratic equations"), if any
+    text = (text or "").replace('_', ' ').lower()
+    for name, label in TOPIC_LABELS.items():
+        if re.search(rf"\b{re.escape(label)}\b", text):
+            return name
+    return None
+
+
+class FlowFSM:
+    '''
+        Base for FSMs run by an FSMEngine. current_state and last_transition are read by the
+        agents (to tag LLM metrics) and can be set to resume a session.
+    '''
+    def start_engine(self, flow, agents: Dict):
+        self.engine = FSMEngine(flow, agents, self, hooks=[get_transition_timer().record])
+
+    @property
+    def current_state(self) -> str:
+        return self.engine.current_state
+
+    @current_state.setter
+    def current_state(self, state: str) -> None:
+        self.engine.current_state = state
+
+    @property
+    def last_transition(self):
+        return self.engine.last_transition
+
+    @property
+    def current_topic(self):
+        # The taxonomy node being worked on, if the flow tracks one
+        return None
+
+    async def a_step(self, groupchat=None):
+        # Speaker selection runs on the event loop every session shares. Actions must not block it.
+        previous = self.current_state
+        speaker = await self.engine.a_step(groupchat)
+        self.publish(StateChanged(self.engine.flow.name, previous, self.current_state))
+        return speaker
+
+    def publish(self, event):
+        # To the session's event bus. The console flow has no session.
+        manager = getattr(self, "groupchat_manager", None)
+        if manager is not None:
+            manager.events.publish(event)
+
+    def cancel_background(self):
+        # Work started ahead of the FSM reaching it (see FSM and FSMGraphTracerGUI)
+        pass
+
+
+class FSM(FlowFSM):
     def __init__(self, agents: Dict):
         self.agents = agents
-        self.current_state = "AwaitingTopic"
+        self.groupchat_manager = None
+        self.topic = None  # the taxonomy node the student asked for, if it names one
+        self.concurrent_states = ConcurrentStates({state: agents[name] for state, name in POST_VERIFICATION_STATES.items()},
+                                                  POST_VERIFICATION_DEPENDENCIES)
+        self.start_engine(LESSON_FLOW, agents)
         
     
-    def next_speaker_selector(self, last_speaker, groupchat):
+    async def next_speaker_selector(self, last_speaker, groupchat):
         print(f"Current state: {self.current_state}") 
+        speaker = await self.a_step(groupchat)
+        self.concurrent_states.launch_ready()
+        return speaker
 
-        if self.current_state == "AwaitingTopic":
-            self.current_state = "PresentingLesson"
-            return self.agents["teacher"]
-        
-        elif self.current_state == "PresentingLesson":
-            self.current_state = "AwaitingProblem"
-            return self.agents["tutor"]
-        
-        elif self.current_state == "AwaitingProblem":
-            self.current_state = "AwaitingAnswer"
-            return self.agents["problem_generator"]
-        
-        elif self.current_state == "AwaitingAnswer":
-            self.current_state = "VerifyingAnswer"
-            return self.agents["student"]
-        
-        elif self.current_state == "VerifyingAnswer":
-            self.current_state = "VisualizingAnswer"
-            return self.agents["solution_verifier"]
-        
-        elif self.current_state == "VisualizingAnswer":
-            self.current_state = "RunningCode"
-            return self.agents["programmer"]
-        
-        elif self.current_state == "RunningCode":
-            self.current_state = "UpdatingModel"
-            return self.agents["code_runner"]
-        
-        elif self.current_state == "UpdatingModel":
-            self.current_state = "AdaptingLevel"
-            return self.agents["learner_model"]
-        
-        elif self.current_state == "AdaptingLevel":
-            self.current_state = "Motivating"
-            return self.agents["level_adapter"]
-        
-        elif self.current_state == "Motivating":
-            self.current_state = "PresentingLesson" #TODO: Need more complicated state machine
-            return self.agents["motivator"]
-                
-        else:  # Default to tutor for managing other cases
-            print("state not found. Defaulting to Tutor")
-            return self.agents["tutor"]
+    @property
+    def current_topic(self):
+        return self.topic
+
+    def choose_topic(self, groupchat):
+        # The student just answered "What areas of math are you interested in?"
+        topic = topic_from_text(groupchat.messages[-1].get("content")) if groupchat and groupchat.messages else None
+        if topic is not None:
+            self.topic = topic
+            self.publish(MasteryUpdated(topic, None, None))
+
+    def start_concurrent_states(self, groupchat):
+        # The answer is verified. Start every post-verification state whose inputs are ready.
+        self.concurrent_states.start(self.groupchat_manager)
+
+    def cancel_background(self):
+        self.concurrent_states.cancel()
         
 
-class FSMGraphTracerConsole:
+class KnowledgeTracerFSM(FlowFSM):
     def __init__(self, agents: Dict):
         self.agents = agents
-        self.current_state = "Initial"
-        
-        # Enumberate the agents just to make less typing
+
+        # Enumerate the agents just to make less typing
         self.student = self.agents["student"]
         self.knowledge_tracer = self.agents["knowledge_tracer"]
         self.problem_generator = self.agents["problem_generator"]
@@ -119,174 +250,106 @@ class FSMGraphTracerConsole:
         # self.node_name = None
         # self.kg =   KnowledgeGraph()
         # self.kg.build_dag_from_dict(mt.subsubsub_topics)
+        self.kg = TOPICS_BY_LEVEL
+        self.skill_level = starting_skill_level(self.kg)
+        self.was_correct = False
 
-        # Replace the subsubsub_topics "key" with an integer denoting level of difficulty
-        # Each dictionary value is a list. Flatten it and increment the key
-        # TODO: Update this code in graph_builder.py
-        self.skill_level = 0
-        self.kg = {}
-        i = 0  # Start with a counter at 0
-        for key, value_list in mt.subsubsub_topics.items():
-            for value in value_list:
-                self.kg[i] = value  
-                i += 1 
-        
-        # pick a graph edge - start with Algebra
-        for key, value in self.kg.items():
-            if value.startswith("Algebra"):
-                self.skill_level = key
-                break
-            else:
-                self.skill_level = 0 
+    @property
+    def current_topic(self):
+        return self.kg.get(self.skill_level)
 
-    
-    def next_speaker_selector(self):
+
+class FSMGraphTracerConsole(KnowledgeTracerFSM):
+    def __init__(self, agents: Dict):
+        super().__init__(agents)
+        self.start_engine(CONSOLE_TRACER_FLOW, agents)
+
+    async def next_speaker_selector(self):
         print(f"Current state: {self.current_state}") 
+        return await self.a_step()
 
-        if self.current_state == "Initial":
-            # pick a graph edge
-            
-            # print(self.node_name)
-            self.knowledge_tracer.send(f"I will begin to test you on {self.kg[self.skill_level]}", recipient=self.student, request_reply=False, silent=False)
-            self.current_state = "GenerateQuestion"
-            return self.knowledge_tracer
-        
-        if self.current_state == "GenerateQuestion":
-           self.knowledge_tracer.send(f"Please generate a very easy question for the student on {self.kg[self.skill_level]}", recipient=self.problem_generator, request_reply=True)
-           self.pg_response = self.problem_generator.last_message()["content"]
-           #print("pg_response=  ", self.pg_response)
-           
-           self.current_state = "AwaitStudentAnswer"
-           return self.problem_generator
-        
-        if self.current_state == "AwaitStudentAnswer":
-            self.student_response = input()
-            self.current_state = "VerifySolution"
-            return self.solution_verifier
-        
-        if self.current_state == "VerifySolution":
-            self.knowledge_tracer.send(f"{self.student_response} is the Students response to {self.pg_response}. Is the Student's answer correct? Answer yes or no", recipient=self.solution_verifier, request_reply=True)
-            self.verifier_answer = self.solution_verifier.last_message()["content"]
-            self.was_correct = True if "Yes" in self.verifier_answer else False            
-            self.current_state = "AdaptLevel"
-            return self.knowledge_tracer
-        
-        if self.current_state == "AdaptLevel":
-            if self.was_correct:
-                self.skill_level += 1
-                print("The next topic is", self.kg[self.skill_level])
-            else:
-                print("Better to practice a little more")
-            self.current_state = "GenerateQuestion"
-            return self.knowledge_tracer
-        
+    async def announce_topic(self, groupchat=None):
+        # print(self.node_name)
+        await self.knowledge_tracer.a_send(f"I will begin to test you on {self.kg[self.skill_level]}", recipient=self.student, request_reply=False, silent=False)
+
+    async def request_problem(self, groupchat=None):
+        await self.knowledge_tracer.a_send(f"Please generate a very easy question for the student on {self.kg[self.skill_level]}", recipient=self.problem_generator, request_reply=True)
+        self.pg_response = self.problem_generator.last_message()["content"]
+        #print("pg_response=  ", self.pg_response)
+
+    async def read_student_answer(self, groupchat=None):
+        self.student_response = await run_blocking(input)
 
+    async def verify_answer(self, groupchat=None):
+        await self.knowledge_tracer.a_send(f"{self.student_response} is the Students response to {self.pg_response}. Is the Student's answer correct? Answer yes or no", recipient=self.solution_verifier, request_reply=True)
+        self.verifier_answer = self.solution_verifier.last_message()["content"]
+        self.was_correct = True if "Yes" in self.verifier_answer else False            
+
+    def adapt_level(self, groupchat=None):
+        if self.was_correct:
+            self.skill_level += 1
+            print("The next topic is", self.kg[self.skill_level])
         else:
-            return None
+            print("Better to practice a little more")
+
 
-class FSMGraphTracerGUI:
+class FSMGraphTracerGUI(KnowledgeTracerFSM):
     def __init__(self, agents: Dict):
-        self.agents = agents
+        super().__init__(agents)
         self.groupchat_manager = None
         self.reactive_chat = None
-        self.current_state = "InitialDelayed"
-        
-        # Enumerate the agents just to make less typing
-        self.student = self.agents["student"]
-        self.knowledge_tracer = self.agents["knowledge_tracer"]
-        self.problem_generator = self.agents["problem_generator"]
-        self.solution_verifier = self.agents["solution_verifier"]
 
-        # Build knowledge graph
-        # self.node_name = None
-        # self.kg =   KnowledgeGraph()
-        # self.kg.build_dag_from_dict(mt.subsubsub_topics)
+        # Generates the next problem while the student is answering
+        self.problem_prefetcher = ProblemPrefetcher(self.problem_generator)
+        self.start_engine(GUI_TRACER_FLOW, agents)
 
-        # Replace the subsubsub_topics "key" with an integer denoting level of difficulty
-        # Each dictionary value is a list. Flatten it and increment the key
-        # TODO: Update this code in graph_builder.py
-        self.skill_level = 0
-        self.kg = {}
-        i = 0  # Start with a counter at 0
-        for key, value_list in mt.subsubsub_topics.items():
-            for value in value_list:
-                self.kg[i] = value  
-                i += 1 
+    def problem_request(self, skill_level):
+        # Must be built the same way when prefetching and when taking the prefetched problem
+        return {
+            'content': f"ProblemGeneratorAgent, please generate a very easy question on {self.kg[skill_level]}. It will be for a high school student.",
+            'role': 'user',
+            'name': self.knowledge_tracer.name
+        }
 
-        # pick a graph edge - start with Algebra
-        for key, value in self.kg.items():
-            if value.startswith("Algebra"):
-                self.skill_level = key
-                break
-            else:
-                self.skill_level = 0 
+    async def next_speaker_selector(self, lastspeaker, groupchat):
+        print(f"GRAPH Speaker Selector Current state: {self.current_state}") 
+        return await self.a_step(groupchat)
 
+    def cancel_background(self):
+        self.problem_prefetcher.cancel()
 
+    async def share_topic(self, groupchat):
+        message = {
+            'content': f"The student has been working on {self.kg[self.skill_level]}",
+            'role': 'user',  # or another role as required
+            'name': self.knowledge_tracer.name
+        }
+        await self.problem_generator.a_send(message, recipient=self.problem_generator, request_reply=False, silent=True)
+        # Only shares the topic. The ProblemGeneratorAgent replies when the FSM selects it (SelectTopic).
+        await self.problem_generator.a_send(message, self.groupchat_manager, request_reply=False)
+        #self.reactive_chat.update_graph_tab(recipient=self.groupchat_manager, messages=message,
+        #                                    sender=self.problem_generator, config=None)
+        groupchat.append(message, self.knowledge_tracer)
 
-    
-    def next_speaker_selector(self, lastspeaker, groupchat):
-        print(f"GRAPH Speaker Selector Current state: {self.current_state}") 
+    def prefetch_next_problem(self, groupchat):
+        # While the student answers, prepare the next problem for either verdict
+        branches = {"incorrect": self.problem_request(self.skill_level)}
+        if self.skill_level + 1 in self.kg:
+            branches["correct"] = self.problem_request(self.skill_level + 1)
+        self.problem_prefetcher.start(self.groupchat_manager, branches)
 
-        if self.current_state == "InitialDelayed":
-            self.current_state = "Initial"
-            return self.knowledge_tracer        
-        
-        elif self.current_state == "Initial":
-            message = {
-                'content': f"The student has been working on {self.kg[self.skill_level]}",
-                'role': 'user',  # or another role as required
-                'name': self.knowledge_tracer.name
-            }
-            self.problem_generator.send(message, recipient=self.problem_generator, request_reply=False, silent=True)
-            self.problem_generator.send(message, self.groupchat_manager)
-            #self.reactive_chat.update_graph_tab(recipient=self.groupchat_manager, messages=message,
-            #                                    sender=self.problem_generator, config=None)
-            groupchat.append(message, self.knowledge_tracer)
-            self.current_state = "SelectTopic"
-            return self.knowledge_tracer
-        
-        elif self.current_state == "SelectTopic":
-           message = {
-                'content': f"ProblemGeneratorAgent, please generate a very easy question on {self.kg[self.skill_level]}. It will be for a high school student.",
-                'role': 'user',  # or another role as required
-                'name': self.knowledge_tracer.name
-            }
-           #self.knowledge_tracer.send(message, recipient=self.problem_generator, request_reply=True)
-           #groupchat.append(message, self.knowledge_tracer)
-           #self.pg_response = self.problem_generator.last_message(agent=self.knowledge_tracer)["content"]
-           #groupchat.append(self.pg_response, self.problem_generator)
-           #print("pg_response=  ", self.pg_response)          
-           self.current_state = "GenerateQuestion"
-           return self.problem_generator
-        
-        elif self.current_state == "GenerateQuestion":
-           #self.pg_response = self.problem_generator.last_message(agent=self.problem_generator)["content"]
-           #groupchat.append(self.pg_response, self.problem_generator)
-           #print("pg_response=  ", self.pg_response)          
-           self.current_state = "AwaitStudentAnswer"
-           return self.student
-           
-        elif self.current_state == "AwaitStudentAnswer":
-            #self.student_response = input()
-            self.current_state = "VerifySolution"
-            return self.solution_verifier
-        
-        elif self.current_state == "VerifySolution":
-            #self.knowledge_tracer.send(f"{self.student_response} is the Students response to {self.pg_response}. Is the Student's answer correct? Answer yes or no", recipient=self.solution_verifier, request_reply=True)
-            #self.verifier_answer = self.solution_verifier.last_message()["content"]
-            #self.was_correct = True if "Yes" in self.verifier_answer else False            
-            self.current_state = "AdaptLevel"
-            return self.knowledge_tracer
-        
-        elif self.current_state == "AdaptLevel":
-            if self.was_correct:
-                self.skill_level += 1
-                print("The next topic is", self.kg[self.skill_level])
-            else:
-                print("Better to practice a little more")
-            self.current_state = "GenerateQuestion"
-            return self.knowledge_tracer
-        
+    def read_verdict(self, groupchat):
+        self.verifier_answer = (groupchat.messages[-1].get("content") or "") if groupchat.messages else ""
+        self.was_correct = True if "Yes" in self.verifier_answer else False
 
+    def adapt_level(self, groupchat):
+        if self.was_correct and self.skill_level + 1 in self.kg:
+            self.skill_level += 1
+            print("The next topic is", self.kg[self.skill_level])
         else:
-            return None
\ No newline at end of file
+            print("Better to practice a little more")
+        self.publish(MasteryUpdated(self.current_topic, self.skill_level, self.was_correct))
+        branch = "correct" if self.was_correct else "incorrect"
+        message = self.problem_request(self.skill_level)
+        groupchat.append(message, self.knowledge_tracer)
+        self.problem_generator.pending_reply = self.problem_prefetcher.take(branch, self.groupchat_manager, message)
@@ -0,0 +1,91 @@
+####################################################################
+# Concurrent FSM States
+#
+# After the answer is verified, several FSM states do not depend on
+# each other (e.g. MotivatorAgent does not need the ProgrammerAgent's
+# plot). Each state declares the states it depends on. As soon as a
+# state's dependencies have replied, its agent starts generating in
+# the background. The FSM still selects speakers in the original fixed
+# order, and each selected agent returns its precomputed reply, so the
+# groupchat history keeps the same order as the serial flow.
+#####################################################################
+import asyncio
+from typing import Dict, List, Optional
+
+
+class ConcurrentStates:
+    def __init__(self, state_agents: Dict, dependencies: Dict[str, List[str]]):
+        '''
+            state_agents: state name -> agent, in the order replies are merged into the groupchat
+            dependencies: state name -> states whose replies it needs. States not listed only
+                          need the conversation as it was when start() was called.
+        '''
+        self.state_agents = state_agents
+        self.dependencies = dependencies
+        self.sender = None
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    def start(self, sender) -> None:
+        '''
+            Begin a new round of concurrent states. sender is the groupchat manager.
+        '''
+        self.cancel()
+        if sender is None:
+            return  # No manager, nothing to reply to. The FSM runs the states serially.
+        self.sender = sender
+        self.launch_ready()
+
+    def _ordered_dependencies(self, state: str) -> List[str]:
+        # Transitive dependencies, in merge order
+        needed = set()
+        pending = list(self.dependencies.get(state, []))
+        while pending:
+            dependency = pending.pop()
+            if dependency not in needed:
+                needed.add(dependency)
+                pending.extend(self.dependencies.get(dependency, []))
+        return [s for s in self.state_agents if s in needed]
+
+    def _output(self, state: str) -> Optional[str]:
+        task = self.tasks.get(state)
+        if task is None or not task.done() or task.cancelled() or task.exception() is not None:
+            return None
+        reply = task.result()
+        if isinstance(reply, dict):
+            reply = reply.get("content")
+        return reply
+
+    def launch_ready(self) -> None:
+        if self.sender is None:
+            return
+        for state, agent in self.state_agents.items():
+            if state in self.tasks:
+                continue
+            dependencies = self._ordered_dependencies(state)
+            if not all(d in self.tasks and self.tasks[d].done() for d in dependencies):
+                continue
+
+            # The agent's own view of the conversation, plus the replies it depends on that
+            # have not been merged into the groupchat yet
+            messages = list(agent.chat_messages.get(self.sender, []))
+            recent_contents = [m.get("content") for m in messages[-len(self.state_agents):]]
+            for dependency in dependencies:
+                output = self._output(dependency)
+                if output and output not in recent_contents:
+                    messages.append({"content": output, "role": "user", "name": self.state_agents[dependency].name})
+
+            task = asyncio.ensure_future(agent.a_generate_reply_in_background(messages=messages, sender=self.sender))
+            task.add_done_callback(lambda _: self.launch_ready())
+            agent.pending_reply = task
+            self.tasks[state] = task
+            print(f"Started {state} ({agent.name}) concurrently")
+
+    def cancel(self) -> None:
+        for state, task in self.tasks.items():
+            if not task.done():
+                task.cancel()
+            agent = self.state_agents[state]
+            if agent.pending_reply is task:
+                agent.pending_reply = None
+        self.tasks = {}
+        self.sender = None
@@ -0,0 +1,173 @@
+####################################################################
+# Context Window
+#
+# Keeps the prompt of each agent within a per-role token budget.
+# The most recent messages are sent verbatim. Older messages are
+# folded into a running summary that is extended incrementally as
+# messages fall out of the window, never rebuilt from scratch.
+#
+# Registered on every MyConversableAgent as an autogen
+# "process_all_messages_before_reply" hook, so the stored history
+# (groupchat.messages, agent.chat_messages) is left untouched. The
+# hook runs on the event loop, so the agent counts the tokens of new
+# messages on the blocking pool first (a_count_tokens). Counts are
+# cached by message fingerprint: the last message of a prompt is not
+# always the one stored at that position (prefetch instructions,
+# replies of concurrent states).
+#####################################################################
+import hashlib
+from typing import Callable, Dict, List, Optional
+
+from src.Models.event_loop import run_blocking
+
+
+# Prompt budget in tokens for the conversation history of each agent (system message excluded)
+ROLE_TOKEN_BUDGETS = {
+    "TeacherAgent": 3000,
+    "TutorAgent": 3000,
+    "KnowledgeTracerAgent": 2000,
+    "ProblemGeneratorAgent": 2000,
+    "SolutionVerifierAgent": 1500,
+    "ProgrammerAgent": 1500,
+    "CodeRunnerAgent": 1000,
+    "LearnerModelAgent": 4000,
+    "LevelAdapterAgent": 1500,
+    "MotivatorAgent": 800,
+    "GamificationAgent": 800,
+}
+DEFAULT_TOKEN_BUDGET = 2000
+
+# Share of the budget reserved for the running summary
+SUMMARY_SHARE = 0.25
+
+# Longest excerpt kept per summarized message
+SUMMARY_EXCERPT_CHARS = 200
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+
+def count_tokens(text: str) -> int:
+    try:
+        from autogen.token_count_utils import count_token
+        return count_token(text)
+    except Exception:
+        return max(1, len(text) // 4)
+
+
+def _message_text(message: Dict) -> str:
+    content = message.get("content")
+    return content if isinstance(content, str) else str(content or "")
+
+
+def _fingerprint(message: Dict) -> str:
+    return hashlib.sha1(f"{message.get('name', '')}:{_message_text(message)}".encode("utf-8")).hexdigest()
+
+
+def extractive_summary(summary_lines: List[str], new_messages: List[Dict]) -> List[str]:
+    '''
+        Append one "Name: first sentence" line per message. Cheap enough to run on
+        the event loop, unlike an LLM summarizer.
+    '''
+    for message in new_messages:
+        text = " ".join(_message_text(message).split())
+        if not text:
+            continue
+        excerpt = text.split(". ")[0]
+        if len(excerpt) > SUMMARY_EXCERPT_CHARS:
+            excerpt = excerpt[:SUMMARY_EXCERPT_CHARS].rstrip() + "..."
+        summary_lines.append(f"{message.get('name', message.get('role', 'user'))}: {excerpt}")
+    return summary_lines
+
+
+class ContextWindow:
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 summarizer: Callable[[List[str], List[Dict]], List[str]] = extractive_summary,
+                 token_counter: Callable[[str], int] = count_tokens):
+        self.token_budget = token_budget
+        self.summary_budget = int(token_budget * SUMMARY_SHARE)
+        self.summarizer = summarizer
+        self.token_counter = token_counter
+        self._token_counts: Dict[str, int] = {}  # fingerprint -> tokens, for the messages of the last window
+        self.reset()
+
+    @classmethod
+    def for_agent(cls, agent_name: str, token_budget: Optional[int] = None) -> "ContextWindow":
+        if token_budget is None:
+            token_budget = ROLE_TOKEN_BUDGETS.get(agent_name, DEFAULT_TOKEN_BUDGET)
+        return cls(token_budget=token_budget)
+
+    def reset(self):
+        self.summary_lines: List[str] = []
+        self.summary_tokens: List[int] = []
+        self.summarized_count = 0          # leading messages already folded into the summary
+        self.summarized_fingerprint = None  # fingerprint of the last summarized message
+
+    def _tokens(self, message: Dict, counts: Dict[str, int]) -> int:
+        key = _fingerprint(message)
+        count = self._token_counts.get(key)
+        if count is None:
+            count = self.token_counter(_message_text(message))  # not counted ahead by a_count_tokens
+        counts[key] = count
+        return count
+
+    async def a_count_tokens(self, messages: List[Dict]) -> None:
+        '''
+            Count the messages the next call will need and has no count for, on the blocking pool.
+        '''
+        start = self.summarized_count if self._is_same_conversation(messages) else 0
+        texts = {}
+        for message in messages[start:]:
+            key = _fingerprint(message)
+            if key not in self._token_counts:
+                texts[key] = _message_text(message)
+        if texts:
+            counter = self.token_counter
+            self._token_counts.update(await run_blocking(lambda: {key: counter(text) for key, text in texts.items()}))
+
+    def _is_same_conversation(self, messages: List[Dict]) -> bool:
+        if self.summarized_count == 0:
+            return True  # nothing summarized yet
+        if len(messages) < self.summarized_count:
+            return False
+        return _fingerprint(messages[self.summarized_count - 1]) == self.summarized_fingerprint
+
+    def __call__(self, messages: List[Dict]) -> List[Dict]:
+        if not messages:
+            return messages
+        if not self._is_same_conversation(messages):
+            self.reset()
+
+        # Grow the verbatim window backwards from the newest message. Always keep the newest one.
+        verbatim_budget = self.token_budget - self.summary_budget
+        counts = {}
+        start = len(messages) - 1
+        used = self._tokens(messages[start], counts)
+        while start > self.summarized_count:
+            tokens = self._tokens(messages[start - 1], counts)
+            if used + tokens > verbatim_budget:
+                break
+            start -= 1
+            used += tokens
+        self._token_counts = counts  # the window only moves forward: earlier messages are not counted again
+
+        if start == 0:
+            return messages
+
+        # Fold only the messages that left the window since the last call
+        if start > self.summarized_count:
+            new_lines = self.summarizer([], messages[self.summarized_count:start])
+            self.summary_lines.extend(new_lines)
+            self.summary_tokens.extend(self.token_counter(line) for line in new_lines)
+            self.summarized_count = start
+            self.summarized_fingerprint = _fingerprint(messages[start - 1])
+
+            # Keep the summary within its budget by dropping its oldest lines
+            while len(self.summary_lines) > 1 and sum(self.summary_tokens) > self.summary_budget:
+                self.summary_lines.pop(0)
+                self.summary_tokens.pop(0)
+
+        summary_message = {
+            "role": "system",
+            "content": SUMMARY_PREFIX + "\n" + "\n".join(self.summary_lines),
+        }
+        return [summary_message] + messages[self.summarized_count:]
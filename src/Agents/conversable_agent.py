@@ -3,18 +3,38 @@
 ##################################################################### 
 import autogen
 import asyncio
+import contextvars
+import time
+from autogen.io.base import IOStream
 from src import globals
 from src.Models.llm_config import gpt3_config, gpt4_config
+from src.Models import llm_cache
+from src.Models import mock_llm
+from src.Models import llm_metrics
+from src.Models import llm_scheduler
+from src.Models import model_router
+from src.Models import client_pool
+from src.Models.conversation_store import VERIFIER_NAME, is_correct_verdict
+from src.Models.event_bus import InputRequested, MessagePosted, VerdictIssued
+from src.Models.token_stream import TokenStream
 
 from .base_agent import MyBaseAgent
+from .context_window import ContextWindow
 
 llm = gpt4_config
 
+# True inside a reply generated ahead of its turn (see concurrent_states.py)
+BACKGROUND_REPLY = contextvars.ContextVar("background_reply", default=False)
+# True inside a reply that is not a groupchat message, so nothing is streamed to the Learn tab (see learner_model_agent.py)
+SUPPRESS_STREAMING = contextvars.ContextVar("suppress_streaming", default=False)
+
 class MyConversableAgent(autogen.ConversableAgent, MyBaseAgent):
     def __init__(self, **kwargs):
         llm_config = kwargs.get('llm_config', None)
         if llm_config is None:
              kwargs['llm_config'] = llm
+        # Agents on the default config are routed between model tiers. An explicit llm_config pins the model.
+        model_routing = llm_config is None
 
         #is_termination_msg = kwargs.get('is_termination_msg', None)
         # human_input_mode = kwargs.get('human_input_mode', None)
@@ -25,21 +45,63 @@ class MyConversableAgent(autogen.ConversableAgent, MyBaseAgent):
         if code_execution_config is None:
              kwargs['code_execution_config'] = False
 
+        # Per-agent switch for the shared LLM response cache
+        llm_cache_enabled = kwargs.pop('llm_cache_enabled', True)
+
+        # Token budget for the conversation history sent to the model. Defaults to the role's budget.
+        context_token_budget = kwargs.pop('context_token_budget', None)
+
+        # Admission priority in the LLM scheduler. Defaults to the role's priority.
+        llm_priority = kwargs.pop('llm_priority', None)
+
         super().__init__(**kwargs)
 
+        # Offline backend: autogen requires custom model clients to be registered per agent.
+        # Mock replies are not cached so profiling sees the configured latency.
+        if mock_llm.uses_mock_client(self.llm_config):
+            self.register_model_client(model_client_cls=mock_llm.MockModelClient, agent_name=self.name)
+            llm_cache_enabled = False
+
         self.groupchat_manager = None
         self.reactive_chat = None
- 
-    async def a_get_human_input(self, prompt: str) -> str:
-        self.groupchat_manager.chat_interface.send(prompt, user="System", respond=False) 
+        self.llm_cache_enabled = llm_cache_enabled
+        self.cache_stats = llm_cache.CacheStats()
+        self.last_time_to_first_token = None
+        if llm_priority is None:
+            llm_priority = llm_scheduler.ROLE_PRIORITIES.get(self.name, llm_scheduler.PRIORITY_NORMAL)
+        self.llm_priority = llm_priority
+        self.model_routing = model_routing and self.llm_config is not False
+        self._tier_clients = {}
+
+        # Reply computed ahead of this agent's turn. Returned when the FSM selects the agent.
+        self.pending_reply = None
+        self.register_reply([autogen.Agent, None], MyConversableAgent.a_prefetched_reply, ignore_async_in_sync_chat=True)
+        self.replace_reply_func(autogen.ConversableAgent.a_generate_oai_reply, MyConversableAgent.a_generate_oai_reply)
 
-        if globals.input_future is None or globals.input_future.done():
-            globals.input_future = asyncio.Future()
+        # Recent messages verbatim, older ones as a running summary
+        self.context_window = ContextWindow.for_agent(self.name, context_token_budget)
+        self.register_hook("process_all_messages_before_reply", self.context_window)
+ 
+    def _validate_llm_config(self, llm_config):
+        # autogen opens new connections for every agent. Reuse the shared ones for this config.
+        if not isinstance(llm_config, dict) or llm_config in [{}, {"config_list": []}, {"config_list": [{"model": ""}]}]:
+            return super()._validate_llm_config(llm_config)  # autogen handles None/False and rejects empty configs
+        self.llm_config = llm_config
+        self.client = client_pool.get_client_pool().client_for(llm_config)
 
-        await globals.input_future
+    async def a_get_human_input(self, prompt: str) -> str:
+        # The future belongs to this session's manager, so only this student's input resolves it
+        manager = self.groupchat_manager
+        manager.events.publish(InputRequested(prompt, self.name))  # shown after the messages published before it
+        manager.awaiting = self.name
+        manager.save_session(awaiting=self.name)     # idle until the student answers: any worker can resume from here
+        manager.save_checkpoint(awaiting=self.name)  # everything the student has seen is on disk
+        if manager.input_future is None or manager.input_future.done():
+            manager.input_future = asyncio.Future()
 
-        input_value = globals.input_future.result()
-        globals.input_future = None
+        input_value = await manager.input_future
+        manager.input_future = None
+        manager.awaiting = None
         return input_value
 
     async def a_receive(self, message, sender=None, request_reply=True, silent=False):
@@ -61,22 +123,188 @@ class MyConversableAgent(autogen.ConversableAgent, MyBaseAgent):
         else:
             print("GroupChatManager not available to save chat history.")
 
+    async def a_generate_reply(self, messages=None, sender=None, **kwargs):
+        # The context window hook runs on the event loop. Count the new messages' tokens off it first.
+        if messages is not None or sender is not None:
+            await self.context_window.a_count_tokens(messages if messages is not None else self._oai_messages[sender])
+        return await super().a_generate_reply(messages=messages, sender=sender, **kwargs)
+
+    async def a_generate_reply_in_background(self, messages, sender):
+        '''
+            Generate a reply before this agent's turn. The UI is not updated and nothing is
+            streamed, so the reply only appears once the FSM selects this agent.
+        '''
+        token = BACKGROUND_REPLY.set(True)  # only for this call: the agent may be answering in the foreground too
+        try:
+            return await self.a_generate_reply(messages=messages, sender=sender)
+        finally:
+            BACKGROUND_REPLY.reset(token)
+
+    async def a_generate_oai_reply(self, messages=None, sender=None, config=None):
+        # autogen runs generate_oai_reply on an executor thread, which does not see the caller's context
+        # variables. Carry them over, so BACKGROUND_REPLY and SUPPRESS_STREAMING hold for the call that set them and no other.
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            None, lambda: context.run(self.generate_oai_reply, messages=messages, sender=sender, config=config))
+
+    async def a_prefetched_reply(self, messages=None, sender=None, config=None):
+        task = self.pending_reply
+        if task is None or BACKGROUND_REPLY.get():
+            return False, None
+        self.pending_reply = None
+        try:
+            reply = await task
+        except Exception as e:
+            print(f"{self.name} background reply failed: {e}. Generating it now.")
+            return False, None
+        if reply is None:
+            return False, None
+        return True, reply
+
     def autogen_reply_func(self, recipient, messages, sender, config):
+        if BACKGROUND_REPLY.get():
+            return False, None
         print(f"Messages from: {sender.name} sent to: {recipient.name} | num messages: {len(messages)} | message: {messages[-1]}")
 
-        last_content = messages[-1]['content']        
+        message = messages[-1]
 
         ###############################
-        # Update panel tabs
+        # Tell the session's subscribers (the UI tabs). Each is called once for the events of a burst (see event_bus.py).
         #############################
-        self.reactive_chat.update_learn_tab(recipient=recipient, messages=messages, sender=sender, config=config)
-        self.reactive_chat.update_dashboard()                          
-        self.reactive_chat.update_progress(contents=last_content,user=recipient.name)        
-        #Note: do not call update_model_tab. The button takes care of that.
+        events = self.groupchat_manager.events
+        events.publish(MessagePosted(message, message.get('name', recipient.name)))
+        if message.get('name') == VERIFIER_NAME:
+            fsm = self.groupchat_manager.fsm
+            events.publish(VerdictIssued(is_correct_verdict(message.get('content')), message.get('content'),
+                                         getattr(fsm, "current_topic", None)))
+        #Note: the Model tab is not updated here. The button takes care of that.
 
-                
         return False, None
 
+    def _generate_oai_reply_from_client(self, llm_client, messages, cache):
+        '''
+            Both generate_oai_reply and a_generate_oai_reply end up here, so this is
+            where every LLM call is routed to a model tier, timed, and checked
+            against the shared response cache.
+        '''
+        fsm = getattr(self.groupchat_manager, 'fsm', None)
+        state = getattr(fsm, 'current_state', None)
+
+        config = self.llm_config
+        tier = None
+        if self.model_routing and llm_client is self.client:
+            tier = model_router.get_router().choose(self.name, state)
+            config = model_router.TIER_CONFIGS[tier]
+            llm_client = self._client_for_config(config)
+
+        start = time.perf_counter()
+        prompt_before, completion_before = llm_metrics.usage_totals(llm_client)
+        # Duration of each model call. The router judges the tier by the last one, without
+        # the time spent queued in the scheduler or backing off after a rate limit.
+        model_seconds = []
+
+        try:
+            reply, cache_hit = self._generate_cached_reply(llm_client, config, messages, cache, model_seconds)
+        except Exception:
+            if tier is not None and model_seconds:
+                model_router.get_router().observe(self.name, tier, model_seconds[-1], ok=False)
+            raise
+
+        latency = time.perf_counter() - start
+        if tier is not None and model_seconds:
+            model_router.get_router().observe(self.name, tier, model_seconds[-1], ok=bool(reply))
+
+        prompt_after, completion_after = llm_metrics.usage_totals(llm_client)
+        llm_metrics.get_registry().record(agent=self.name,
+                                          latency=latency,
+                                          prompt_tokens=prompt_after - prompt_before,
+                                          completion_tokens=completion_after - completion_before,
+                                          cache_hit=cache_hit,
+                                          state=state,
+                                          transition=getattr(fsm, 'last_transition', None),
+                                          model=self._primary_model(config))
+        return reply
+
+    def _client_for_config(self, config):
+        if config == self.llm_config:
+            return self.client
+        client = self._tier_clients.get(id(config))
+        if client is None:
+            client = client_pool.get_client_pool().client_for(config)
+            if mock_llm.uses_mock_client(config):
+                client.register_model_client(model_client_cls=mock_llm.MockModelClient, agent_name=self.name)
+            self._tier_clients[id(config)] = client
+        return client
+
+    def _generate_cached_reply(self, llm_client, config, messages, cache, model_seconds):
+        if not self.llm_cache_enabled:
+            return self._generate_live_reply(llm_client, config, messages, cache, model_seconds), False
+
+        response_cache = llm_cache.get_default_cache()
+        key = llm_cache.make_key(config, messages)
+        cached_reply = response_cache.get(key)
+        if cached_reply is not None:
+            self.cache_stats.hits += 1
+            return cached_reply, True
+
+        self.cache_stats.misses += 1
+        reply = self._generate_live_reply(llm_client, config, messages, cache, model_seconds)
+        if reply is not None:
+            response_cache.set(key, reply)
+        return reply, False
+
+    def _generate_live_reply(self, llm_client, config, messages, cache, model_seconds):
+        recorder = mock_llm.get_recorder()
+        if recorder is not None:
+            messages_sent = [dict(m) for m in messages]  # autogen pops 'context' from the last message
+        background = BACKGROUND_REPLY.get()
+        stream = not (background or SUPPRESS_STREAMING.get())
+
+        def call():
+            # Runs once admitted by the scheduler, again for each rate-limit retry
+            started = time.perf_counter()
+            try:
+                return self._generate_streamed_reply(llm_client, config, messages, cache, stream=stream)
+            finally:
+                model_seconds.append(time.perf_counter() - started)
+
+        reply = llm_scheduler.get_scheduler().run(call,
+                                                  priority=llm_scheduler.PRIORITY_BACKGROUND if background else self.llm_priority,
+                                                  model=self._primary_model(config),
+                                                  tokens=self._estimate_request_tokens(config, messages))
+        if recorder is not None and reply is not None:
+            recorder.record(self.name, messages_sent, reply)
+        return reply
+
+    def _primary_model(self, config):
+        config_list = (config or {}).get("config_list", [])
+        return config_list[0].get("model") if config_list else None
+
+    def _estimate_request_tokens(self, config, messages):
+        # Prompt (about 4 characters per token) plus the completion budget
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in messages)
+        return prompt_chars // 4 + (config or {}).get("max_tokens", 0)
+
+    def _generate_streamed_reply(self, llm_client, config, messages, cache, stream=True):
+        '''
+            With "stream" in llm_config, forward tokens to the UI while the completion arrives.
+            The finished reply is still returned to autogen and appended to the groupchat as usual.
+            stream: False for replies the UI must not show as they arrive
+        '''
+        on_token = getattr(self.reactive_chat, 'stream_token', None)
+        if not stream or not (config and config.get("stream") and on_token):
+            return super()._generate_oai_reply_from_client(llm_client, messages, cache)
+
+        token_stream = TokenStream(self.name, on_token, fallback=IOStream.get_default())
+        with IOStream.set_default(token_stream):
+            reply = super()._generate_oai_reply_from_client(llm_client, messages, cache)
+
+        self.last_time_to_first_token = token_stream.time_to_first_token
+        if self.last_time_to_first_token is not None:
+            print(f"{self.name} time to first token: {self.last_time_to_first_token:.3f}s")
+            self.reactive_chat.report_time_to_first_token(self.name, self.last_time_to_first_token)
+        return reply
+
     @property
     def groupchat_manager(self):
         return self._group_chat_manager
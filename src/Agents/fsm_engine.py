@@ -0,0 +1,197 @@
+####################################################################
+# Table-driven FSM Engine
+#
+# A tutoring flow is data: each state names the agent that speaks,
+# an optional action (a method on the owning FSM), the default next
+# state and optional guarded transitions. compile_flow() turns the
+# definition into integer-indexed tables once per flow, and an
+# FSMEngine binds those tables to one session's agents. A step is a
+# few list lookups, so many session FSMs can share one event loop.
+#
+# Transition hooks receive the time each transition took: from the
+# speaker selection that made it to the next selection, i.e. the
+# action plus the selected agent's reply.
+#
+# Actions may be coroutines. a_step() awaits them, so an action that
+# talks to an agent does not hold up the event loop.
+#####################################################################
+import inspect
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.Models.llm_metrics import RollingStats
+
+
+class CompiledFlow:
+    '''
+        Integer-indexed tables for one flow definition. Shared by every session running the flow.
+    '''
+    def __init__(self, name: str, names: List[str], initial: int, speakers: List[str], actions: List[Optional[str]],
+                 next_states: List[int], guards: List[Tuple[Tuple[str, int], ...]]):
+        self.name = name
+        self.names = names
+        self.index = {state: i for i, state in enumerate(names)}
+        self.initial = initial
+        self.speakers = speakers
+        self.actions = actions
+        self.next_states = next_states
+        self.guards = guards
+        # "From -> To" labels for every possible edge, so stepping never formats strings
+        self.transition_names = {}
+        for i, state in enumerate(names):
+            for target in [next_states[i]] + [target for _, target in guards[i]]:
+                self.transition_names[(i, target)] = f"{state} -> {names[target]}"
+
+
+def compile_flow(name: str, definition: Dict) -> CompiledFlow:
+    '''
+        definition = {
+            "initial": state name,
+            "states": {
+                state name: {
+                    "speaker": key in the agents dict,
+                    "next": default next state,
+                    "action": optional FSM method name, called with the groupchat before speaking,
+                    "transitions": optional [{"guard": FSM method name, "to": state name}, ...],
+                                   the first guard returning True wins over "next",
+                },
+            },
+        }
+    '''
+    states = definition["states"]
+    names = list(states)
+    index = {state: i for i, state in enumerate(names)}
+
+    def resolve(state: str, target: str) -> int:
+        if target not in index:
+            raise ValueError(f"Flow {name}: state {state} goes to unknown state {target}")
+        return index[target]
+
+    if definition["initial"] not in index:
+        raise ValueError(f"Flow {name}: unknown initial state {definition['initial']}")
+
+    speakers, actions, next_states, guards = [], [], [], []
+    for state in names:
+        spec = states[state]
+        speakers.append(spec["speaker"])
+        actions.append(spec.get("action"))
+        next_states.append(resolve(state, spec["next"]))
+        guards.append(tuple((t["guard"], resolve(state, t["to"])) for t in spec.get("transitions", [])))
+    return CompiledFlow(name, names, index[definition["initial"]], speakers, actions, next_states, guards)
+
+
+class FSMEngine:
+    def __init__(self, flow: CompiledFlow, agents: Dict, owner, hooks: Optional[List[Callable]] = None):
+        '''
+            owner: the object whose methods the flow's actions and guards name
+            hooks: called as hook(flow name, transition, seconds) when a transition completes
+        '''
+        self.flow = flow
+        self.speakers = [agents[key] for key in flow.speakers]
+        self.actions = [getattr(owner, action) if action else None for action in flow.actions]
+        self.guards = [tuple((getattr(owner, guard), target) for guard, target in guards) for guards in flow.guards]
+        self.next_states = flow.next_states
+        self.hooks = list(hooks or [])
+        self.state = flow.initial
+        self.last_edge = None
+        self.last_step_time = None
+
+    @property
+    def current_state(self) -> str:
+        return self.flow.names[self.state]
+
+    @current_state.setter
+    def current_state(self, name: str) -> None:
+        if name not in self.flow.index:
+            raise ValueError(f"Flow {self.flow.name} has no state {name}")
+        self.state = self.flow.index[name]
+
+    @property
+    def last_transition(self) -> Optional[str]:
+        return self.flow.transition_names[self.last_edge] if self.last_edge else None
+
+    def add_hook(self, hook: Callable) -> None:
+        self.hooks.append(hook)
+
+    def step(self, groupchat=None):
+        '''
+            Run the current state's action, move to the next state and return the speaker.
+        '''
+        self._record_transition()
+        state = self.state
+        action = self.actions[state]
+        if action is not None:
+            action(groupchat)
+        return self._advance(state)
+
+    async def a_step(self, groupchat=None):
+        '''
+            step() for flows whose actions are coroutines. Plain actions are called as usual.
+        '''
+        self._record_transition()
+        state = self.state
+        action = self.actions[state]
+        if action is not None:
+            result = action(groupchat)
+            if inspect.isawaitable(result):
+                await result
+        return self._advance(state)
+
+    def _record_transition(self) -> None:
+        now = time.perf_counter()
+        if self.hooks and self.last_edge is not None:
+            transition = self.flow.transition_names[self.last_edge]
+            for hook in self.hooks:
+                hook(self.flow.name, transition, now - self.last_step_time)
+        self.last_step_time = now
+
+    def _advance(self, state: int):
+        target = self.next_states[state]
+        for guard, guarded_target in self.guards[state]:
+            if guard():
+                target = guarded_target
+                break
+        self.state = target
+        self.last_edge = (state, target)
+        return self.speakers[state]
+
+
+class TransitionTimer:
+    '''
+        Rolling time per transition, aggregated over every session of a flow.
+    '''
+    def __init__(self):
+        self.by_transition: Dict[str, RollingStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, flow_name: str, transition: str, seconds: float) -> None:
+        key = f"{flow_name}: {transition}"
+        with self._lock:
+            stats = self.by_transition.get(key)
+            if stats is None:
+                stats = self.by_transition[key] = RollingStats()
+            stats.add(seconds, 0, 0, False)
+
+    def summary(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {key: stats.summary() for key, stats in self.by_transition.items()}
+
+    def to_markdown(self) -> str:
+        summary = self.summary()
+        if not summary:
+            return ""
+        lines = ["| Transition | Count | p50 (s) | p95 (s) | Total (s) |", "|---|---|---|---|---|"]
+        for key, s in sorted(summary.items(), key=lambda item: item[1]["total_latency"], reverse=True):
+            lines.append(f"| {key} | {s['calls']} | {s['p50']:.2f} | {s['p95']:.2f} | {s['total_latency']:.1f} |")
+        return "\n".join(lines)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.by_transition.clear()
+
+
+_transition_timer = TransitionTimer()
+
+def get_transition_timer() -> TransitionTimer:
+    return _transition_timer
@@ -1,17 +1,45 @@
 import autogen
 import asyncio
-import json
-import os
+import inspect
 from typing import Optional, List, Dict
 import panel as pn
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial
 from src import globals
-from src.Agents.agents import agents_dict_by_name
+from src.Models.message_history import SpillSegment, SpillingMessageList
+from src.Models.session_log import SessionLog
+from src.Models.conversation_store import ConversationRecorder, ConversationStore
+from src.Models.persistence_worker import WriteBehindSink, get_persistence_worker
+from src.Models.event_bus import EventBus
+from src.Models.event_loop import run_blocking
 from src.UI.avatar import avatar
 
 
 class CustomGroupChat(autogen.GroupChat):
     def __init__(self, *args, **kwargs):
         super().__init__(*args,**kwargs)
+        self.message_sinks = []  # receive every posted message: the session log, the conversation store
+
+    def append(self, message: Dict, speaker: autogen.Agent):
+        super().append(message, speaker)
+        for sink in self.message_sinks:
+            sink.append(self.messages[-1])
+
+    async def a_select_speaker(self, last_speaker: autogen.Agent, selector: autogen.ConversableAgent) -> autogen.Agent:
+        # autogen calls a speaker_selection_method synchronously. The FSM selectors are coroutines.
+        if inspect.iscoroutinefunction(self.speaker_selection_method):
+            return await self.speaker_selection_method(last_speaker, self)
+        return await super().a_select_speaker(last_speaker, selector)
+
+    @contextmanager
+    def unrecorded(self):
+        # For messages restored from history. They are already recorded.
+        sinks, self.message_sinks = self.message_sinks, []
+        try:
+            yield
+        finally:
+            self.message_sinks = sinks
 
     def get_messages(self):
         return self.messages
@@ -34,82 +62,313 @@ class CustomGroupChatManager(autogen.GroupChatManager):
         )
         
         self.filename = filename
+        # Disk writes run on the persistence worker, off the event loop that serves every session
+        self.persistence = get_persistence_worker()
+        self.session_log = SessionLog(filename, page_size=globals.HISTORY_PAGE_SIZE) if filename else None
+        if isinstance(groupchat, CustomGroupChat) and self.session_log is not None:
+            groupchat.message_sinks.append(WriteBehindSink(self.session_log, self.persistence))
         self.chat_interface = None
+        self.events = EventBus()  # agents and the FSM publish, the UI tabs subscribe (see event_bus.py)
+        self.fsm = None  # The speaker-selection FSM. Agents read its state to tag LLM metrics.
+
+        # Per-session chat state
+        self.input_future = None               # resolved by the student's next message
+        self.initiate_chat_task_created = False
+        self.chat_task = None
+
+        # Shared session store (multi-process deployment). Replaces the JSON history file when set.
+        self.session_store = None
+        self.student_id = "default"
+        self.resume_speaker_name = None  # the agent whose input the restored session was waiting for
+        self.awaiting = None             # the agent now waiting for the student's input
+        self.history_segment = None      # on-disk part of the message histories (see enable_history_spilling)
+        self.history_start = 0           # index of the first message shown. Earlier ones are loaded on request.
+        self.conversation_recorder = None  # indexed copy of the history (see attach_conversation_store)
+        self.history_loaded = asyncio.Event()  # set by a_get_chat_history_and_initialize_chat
+        self.session_saved = 0  # groupchat messages already in the session store
+        self.chat_error = None  # the exception that stopped the chat, if any
 
     async def a_run_chat(self, *args, **kwargs):
         try: 
             await super().a_run_chat(**kwargs)
-            self.save_messages_to_json(self.filename)
+            self.save_messages_to_json()
         except Exception as e:
+            self.chat_error = e  # the chat stopped. Callers that need to know check this.
             print(f"Exception occurred: {e}") 
 
         return True, None
             
 
-    def get_messages_from_json(self, filename=None):
-        if filename is None:
-            filename = self.filename
-        try:
-            print('Getting JSON file:', filename)
-            with open(filename, "r") as f:
-                self.messages_from_json = self.messages_from_string(f.read())
-                # Strip termination message and restore chat history
-                if self.messages_from_json:
-                    if self.messages_from_json[-1].get("content","").strip()==globals.IS_TERMINATION_MSG:
-                        self.messages_from_json.pop()
-                    # Resume the chat from where it leaft off
-                    # FIXME: Resume is not working correctly.
-                    # See: https://github.com/microsoft/autogen/discussions/2301
-                    # self.resume(self.messages_from_json, globals.IS_TERMINATION_MSG)
-                    # Append the chats
-                    for msg in self.messages_from_json:
-                        self.groupchat.append(message=msg, speaker=agents_dict_by_name[msg['name']])                    
-                return self.messages_from_json
-        except FileNotFoundError:
+    async def a_get_messages_from_json(self, filename=None):
+        session_log = self.session_log if filename in (None, self.filename) else SessionLog(filename)
+        if session_log is None:
+            return []
+        print('Getting chat history:', session_log.path)
+        self.messages_from_json = await run_blocking(session_log.read)
+        if not self.messages_from_json:
             print("No previous chat history found. Starting a new conversation.")
-            return []  # Return an empty list
+            return []
+        # Strip termination messages and restore chat history. The log keeps those of earlier sessions.
+        self.messages_from_json = [msg for msg in self.messages_from_json
+                                   if msg.get("content","").strip()!=globals.IS_TERMINATION_MSG]
+        # autogen's resume() does not work here (see https://github.com/microsoft/autogen/discussions/2301)
+        # and knows nothing of the FSM. Sessions with a checkpoint use resume_from_checkpoint instead.
+        # Append the chats. They are already in the log.
+        with self.groupchat.unrecorded():
+            for msg in self.messages_from_json:
+                self.groupchat.append(message=msg, speaker=self.groupchat.agent_by_name(msg['name']))
+        return self.messages_from_json
 
     
-    def save_messages_to_json(self, filename=None):
-        if filename is None:
-            filename = self.filename
-        
-        # Get previous history
-        # old_messages = self.get_messages_from_json(filename)
-        
-        # Check if the file exists and delete it
-        if os.path.exists(filename):
-            os.remove(filename)
-            print(f"Deleted existing file: {filename}")
+    def enable_history_spilling(self, capacity: int = globals.MESSAGES_IN_MEMORY):
+        '''
+            Keep only the newest messages of the groupchat and of every agent's
+            chat_messages in memory. Older ones are read back from disk when accessed.
+        '''
+        self.history_segment = SpillSegment()
+        messages = SpillingMessageList(self.history_segment, capacity, self.groupchat.messages)
+        # register_reply keeps shallow copies of the groupchat and a_run_chat posts to those.
+        # They share the messages list, so each copy gets the new one too.
+        for reply in self._reply_func_list:
+            config = reply["config"]
+            if isinstance(config, autogen.GroupChat) and config.messages is self.groupchat.messages:
+                config.messages = messages
+        self.groupchat.messages = messages
+        for agent in self.groupchat.agents + [self]:
+            histories = defaultdict(partial(SpillingMessageList, self.history_segment, capacity))
+            for peer, messages in agent.chat_messages.items():
+                histories[peer] = SpillingMessageList(self.history_segment, capacity, messages)
+            agent._oai_messages = histories
+
+    def _agent_named(self, name):
+        for agent in self.groupchat.agents:
+            if agent.name == name:
+                return agent
+        return None
+
+    def _session_state(self, awaiting=None) -> Dict:
+        return {"fsm": {"current_state": getattr(self.fsm, "current_state", None),
+                        "skill_level": getattr(self.fsm, "skill_level", None),
+                        "topic": getattr(self.fsm, "topic", None),
+                        "awaiting": awaiting or self.awaiting},
+                "learner": {"learner_state": getattr(self._agent_named("LearnerModelAgent"), "learner_state", None),
+                            "unseen": self._messages_after_watermark()}}
+
+    def _messages_after_watermark(self) -> int:
+        # Relative to the end of the history: a resumed session only holds its last page of messages
+        learner_model = self._agent_named("LearnerModelAgent")
+        return len(self.groupchat.messages) - min(getattr(learner_model, "watermark", 0), len(self.groupchat.messages))
+
+    def _restore_state(self, state: Dict):
+        fsm_state = state["fsm"]
+        if self.fsm is not None and fsm_state.get("current_state"):
+            self.fsm.current_state = fsm_state["current_state"]
+            if fsm_state.get("skill_level") is not None and hasattr(self.fsm, "skill_level"):
+                self.fsm.skill_level = fsm_state["skill_level"]
+            if fsm_state.get("topic") is not None and hasattr(self.fsm, "topic"):
+                self.fsm.topic = fsm_state["topic"]
+        self.resume_speaker_name = fsm_state.get("awaiting")
+
+        learner_model = self._agent_named("LearnerModelAgent")
+        if learner_model is not None:
+            learner_model.learner_state = state["learner"].get("learner_state")
+            # Call after _restore_messages. Messages the model had not seen before the restored page are lost to it.
+            unseen = state["learner"].get("unseen", len(self.groupchat.messages))
+            learner_model.watermark = max(0, len(self.groupchat.messages) - unseen)
 
-        # Save the chat history to the file
-        #chat_history = old_messages + self.groupchat.messages  # merge the lists
-        chat_history = self.groupchat.messages
-        with open(filename, 'w') as f:
-            json.dump(chat_history, f, indent=4)
-        print(f"Chat history saved to: {filename}")
+    def _restore_messages(self, messages: List[Dict]):
+        '''
+            Put messages into the groupchat and into each agent's own history, as autogen would
+            have delivered them. They are already in the session log.
+        '''
+        with self.groupchat.unrecorded():
+            for msg in messages:
+                speaker = self._agent_named(msg.get('name'))
+                if speaker is None or msg.get("content","").strip()==globals.IS_TERMINATION_MSG:
+                    continue
+                self.groupchat.append(message=msg, speaker=speaker)
+                for agent in self.groupchat.agents:
+                    role = "assistant" if agent is speaker else "user"
+                    agent.chat_messages[self].append({"content": msg.get("content"), "role": role, "name": speaker.name})
+
+    def save_session(self, awaiting=None):
+        '''
+            Write FSM state, learner model and messages to the shared store, so any worker
+            can resume the session. awaiting: the agent now waiting for the student's input.
+        '''
+        if self.session_store is None:
+            return
+        state = self._session_state(awaiting)
+        # Only the messages posted since the last save, read on the loop: the lists are not thread-safe.
+        # Not coalesced, since each job carries its own messages.
+        new_messages = list(self.groupchat.messages[self.session_saved:])
+        self.session_saved = len(self.groupchat.messages)
+        self.persistence.submit(lambda: self.session_store.save_session(self.student_id, state["fsm"], state["learner"], new_messages))
+
+    async def a_restore_session(self):
+        '''
+            Load the session from the shared store into the groupchat, the agents' own
+            histories, the FSM and the learner model. Returns the restored messages.
+        '''
+        session = await run_blocking(self.session_store.load_session, self.student_id)
+        if session is None:
+            print(f"No stored session for {self.student_id}. Starting a new conversation.")
+            return []
+
+        messages = session["messages"]
+        self._restore_messages(messages)
+        self.session_saved = len(self.groupchat.messages)
+        self._restore_state(session)
+        print(f"Restored session for {self.student_id}: {len(messages)} messages, state {session['fsm'].get('current_state')}")
+        return messages
+
+    def attach_conversation_store(self, store: ConversationStore):
+        '''
+            Record every message of this session, with its topic and FSM state, in the store.
+            Call after fsm and student_id are set.
+        '''
+        engine = getattr(self.fsm, "engine", None)
+        self.conversation_recorder = ConversationRecorder(
+            store, self.student_id, flow=engine.flow.name if engine is not None else None,
+            describe=lambda: (getattr(self.fsm, "current_topic", None), getattr(self.fsm, "current_state", None)),
+            persistence=self.persistence)
+        self.groupchat.message_sinks.append(self.conversation_recorder)
+
+    def save_checkpoint(self, awaiting=None):
+        '''
+            Make the session log durable and checkpoint FSM state, learner model and the last page of messages.
+        '''
+        if self.conversation_recorder is not None:
+            self.conversation_recorder.flush()
+        if self.session_log is not None:
+            state = self._session_state(awaiting)
+            self.persistence.submit(lambda: self.session_log.write_checkpoint(state), key=("checkpoint", id(self)))
+
+    async def a_resume_from_checkpoint(self) -> bool:
+        '''
+            Restore the FSM, the learner model and the last page of messages from the checkpoint.
+            The agents continue with the recent messages as their context.
+        '''
+        checkpoint = await run_blocking(self.session_log.resume) if self.session_log is not None else None
+        if checkpoint is None:
+            return False
+        self._restore_messages(checkpoint["recent"])
+        self._restore_state(checkpoint["state"])
+        print(f"Resumed {self.filename} at {checkpoint['state']['fsm'].get('current_state')}: "
+              f"{len(checkpoint['recent'])} of {checkpoint['messages']} messages loaded")
+        return True
+
+    async def a_earlier_messages(self, count: int = globals.HISTORY_PAGE_SIZE) -> List[Dict]:
+        '''
+            The page of messages before the ones shown, read from disk on request.
+        '''
+        if self.history_start <= 0:
+            return []
+        start, stop = max(0, self.history_start - count), self.history_start
+        if self.conversation_recorder is not None:
+            self.conversation_recorder.flush()  # queued behind the log appends
+        messages = await run_blocking(self._read_history, start, stop)
+        self.history_start = start
+        return messages
+
+    def _read_history(self, start: int, stop: int) -> List[Dict]:
+        # On the blocking pool: waits for the persistence worker and reads from disk
+        self.persistence.flush()  # the store and the log must hold every message posted so far
+        recorder = self.conversation_recorder
+        if recorder is not None and self.session_log is not None and recorder.seq == self.session_log.count:
+            # The store holds the same history: an indexed lookup instead of reading the log
+            return recorder.store.history_page(self.student_id, start, stop)
+        if self.session_log is not None:
+            return self.session_log.read_range(start, stop)
+        return self.session_store.load_session(self.student_id)["messages"][start:stop]
+
+    def history_chat_messages(self, messages: List[Dict]) -> List[pn.chat.ChatMessage]:
+        return [pn.chat.ChatMessage(message["content"], user=message.get("name", message["role"]),
+                                    avatar=avatar.get(message.get("name", message["role"]), None))
+                for message in messages if message.get("content","").strip()!=globals.IS_TERMINATION_MSG]
+
+    def save_messages_to_json(self, filename=None):
+        '''
+            Messages are appended to the session log as they are posted. This only makes them durable.
+        '''
+        if self.session_log is not None:
+            self.persistence.submit(self.session_log.flush, key=("flush", id(self)))
+        if self.conversation_recorder is not None:
+            self.conversation_recorder.flush()
 
 
     # TODO: Consider moving the writes to the chat panel to reactive_chat
-    def get_chat_history_and_initialize_chat(self, filename: str = None, chat_interface: pn.chat.ChatInterface = None):
-        chat_history_messages = self.get_messages_from_json(filename=filename)
-        # Send the chat history to the panel interface
-        if chat_history_messages:        
-            for message in chat_history_messages:
-                if globals.IS_TERMINATION_MSG not in message:
-                    chat_interface.send(
-                        message["content"],
-                        user=message["role"], 
-                        avatar=avatar.get(message["role"], None),  
-                        respond=False
-                    )
-            chat_interface.send("Time to continue your studies!", user="System", respond=False)
-        else:
-            chat_interface.send("Welcome to the Adaptive Math Tutor! How can I help you today?", user="System", respond=False)
+    async def a_get_chat_history_and_initialize_chat(self, filename: str = None, chat_interface: pn.chat.ChatInterface = None):
+        '''
+            Restore the session and show its last page of messages. The student's first message waits for this.
+        '''
+        try:
+            await run_blocking(self.persistence.flush)  # e.g. the student's previous session may still be closing
+            if self.session_store is not None:
+                restored = await self.a_restore_session()
+                chat_history_messages = restored[-globals.HISTORY_PAGE_SIZE:]
+                self.history_start = len(restored) - len(chat_history_messages)
+            elif self.session_log is not None:
+                # Sessions saved before checkpoints existed are replayed in full once
+                if not await self.a_resume_from_checkpoint():
+                    await self.a_get_messages_from_json(filename=filename)
+                chat_history_messages = self.session_log.recent()
+                self.history_start = self.session_log.count - len(chat_history_messages)
+            else:
+                chat_history_messages = []
+            # Send the last page of the chat history to the panel interface in one update
+            if chat_history_messages:
+                chat_interface.objects = self.history_chat_messages(chat_history_messages)
+                chat_interface.send("Time to continue your studies!", user="System", respond=False)
+            else:
+                chat_interface.send("Welcome to the Adaptive Math Tutor! How can I help you today?", user="System", respond=False)
+        finally:
+            self.history_loaded.set()
 
  
+    def start_chat(self, agent, message):
+        # A resumed session continues with the agent that was waiting for the student
+        resume_speaker = self._agent_named(self.resume_speaker_name) if self.resume_speaker_name else None
+        if resume_speaker is not None:
+            agent = resume_speaker
+            self.resume_speaker_name = None
+        self.initiate_chat_task_created = True
+        self.chat_task = asyncio.create_task(self.delayed_initiate_chat(agent, self, message))
+
+    def submit_input(self, contents: str) -> bool:
+        '''
+            Hand the student's message to the agent waiting for human input in this session.
+        '''
+        if self.input_future and not self.input_future.done():
+            self.input_future.set_result(contents)
+            return True
+        return False
+
+    def close(self):
+        '''
+            Tear down the session's chat when its browser session ends.
+        '''
+        if self.fsm is not None:
+            self.fsm.cancel_background()
+        if self.input_future and not self.input_future.done():
+            self.input_future.cancel()
+        if self.chat_task and not self.chat_task.done():
+            self.chat_task.cancel()
+        if self.session_store is not None:
+            self.save_session()
+        if self.session_log is not None:
+            state = self._session_state()
+            def close_log():
+                self.session_log.close()  # folds the tail into the snapshot
+                self.session_log.write_checkpoint(state)
+            self.persistence.submit(close_log)
+        if self.conversation_recorder is not None:
+            self.conversation_recorder.close()
+        if self.history_segment is not None:
+            self.history_segment.close()
+
     async def delayed_initiate_chat(self, agent, recipient, message):
-        globals.initiate_chat_task_created = True
+        self.initiate_chat_task_created = True
         await asyncio.sleep(1) 
         await agent.a_initiate_chat(recipient=recipient, 
                                     clear_history = False,
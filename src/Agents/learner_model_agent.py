@@ -1,5 +1,10 @@
 ##################### Learner Model #########################
-from .conversable_agent import MyConversableAgent
+import asyncio
+from typing import Dict, List
+from .conversable_agent import MyConversableAgent, SUPPRESS_STREAMING
+
+# Longest excerpt of each new message included in a refresh request
+UPDATE_EXCERPT_CHARS = 500
 
 class LearnerModelAgent(MyConversableAgent):
     description = """
@@ -25,4 +30,53 @@ class LearnerModelAgent(MyConversableAgent):
             code_execution_config=False,
             human_input_mode="NEVER",
             **kwargs
-         )
\ No newline at end of file
+         )
+        # Compact learner state, rebuilt incrementally from the groupchat messages after the watermark
+        self.learner_state = None
+        self.watermark = 0
+        self._refresh_lock = asyncio.Lock()
+
+    def build_update_request(self, new_messages: List[Dict]) -> str:
+        activity = []
+        for message in new_messages:
+            content = " ".join(str(message.get("content", "")).split())
+            if len(content) > UPDATE_EXCERPT_CHARS:
+                content = content[:UPDATE_EXCERPT_CHARS] + "..."
+            activity.append(f"{message.get('name', message.get('role', 'user'))}: {content}")
+
+        previous_state = self.learner_state or "No assessment yet."
+        return (f"Current assessment of the StudentAgent:\n{previous_state}\n\n"
+                f"New activity since that assessment:\n" + "\n".join(activity) + "\n\n"
+                "Update the assessment. Reply with the StudentAgent's current capabilities, strengths, weaknesses, "
+                "and the type and difficulty of questions to ask next.")
+
+    async def a_refresh(self, messages: List[Dict]) -> str:
+        '''
+            Fold the messages after the watermark into the learner state with a single LLM request.
+            The request is not stored in this agent's chat history, so repeated refreshes stay the same size.
+            Returns the cached state when no new messages have arrived.
+        '''
+        async with self._refresh_lock:
+            if len(messages) < self.watermark:
+                # History was replaced (e.g. a new session). Start over.
+                self.learner_state = None
+                self.watermark = 0
+
+            new_messages = messages[self.watermark:]
+            if not new_messages and self.learner_state is not None:
+                return self.learner_state
+
+            request = {"content": self.build_update_request(new_messages), "role": "user", "name": "StudentAgent"}
+            # Straight to the model: no other reply functions, nothing stored in chat_messages,
+            # and nothing streamed into the Learn tab (the Model tab shows the result)
+            token = SUPPRESS_STREAMING.set(True)
+            try:
+                _, reply = await self.a_generate_oai_reply(messages=[request])
+            finally:
+                SUPPRESS_STREAMING.reset(token)
+            if isinstance(reply, dict):
+                reply = reply.get("content")
+            if reply:
+                self.learner_state = reply
+                self.watermark = len(messages)
+            return self.learner_state or "The learner model could not be updated."
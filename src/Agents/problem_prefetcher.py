@@ -0,0 +1,67 @@
+####################################################################
+# Problem Prefetcher
+#
+# While the student is typing an answer, the ProblemGeneratorAgent
+# generates the next problem for each possible outcome in the
+# background: one for "correct, advance skill_level" and one for
+# "incorrect, practice more". When the outcome is known, the matching
+# problem becomes the generator's pending reply (see
+# MyConversableAgent.a_prefetched_reply) and the other is cancelled.
+#####################################################################
+import asyncio
+from typing import Dict, Optional
+
+
+class ProblemPrefetcher:
+    def __init__(self, problem_generator):
+        self.problem_generator = problem_generator
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.instructions: Dict[str, Dict] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _generate(self, sender, instruction: Dict) -> asyncio.Task:
+        messages = list(self.problem_generator.chat_messages.get(sender, [])) + [instruction]
+        return asyncio.ensure_future(self.problem_generator.a_generate_reply_in_background(messages=messages, sender=sender))
+
+    def start(self, sender, branches: Dict[str, Dict]) -> None:
+        '''
+            branches: outcome name -> instruction message for the ProblemGeneratorAgent
+        '''
+        self.cancel()
+        if sender is None:
+            return
+        for branch, instruction in branches.items():
+            self.instructions[branch] = instruction
+            self.tasks[branch] = self._generate(sender, instruction)
+        print(f"Prefetching next problem for: {', '.join(branches)}")
+
+    def take(self, branch: str, sender, instruction: Dict) -> Optional[asyncio.Task]:
+        '''
+            The task producing the problem for the actual outcome. If it was not
+            prefetched with the same instruction, it is generated now.
+        '''
+        task = self.tasks.pop(branch, None)
+        prefetched = task is not None and not task.cancelled() and self.instructions.get(branch) == instruction
+        self.cancel()
+        if prefetched:
+            self.hits += 1
+            print(f"Prefetch hit: {branch}")
+            return task
+        if task is not None:
+            task.cancel()
+        self.misses += 1
+        if sender is None:
+            return None
+        return self._generate(sender, instruction)
+
+    def cancel(self) -> None:
+        '''
+            Drop the unused branches. A request already sent to the model still
+            finishes on its executor thread, but its result is discarded.
+        '''
+        for task in self.tasks.values():
+            if not task.done():
+                task.cancel()
+        self.tasks = {}
+        self.instructions = {}
@@ -234,10 +234,9 @@ def pretty_print(d, indent=0, sep=' -> '):
             print(' ' * (indent + len(sep)) + str(value))
 
 #######################################################
-# Main()
+# Layout parameters
 #######################################################
 
-
 # Parameters for individual topic and subtopic radii
 topics_and_subtopics = mt.topics_and_subtopics
 subsub_topics = mt.subsub_topics
@@ -260,71 +259,87 @@ separation_subsubsub_topics = 0.5
 topic_colors = mt.topic_colors
 
 
-# Generate Coordinates
-main_topic_coords = generate_coordinates_for_keys(topics_and_subtopics, individual_radius_main_topics, separation_main_topics,start_angle)
-sub_topic_coords    = generate_coordinates_for_values(topics_and_subtopics, individual_radius_subtopics, separation_sub_topics, start_angle)
-subsub_topic_coords = generate_coordinates_for_values(subsub_topics, individual_radius_subtopics, separation_sub_topics, start_angle)
-subsubsub_topic_coords = generate_coordinates_for_values(subsubsub_topics, individual_radius_subtopics, separation_sub_topics, start_angle)
+def compute_layout():
+    """
+    Radial coordinates of every taxonomy node, one ring per level.
+
+    :return: (main topic, subtopic, subsub topic, subsubsub topic) coordinates, each {name: (x, y)}
+    """
+    main_topic_coords = generate_coordinates_for_keys(topics_and_subtopics, individual_radius_main_topics, separation_main_topics,start_angle)
+    sub_topic_coords    = generate_coordinates_for_values(topics_and_subtopics, individual_radius_subtopics, separation_sub_topics, start_angle)
+    subsub_topic_coords = generate_coordinates_for_values(subsub_topics, individual_radius_subtopics, separation_sub_topics, start_angle)
+    subsubsub_topic_coords = generate_coordinates_for_values(subsubsub_topics, individual_radius_subtopics, separation_sub_topics, start_angle)
+    return main_topic_coords, sub_topic_coords, subsub_topic_coords, subsubsub_topic_coords
+
+
+#######################################################
+# Main()
+#######################################################
+
+if __name__ == "__main__":
+
+    # Generate Coordinates
+    main_topic_coords, sub_topic_coords, subsub_topic_coords, subsubsub_topic_coords = compute_layout()
 
 
-# Export graph in GDF format
-gdf_data = generate_gephi_gdf(topics_and_subtopics, subsub_topics, subsubsub_topics, 
-                             main_topic_coords, sub_topic_coords, subsub_topic_coords, subsubsub_topic_coords,
-                             individual_radius_main_topics, individual_radius_subtopics, individual_radius_subsub_topics, individual_radius_subsubsub_topics, 
-                             topic_colors)
+    # Export graph in GDF format
+    gdf_data = generate_gephi_gdf(topics_and_subtopics, subsub_topics, subsubsub_topics, 
+                                 main_topic_coords, sub_topic_coords, subsub_topic_coords, subsubsub_topic_coords,
+                                 individual_radius_main_topics, individual_radius_subtopics, individual_radius_subsub_topics, individual_radius_subsubsub_topics, 
+                                 topic_colors)
 
 
 
-# Write the GDF content to a file
-file_path = './gephi/math_nodes_and_edges.gdf'
-if os.path.exists(file_path):
-    os.remove(file_path)
+    # Write the GDF content to a file
+    file_path = './gephi/math_nodes_and_edges.gdf'
+    if os.path.exists(file_path):
+        os.remove(file_path)
 
-with open(file_path, 'w') as file:
-    file.write(gdf_data)
+    with open(file_path, 'w') as file:
+        file.write(gdf_data)
 
-print(gdf_data)
-print(f"GDF file saved to: {file_path}")
+    print(gdf_data)
+    print(f"GDF file saved to: {file_path}")
 
 
-print('Length of topic coords: ', len(subsub_topic_coords))
-print('Length of topics: ', len(topics_and_subtopics.keys()))
+    print('Length of topic coords: ', len(subsub_topic_coords))
+    print('Length of topics: ', len(topics_and_subtopics.keys()))
 
-print('Length of subtopic coords: ', )
-print('Length of subtopics: ', len(topics_and_subtopics.values()))
-length = 0
-for k, v in subsubsub_topics.items():
-    length += len(v)
+    print('Length of subtopic coords: ', )
+    print('Length of subtopics: ', len(topics_and_subtopics.values()))
+    length = 0
+    for k, v in subsubsub_topics.items():
+        length += len(v)
 
-print("length of subsubsub topics: ", length)
+    print("length of subsubsub topics: ", length)
 
 
-print('Length of Subsubsub topic coords: ', len(subsub_topic_coords))
-length = 0
-for k, v in subsubsub_topics.items():
-    length += len(v)
+    print('Length of Subsubsub topic coords: ', len(subsub_topic_coords))
+    length = 0
+    for k, v in subsubsub_topics.items():
+        length += len(v)
 
-print("length of subsubsub topics: ", length)
+    print("length of subsubsub topics: ", length)
 
-# print('***********************************************************************************')
-# print('topics_and_subtopics_new\n', topics_and_subtopics)
-# print('***********************************************************************************')
-# print('subsub_topics_new\n', subsub_topics)
-# print('***********************************************************************************')
-# print('subsubsub_topics_new\n', subsubsub_topics)
-# print('***********************************************************************************')
+    # print('***********************************************************************************')
+    # print('topics_and_subtopics_new\n', topics_and_subtopics)
+    # print('***********************************************************************************')
+    # print('subsub_topics_new\n', subsub_topics)
+    # print('***********************************************************************************')
+    # print('subsubsub_topics_new\n', subsubsub_topics)
+    # print('***********************************************************************************')
 
-# print('###########################################################################################')
-# md_dict = create_multidimensional_dict(topics_and_subtopics,subsub_topics, subsubsub_topics)
-# print(md_dict)
+    # print('###########################################################################################')
+    # md_dict = create_multidimensional_dict(topics_and_subtopics,subsub_topics, subsubsub_topics)
+    # print(md_dict)
 
-# pretty_print(md_dict)
+    # pretty_print(md_dict)
 
-# for k,subsubsub_list in subsubsub_topics.items():
-#     new_list = []
-#     for subsubsub in subsubsub_list:
-#         new_list.append(f"{k}->{subsubsub}")
-#     subsubsub_topics[k] = new_list
+    # for k,subsubsub_list in subsubsub_topics.items():
+    #     new_list = []
+    #     for subsubsub in subsubsub_list:
+    #         new_list.append(f"{k}->{subsubsub}")
+    #     subsubsub_topics[k] = new_list
 
-# print(subsubsub_topics)
+    # print(subsubsub_topics)
 
@@ -0,0 +1,112 @@
+####################################################################
+# Taxonomy Layout
+#
+# The radial layout of compute_gephi.py (one ring per taxonomy level)
+# as flat arrays, computed once per process and shared read-only by
+# every session's knowledge-graph tab.
+#
+# Nodes are stored level by level, so "everything down to level L"
+# is the prefix nodes[:level_end[L]]. visible() picks what a view
+# needs: the deepest level whose nodes are at least MIN_NODE_SPACING
+# pixels apart at the current zoom, and only nodes inside the view.
+# Zoomed out, only the top levels are drawn.
+#
+# mastery() rolls verdicts per topic (see ConversationStore
+# .accuracy_by_topic) up the taxonomy: a node's mastery is the share
+# of correct answers on it and everything below it.
+#####################################################################
+import math
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from src.KnowledgeGraphs import compute_gephi
+
+
+LEVEL_NAMES = ["Topic", "Subtopic", "Concept", "Skill"]
+ALWAYS_DRAWN_LEVELS = 2   # topics and subtopics, at any zoom
+MIN_NODE_SPACING = 12     # pixels between neighbouring nodes of a ring before the ring is drawn
+
+
+class TaxonomyLayout:
+    def __init__(self, rings: Optional[Tuple[Dict[str, Tuple[float, float]], ...]] = None):
+        '''
+            rings: {name: (x, y)} per level, as returned by compute_gephi.compute_layout()
+        '''
+        rings = rings if rings is not None else compute_gephi.compute_layout()
+        self.names: List[str] = []
+        self.labels: List[str] = []
+        self.roots: List[str] = []          # main topic of each node
+        self.levels = array('b')
+        self.x = array('d')
+        self.y = array('d')
+        self.parents = array('l')           # -1 for main topics (and a few nodes whose parent is not in the taxonomy)
+        self.level_end = []                 # nodes[:level_end[L]] are the nodes of levels 0..L
+        self.spacing = []                   # distance between neighbours on each ring
+        self.index: Dict[str, int] = {}
+
+        for level, ring in enumerate(rings):
+            for name, (x, y) in ring.items():
+                if name in self.index:
+                    continue
+                self.index[name] = len(self.names)
+                self.names.append(name)
+                self.labels.append(name.split('->')[-1].replace('_', ' '))
+                self.roots.append(name.split('->')[0])
+                self.levels.append(level)
+                self.x.append(x)
+                self.y.append(y)
+                self.parents.append(self.index.get(name.rsplit('->', 1)[0], -1) if level else -1)
+            self.level_end.append(len(self.names))
+            points = list(ring.values())
+            self.spacing.append(math.dist(points[0], points[1]) if len(points) > 1 else math.inf)
+
+        self.extent = max(max(map(abs, self.x)), max(map(abs, self.y)))  # the whole graph fits in [-extent, extent]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def deepest_level(self, units_per_pixel: float) -> int:
+        deepest = ALWAYS_DRAWN_LEVELS - 1
+        for level in range(ALWAYS_DRAWN_LEVELS, len(self.spacing)):
+            if self.spacing[level] / units_per_pixel >= MIN_NODE_SPACING:
+                deepest = level
+        return deepest
+
+    def visible(self, x0: float, x1: float, y0: float, y1: float, pixels: int) -> List[int]:
+        '''
+            Indices of the nodes to draw in the view [x0, x1] x [y0, y1], shown on pixels screen pixels across.
+        '''
+        deepest = self.deepest_level(max(x1 - x0, y1 - y0) / max(pixels, 1))
+        x, y = self.x, self.y
+        return [i for i in range(self.level_end[deepest]) if x0 <= x[i] <= x1 and y0 <= y[i] <= y1]
+
+    def mastery(self, accuracy: Dict[str, Tuple[int, int]]) -> List[Optional[float]]:
+        '''
+            accuracy: {topic: (correct answers, verdicts)}. Topics not in the taxonomy are ignored.
+            Returns the share of correct answers per node, None where the student has no verdicts.
+        '''
+        correct = [0] * len(self.names)
+        total = [0] * len(self.names)
+        for topic, (right, count) in accuracy.items():
+            i = self.index.get(topic)
+            if i is not None:
+                correct[i] += right or 0
+                total[i] += count
+        for i in range(len(self.names) - 1, -1, -1):  # children come after their parents
+            parent = self.parents[i]
+            if parent >= 0:
+                correct[parent] += correct[i]
+                total[parent] += total[i]
+        return [correct[i] / total[i] if total[i] else None for i in range(len(self.names))]
+
+
+_layout = None
+_layout_lock = threading.Lock()
+
+def get_taxonomy_layout() -> TaxonomyLayout:
+    global _layout
+    with _layout_lock:
+        if _layout is None:
+            _layout = TaxonomyLayout()
+    return _layout
@@ -0,0 +1,64 @@
+####################################################################
+# Shared LLM Client Handles
+#
+# autogen builds an OpenAIWrapper for every agent, and the wrapper
+# opens an OpenAI client (HTTP connection pool and TLS context) for
+# every entry in the config_list. Those handles are thread-safe and
+# identical for agents with the same llm_config, so one set is kept
+# per config and each agent gets a light clone of the wrapper: its
+# own usage counters and model-client list, sharing the connections
+# and the config_list.
+#####################################################################
+import copy
+import json
+import threading
+from typing import Dict, List
+
+import autogen
+
+
+def config_key(config: Dict) -> str:
+    return json.dumps(config, sort_keys=True, default=str)
+
+
+class ClientPool:
+    def __init__(self):
+        self._templates: Dict[str, autogen.OpenAIWrapper] = {}
+        self._lock = threading.Lock()
+
+    def client_for(self, config: Dict) -> autogen.OpenAIWrapper:
+        key = config_key(config)
+        with self._lock:
+            template = self._templates.get(key)
+            if template is None:
+                template = self._templates[key] = autogen.OpenAIWrapper(**config)
+
+        client = copy.copy(template)
+        # Per agent: custom model clients are registered into this list, and usage is counted per wrapper
+        client._clients = list(template._clients)
+        client.total_usage_summary = None
+        client.actual_usage_summary = None
+        client.wrapper_id = id(client)
+        return client
+
+    def shared_objects(self) -> List:
+        '''
+            Everything the clones share, so per-session memory reports can leave it out.
+        '''
+        with self._lock:
+            templates = list(self._templates.values())
+        shared = []
+        for template in templates:
+            shared.append(template)
+            shared.extend(template._clients)
+            shared.append(getattr(template, "_config_list", None))
+        return [obj for obj in shared if obj is not None]
+
+    def __len__(self):
+        return len(self._templates)
+
+
+_client_pool = ClientPool()
+
+def get_client_pool() -> ClientPool:
+    return _client_pool
@@ -0,0 +1,261 @@
+####################################################################
+# Conversation Store
+#
+# Every message of every session, indexed for analytics:
+#   sessions  one row per tutoring session of a student
+#   messages  one row per groupchat message, with the speaking agent,
+#             the taxonomy node being worked on and the FSM state
+#   verdicts  one row per SolutionVerifierAgent answer
+#
+# Indexes on student, agent, taxonomy node and time make questions like
+# "what did student X do on Algebra->Linear_Equations last week?" an
+# indexed lookup:
+#
+#   get_conversation_store().messages(student_id="X", topic="Algebra->Linear_Equations",
+#                                     since=time.time() - 7 * 24 * 3600)
+#
+# Sessions write through a ConversationRecorder, which buffers rows
+# and inserts them in batches.
+#####################################################################
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+default_path = os.environ.get("ADAPTIVE_CONVERSATION_STORE",
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../.cache/conversations.db'))
+
+BATCH_SIZE = 32  # rows buffered by a recorder before they are inserted
+VERIFIER_NAME = "SolutionVerifierAgent"
+
+
+def is_correct_verdict(content: str) -> bool:
+    # The rule the FSMs use to read the verifier's answer
+    return "Yes" in (content or "")
+
+
+class ConversationStore:
+    def __init__(self, path: str = default_path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                student_id TEXT NOT NULL,
+                flow TEXT,
+                started REAL NOT NULL,
+                ended REAL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                student_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                agent TEXT,
+                role TEXT,
+                content TEXT,
+                topic TEXT,
+                fsm_state TEXT,
+                created REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS verdicts (
+                id INTEGER PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                student_id TEXT NOT NULL,
+                topic TEXT,
+                correct INTEGER NOT NULL,
+                content TEXT,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS sessions_by_student ON sessions (student_id, started);
+            CREATE INDEX IF NOT EXISTS messages_by_student ON messages (student_id, created);
+            CREATE INDEX IF NOT EXISTS messages_by_position ON messages (student_id, seq);
+            CREATE INDEX IF NOT EXISTS messages_by_agent ON messages (agent, created);
+            CREATE INDEX IF NOT EXISTS messages_by_topic ON messages (topic, created);
+            CREATE INDEX IF NOT EXISTS verdicts_by_student ON verdicts (student_id, topic, created);
+            CREATE INDEX IF NOT EXISTS verdicts_by_topic ON verdicts (topic, created);
+        """)
+
+    ########## Writing
+    def start_session(self, student_id: str, flow: Optional[str] = None) -> str:
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("INSERT INTO sessions (session_id, student_id, flow, started) VALUES (?, ?, ?, ?)",
+                               (session_id, student_id, flow, time.time()))
+        return session_id
+
+    def end_session(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE sessions SET ended = ? WHERE session_id = ?", (time.time(), session_id))
+
+    def insert_batch(self, messages: List[Tuple], verdicts: List[Tuple]) -> None:
+        '''
+            Rows as built by ConversationRecorder, inserted in one transaction.
+        '''
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT INTO messages (session_id, student_id, seq, agent, role, content, topic, fsm_state, created) "
+                                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", messages)
+                self._conn.executemany("INSERT INTO verdicts (session_id, student_id, topic, correct, content, created) "
+                                       "VALUES (?, ?, ?, ?, ?, ?)", verdicts)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    ########## Queries
+    def _select(self, table: str, columns: str, student_id=None, agent=None, topic=None, since=None, until=None,
+                limit=None, order: str = "created") -> List[Dict]:
+        clauses, parameters = [], []
+        if student_id is not None:
+            clauses.append("student_id = ?")
+            parameters.append(student_id)
+        if agent is not None:
+            clauses.append("agent = ?")
+            parameters.append(agent)
+        if topic is not None:
+            # A taxonomy node and everything below it (topic->...), as an index range.
+            # Siblings sharing a name prefix (Permutations_with_Repetition) are not below it.
+            clauses.append("(topic = ? OR (topic >= ? AND topic < ?))")
+            parameters += [topic, topic + "->", topic + "->\uffff"]
+        if since is not None:
+            clauses.append("created >= ?")
+            parameters.append(since)
+        if until is not None:
+            clauses.append("created < ?")
+            parameters.append(until)
+        query = f"SELECT {columns} FROM {table}"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += f" ORDER BY {order}"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(query, parameters).fetchall()]
+
+    def messages(self, student_id: Optional[str] = None, agent: Optional[str] = None, topic: Optional[str] = None,
+                 since: Optional[float] = None, until: Optional[float] = None, limit: Optional[int] = None) -> List[Dict]:
+        '''
+            Messages in time order. topic matches a taxonomy node and its subtopics.
+        '''
+        return self._select("messages", "session_id, student_id, seq, agent, role, content, topic, fsm_state, created",
+                            student_id, agent, topic, since, until, limit)
+
+    def verdicts(self, student_id: Optional[str] = None, topic: Optional[str] = None,
+                 since: Optional[float] = None, until: Optional[float] = None, limit: Optional[int] = None) -> List[Dict]:
+        return self._select("verdicts", "session_id, student_id, topic, correct, content, created",
+                            student_id, None, topic, since, until, limit)
+
+    def accuracy_by_topic(self, student_id: str, since: Optional[float] = None) -> Dict[str, Tuple[int, int]]:
+        '''
+            {topic: (correct answers, verdicts)}
+        '''
+        query = "SELECT topic, SUM(correct), COUNT(*) FROM verdicts WHERE student_id = ?"
+        parameters = [student_id]
+        if since is not None:
+            query += " AND created >= ?"
+            parameters.append(since)
+        with self._lock:
+            rows = self._conn.execute(query + " GROUP BY topic", parameters).fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def sessions(self, student_id: str) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT session_id, student_id, flow, started, ended FROM sessions "
+                                      "WHERE student_id = ? ORDER BY started", (student_id,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def history_length(self, student_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(seq) FROM messages WHERE student_id = ?", (student_id,)).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def history_page(self, student_id: str, start: int, stop: int) -> List[Dict]:
+        '''
+            Messages start..stop-1 of the student's history, as groupchat messages.
+        '''
+        with self._lock:
+            rows = self._conn.execute("SELECT agent, role, content FROM messages WHERE student_id = ? AND seq >= ? AND seq < ? "
+                                      "ORDER BY seq", (student_id, start, stop)).fetchall()
+        return [{"content": row["content"], "role": row["role"], "name": row["agent"]} for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ConversationRecorder:
+    '''
+        Records one session's groupchat messages. describe() returns the (topic, FSM state)
+        the session is in when a message is posted. Rows are buffered in memory; with a
+        persistence worker, the inserts run on it instead of the caller's thread.
+    '''
+    def __init__(self, store: ConversationStore, student_id: str, flow: Optional[str] = None,
+                 describe: Optional[Callable[[], Tuple[Optional[str], Optional[str]]]] = None, batch_size: int = BATCH_SIZE,
+                 persistence=None):
+        self.store = store
+        self.persistence = persistence
+        self.student_id = student_id
+        self.describe = describe or (lambda: (None, None))
+        self.batch_size = batch_size
+        self.session_id = store.start_session(student_id, flow)
+        self.seq = store.history_length(student_id)  # position of the next message in the student's history
+        self._messages = []
+        self._verdicts = []
+        self._lock = threading.Lock()
+
+    def append(self, message: Dict) -> None:
+        topic, state = self.describe()
+        now = time.time()
+        content = message.get("content")
+        content = content if content is None or isinstance(content, str) else str(content)
+        with self._lock:
+            self._messages.append((self.session_id, self.student_id, self.seq, message.get("name"), message.get("role"),
+                                   content, topic, state, now))
+            self.seq += 1
+            if message.get("name") == VERIFIER_NAME:
+                self._verdicts.append((self.session_id, self.student_id, topic, int(is_correct_verdict(content)), content, now))
+            full = len(self._messages) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            messages, verdicts = self._messages, self._verdicts
+            self._messages, self._verdicts = [], []
+        if messages or verdicts:
+            self._run(lambda: self.store.insert_batch(messages, verdicts))
+
+    def close(self) -> None:
+        self.flush()
+        self._run(lambda: self.store.end_session(self.session_id))
+
+    def _run(self, write: Callable[[], None]) -> None:
+        if self.persistence is not None:
+            self.persistence.submit(write)
+        else:
+            write()
+
+
+_conversation_store = None
+
+
+def get_conversation_store() -> ConversationStore:
+    global _conversation_store
+    if _conversation_store is None:
+        _conversation_store = ConversationStore()
+    return _conversation_store
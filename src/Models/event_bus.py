@@ -0,0 +1,141 @@
+####################################################################
+# Session Event Bus
+#
+# Agents, the FSM and the UI tabs of a session talk through typed
+# events instead of calling each other:
+#   MessagePosted   a groupchat message is ready to be shown
+#   InputRequested  an agent waits for the student's input
+#   VerdictIssued   the SolutionVerifierAgent judged an answer
+#   StateChanged    the FSM moved to another state
+#   MasteryUpdated  the student moved to another topic
+#
+# A subscriber names the event types it wants and receives them as a
+# list, in publish order. Events published while the event loop is
+# busy are delivered together once it is free, so a burst of agent
+# messages costs each subscriber one call. Events nobody subscribed
+# to are dropped when published.
+#
+# Only used on the event loop. Outside a running loop events are
+# delivered right away.
+#####################################################################
+import asyncio
+from typing import Callable, Dict, List, Optional, Type
+
+
+class Event:
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class MessagePosted(Event):
+    __slots__ = ("message", "user")
+
+    def __init__(self, message: Dict, user: str):
+        self.message = message
+        self.user = user  # the agent shown as the message's author
+
+
+class InputRequested(Event):
+    __slots__ = ("prompt", "agent")
+
+    def __init__(self, prompt: str, agent: str):
+        self.prompt = prompt
+        self.agent = agent
+
+
+class VerdictIssued(Event):
+    __slots__ = ("correct", "content", "topic")
+
+    def __init__(self, correct: bool, content: str, topic: Optional[str] = None):
+        self.correct = correct
+        self.content = content
+        self.topic = topic
+
+
+class StateChanged(Event):
+    __slots__ = ("flow", "previous", "state")
+
+    def __init__(self, flow: str, previous: str, state: str):
+        self.flow = flow
+        self.previous = previous
+        self.state = state
+
+
+class MasteryUpdated(Event):
+    __slots__ = ("topic", "skill_level", "correct")
+
+    def __init__(self, topic: Optional[str], skill_level: Optional[int], correct: Optional[bool]):
+        self.topic = topic              # the topic now being worked on
+        self.skill_level = skill_level  # None in the lesson flow, where the student picks the topic
+        self.correct = correct          # the verdict that led here, None when the student picked the topic
+
+
+Handler = Callable[[List[Event]], None]
+
+
+class EventBus:
+    def __init__(self):
+        self._subscribers: Dict[Type[Event], List[Handler]] = {}
+        self._pending: List[Event] = []
+        self._handle = None
+
+        # Metrics
+        self.published = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+
+    def subscribe(self, handler: Handler, *event_types: Type[Event]) -> None:
+        for event_type in event_types:
+            handlers = self._subscribers.setdefault(event_type, [])
+            if handler not in handlers:
+                handlers.append(handler)
+
+    def unsubscribe(self, handler: Handler) -> None:
+        for handlers in self._subscribers.values():
+            if handler in handlers:
+                handlers.remove(handler)
+
+    def publish(self, event: Event) -> None:
+        self.published += 1
+        if not self._subscribers.get(type(event)):
+            self.dropped += 1
+            return
+        self._pending.append(event)
+        if self._handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.deliver()
+            return
+        self._handle = loop.call_soon(self.deliver)
+
+    def deliver(self) -> None:
+        '''
+            Hand every pending event to its subscribers, one call per subscriber.
+        '''
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        events, self._pending = self._pending, []
+        if not events:
+            return
+        batches: Dict[Handler, List[Event]] = {}  # in order of each subscriber's first event
+        for event in events:
+            for handler in self._subscribers.get(type(event), ()):
+                batches.setdefault(handler, []).append(event)
+        for handler, batch in batches.items():
+            try:
+                handler(batch)
+            except Exception as e:
+                # One failing subscriber must not starve the others
+                self.errors += 1
+                print(f"Event handler {getattr(handler, '__qualname__', handler)} failed: {type(e).__name__}: {e}")
+        self.batches += 1
+
+    def stats(self) -> Dict:
+        return {"published": self.published, "dropped": self.dropped, "batches": self.batches, "errors": self.errors}
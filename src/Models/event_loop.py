@@ -0,0 +1,144 @@
+####################################################################
+# Event Loop Health
+#
+# Every Panel session of a process shares one asyncio event loop. A
+# synchronous autogen call made on it (send(..., request_reply=True)
+# waits for the model) freezes every student's tab until it returns.
+#
+#   BlockingPool     runs the sync calls that cannot be made async on a
+#                    bounded set of threads (BLOCKING_WORKERS). Callers
+#                    await the result; the loop keeps serving sessions.
+#   LoopLagMonitor   wakes up every interval and records how late it
+#                    was. A blocked loop shows up as lag.
+#
+# Both report stats() for the dashboard.
+#####################################################################
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from src.Models.llm_metrics import ROLLING_WINDOW, percentile
+
+
+BLOCKING_WORKERS = 8
+LAG_INTERVAL = 0.1  # seconds between loop lag samples
+
+
+class BlockingPool:
+    def __init__(self, max_workers: int = BLOCKING_WORKERS, window: int = ROLLING_WINDOW):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="blocking-call")
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.waiting = 0  # submitted, no thread free yet
+        self.wait_latencies = deque(maxlen=window)
+        self.run_latencies = deque(maxlen=window)
+
+    async def run(self, fn: Callable, *args):
+        '''
+            fn(*args) on a pool thread. The event loop is free until it returns.
+        '''
+        submitted = time.perf_counter()
+        with self._lock:
+            self.calls += 1
+            self.waiting += 1
+
+        def call():
+            started = time.perf_counter()
+            with self._lock:
+                self.waiting -= 1
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                self.wait_latencies.append(started - submitted)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.run_latencies.append(time.perf_counter() - started)
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            waits, runs = sorted(self.wait_latencies), sorted(self.run_latencies)
+            return {"calls": self.calls, "active": self.active, "max_active": self.max_active,
+                    "waiting": self.waiting, "workers": self.max_workers,
+                    "wait_p95": percentile(waits, 0.95), "run_p50": percentile(runs, 0.50),
+                    "run_p95": percentile(runs, 0.95)}
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = LAG_INTERVAL, window: int = ROLLING_WINDOW):
+        self.interval = interval
+        self.lags = deque(maxlen=window)
+        self.max_lag = 0.0
+        self._loop = None
+        self._handle = None
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> bool:
+        '''
+            Sample the given (or the running) loop. Calling it again for the same loop does nothing.
+            False when there is no loop to sample.
+        '''
+        if loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return False
+        if self._loop is loop and self._handle is not None:
+            return True
+        self.stop()
+        self._loop = loop
+        self._schedule()
+        return True
+
+    def _schedule(self) -> None:
+        expected = self._loop.time() + self.interval
+        self._handle = self._loop.call_at(expected, self._sample, expected)
+
+    def _sample(self, expected: float) -> None:
+        lag = max(0.0, self._loop.time() - expected)
+        self.lags.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        self._schedule()
+
+    def stop(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def stats(self) -> Dict:
+        lags = sorted(self.lags)
+        return {"samples": len(lags), "lag_p50": percentile(lags, 0.50), "lag_p95": percentile(lags, 0.95),
+                "lag_max": self.max_lag}
+
+
+_blocking_pool = None
+_loop_lag_monitor = None
+
+def get_blocking_pool() -> BlockingPool:
+    global _blocking_pool
+    if _blocking_pool is None:
+        _blocking_pool = BlockingPool()
+    return _blocking_pool
+
+def get_loop_lag_monitor() -> LoopLagMonitor:
+    global _loop_lag_monitor
+    if _loop_lag_monitor is None:
+        _loop_lag_monitor = LoopLagMonitor()
+    return _loop_lag_monitor
+
+async def run_blocking(fn: Callable, *args):
+    # Shortcut for the process-wide pool
+    return await get_blocking_pool().run(fn, *args)
@@ -0,0 +1,173 @@
+####################################################################
+# LLM Response Cache
+#
+# A disk-backed cache of LLM replies shared by every process on the
+# machine. Entries are keyed on the model, the llm_config and the
+# normalized message list, so repeated lessons and problem prompts
+# are answered without a round trip to the model.
+#####################################################################
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Union
+
+from src.Models import llm_config
+
+
+# Only these message fields influence the reply. Timestamps, context etc. are dropped.
+NORMALIZED_MESSAGE_KEYS = ("role", "name", "content", "function_call", "tool_calls", "tool_call_id")
+
+# llm_config entries that are not part of the request sent to the model
+NON_REQUEST_CONFIG_KEYS = ("cache", "cache_seed", "stream")
+
+
+class CacheStats:
+    '''
+        Hit/miss counters. Each MyConversableAgent keeps its own instance.
+    '''
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        if self.lookups == 0:
+            return 0.0
+        return self.hits / self.lookups
+
+    def to_dict(self) -> Dict:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hit_rate, 3)}
+
+
+def normalize_messages(messages: List[Dict]) -> List[Dict]:
+    normalized = []
+    for message in messages:
+        if isinstance(message, str):
+            message = {"content": message}
+        entry = {key: message[key] for key in NORMALIZED_MESSAGE_KEYS if message.get(key) is not None}
+        if isinstance(entry.get("content"), str):
+            # Only line endings and trailing whitespace. Indentation and inner spacing can change the reply (code, tables).
+            lines = entry["content"].replace("\r\n", "\n").replace("\r", "\n").split("\n")
+            entry["content"] = "\n".join(line.rstrip() for line in lines).rstrip("\n")
+        normalized.append(entry)
+    return normalized
+
+
+def make_key(config: Optional[Dict], messages: List[Dict]) -> str:
+    config = {k: v for k, v in (config or {}).items() if k not in NON_REQUEST_CONFIG_KEYS}
+    models = [c.get("model") for c in config.get("config_list", [])]
+    payload = {
+        "models": models,
+        "config": config,
+        "messages": normalize_messages(messages),
+    }
+    serialized = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    '''
+        SQLite in WAL mode lets several Panel processes read and write the same file.
+        Eviction is least-recently-used, bounded by entry count and total bytes.
+        Entries older than max_age_seconds are treated as misses and removed.
+    '''
+    def __init__(self, path: str, max_entries: int = 5000, max_bytes: int = 64 * 1024 * 1024,
+                 max_age_seconds: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # LLM calls run in executor threads, so the connection is shared across threads under a lock
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+
+    def get(self, key: str, default=None) -> Union[str, Dict, None]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return default
+            value, created = row
+            if self.max_age_seconds is not None and now - created > self.max_age_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return default
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key: str, value: Union[str, Dict]) -> None:
+        serialized = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                               (key, serialized, len(serialized), now, now))
+            self._evict()
+
+    def _evict(self) -> None:
+        if self.max_age_seconds is not None:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age_seconds,))
+
+        count, total_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        # Drop least recently used entries until both limits hold
+        excess = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC"):
+            if count <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            excess.append((key,))
+            count -= 1
+            total_bytes -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", excess)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache() -> LLMResponseCache:
+    '''
+        The process-wide cache used by MyConversableAgent. Created on first use.
+    '''
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMResponseCache(path=llm_config.cache_path,
+                                              max_entries=llm_config.cache_max_entries,
+                                              max_bytes=llm_config.cache_max_bytes,
+                                              max_age_seconds=llm_config.cache_max_age_seconds)
+    return _default_cache
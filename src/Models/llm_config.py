@@ -1,3 +1,5 @@
+import os
+
 gpt3_config_list = [
     {
         'model': "gpt-3.5-turbo",
@@ -10,6 +12,27 @@ gpt4_config_list = [
     }
 ]
 
+# Offline backend for profiling and load testing (see mock_llm.py)
+# ADAPTIVE_LLM_BACKEND=mock routes both configs to MockModelClient
+llm_backend = os.environ.get("ADAPTIVE_LLM_BACKEND", "openai")
+mock_transcript_path = os.environ.get("ADAPTIVE_LLM_MOCK_TRANSCRIPT", None)  # progress.json or a recorded cassette
+mock_latency_kind = os.environ.get("ADAPTIVE_LLM_MOCK_LATENCY_KIND", "lognormal")
+mock_latency_mean = float(os.environ.get("ADAPTIVE_LLM_MOCK_LATENCY", "1.0"))
+mock_latency_sigma = 0.5
+mock_seed = 53
+record_cassette_path = os.environ.get("ADAPTIVE_LLM_RECORD", None)  # record live replies for later replay
+
+mock_config_list = [
+    {
+        'model': "mock-tutor",
+        'model_client_cls': "MockModelClient",
+    }
+]
+
+if llm_backend == "mock":
+    gpt3_config_list = mock_config_list
+    gpt4_config_list = mock_config_list
+
 # These parameters attempt to produce precise reproducible results
 temperature = 0
 max_tokens = 500
@@ -18,13 +41,17 @@ frequency_penalty = 0.1
 presence_penalty = 0.1
 seed = 53
 
+# Stream tokens to the UI as they arrive (see token_stream.py)
+stream = True
+
 gpt3_config = {"config_list": gpt3_config_list, 
                "temperature": temperature,
                "max_tokens": max_tokens,
                "top_p": top_p,
                "frequency_penalty": frequency_penalty,
                "presence_penalty": presence_penalty,
-               "seed": seed
+               "seed": seed,
+               "stream": stream
 }
 
 gpt4_config = {"config_list": gpt4_config_list, 
@@ -33,5 +60,28 @@ gpt4_config = {"config_list": gpt4_config_list,
                "top_p": top_p,
                "frequency_penalty": frequency_penalty,
                "presence_penalty": presence_penalty,
-               "seed": seed
+               "seed": seed,
+               "stream": stream
+}
+
+if llm_backend == "mock":
+    # Let every mock call pay its simulated latency instead of hitting autogen's disk cache
+    gpt3_config["cache_seed"] = None
+    gpt4_config["cache_seed"] = None
+
+
+# Response cache shared by all agents and processes (see llm_cache.py)
+cache_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../.cache/llm_responses.db')
+cache_max_entries = 5000
+cache_max_bytes = 64 * 1024 * 1024
+cache_max_age_seconds = 7 * 24 * 60 * 60
+
+# Process-wide LLM request scheduler (see llm_scheduler.py)
+scheduler_max_concurrency = 8
+scheduler_max_retries = 5
+scheduler_base_backoff = 1.0   # seconds
+scheduler_max_backoff = 30.0   # seconds
+rate_limits = {
+    "gpt-4o": {"requests_per_minute": 500, "tokens_per_minute": 30000},
+    "gpt-3.5-turbo": {"requests_per_minute": 500, "tokens_per_minute": 200000},
 }
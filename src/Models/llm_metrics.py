@@ -0,0 +1,142 @@
+####################################################################
+# LLM Metrics
+#
+# In-process registry of every LLM call made through MyConversableAgent.
+# Each call is tagged with the agent, the FSM state and transition,
+# token counts and whether the response cache answered it. Rolling
+# p50/p95/p99 latencies are kept per agent, per state and per
+# transition, and the raw calls can be exported as CSV.
+#####################################################################
+import csv
+import io
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+
+# Calls kept for percentiles (per key) and for CSV export
+ROLLING_WINDOW = 500
+MAX_RECORDS = 10000
+
+CSV_FIELDS = ["timestamp", "agent", "model", "state", "transition", "latency", "prompt_tokens", "completion_tokens", "cache_hit"]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class RollingStats:
+    def __init__(self, window: int = ROLLING_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.total_latency = 0.0
+        self.cache_hits = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def add(self, latency: float, prompt_tokens: int, completion_tokens: int, cache_hit: bool) -> None:
+        self.latencies.append(latency)
+        self.calls += 1
+        self.total_latency += latency
+        self.cache_hits += int(cache_hit)
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+
+    def summary(self) -> Dict:
+        latencies = sorted(self.latencies)
+        return {
+            "calls": self.calls,
+            "cache_hit_rate": self.cache_hits / self.calls if self.calls else 0.0,
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "total_latency": self.total_latency,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+class MetricsRegistry:
+    def __init__(self, max_records: int = MAX_RECORDS, window: int = ROLLING_WINDOW):
+        self.window = window
+        self.records = deque(maxlen=max_records)
+        self.by_agent: Dict[str, RollingStats] = {}
+        self.by_state: Dict[str, RollingStats] = {}
+        self.by_transition: Dict[str, RollingStats] = {}
+        self._lock = threading.Lock()  # LLM calls are recorded from executor threads
+
+    def record(self, agent: str, latency: float, prompt_tokens: int = 0, completion_tokens: int = 0,
+               cache_hit: bool = False, state: Optional[str] = None, transition: Optional[str] = None,
+               model: Optional[str] = None) -> None:
+        record = {
+            "timestamp": time.time(),
+            "agent": agent,
+            "model": model or "",
+            "state": state or "",
+            "transition": transition or "",
+            "latency": latency,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cache_hit": cache_hit,
+        }
+        with self._lock:
+            self.records.append(record)
+            for table, key in ((self.by_agent, agent), (self.by_state, state), (self.by_transition, transition)):
+                if key:
+                    table.setdefault(key, RollingStats(self.window)).add(latency, prompt_tokens, completion_tokens, cache_hit)
+
+    def summary(self, group_by: str = "agent") -> Dict[str, Dict]:
+        table = {"agent": self.by_agent, "state": self.by_state, "transition": self.by_transition}[group_by]
+        with self._lock:
+            return {key: stats.summary() for key, stats in table.items()}
+
+    def to_csv(self) -> str:
+        with self._lock:
+            records = list(self.records)
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(records)
+        return output.getvalue()
+
+    def to_markdown(self, group_by: str = "agent") -> str:
+        summary = self.summary(group_by)
+        if not summary:
+            return ""
+        lines = [f"| {group_by.capitalize()} | Calls | Cache hits | p50 (s) | p95 (s) | p99 (s) | Total (s) | Prompt tokens | Completion tokens |",
+                 "|---|---|---|---|---|---|---|---|---|"]
+        # Largest total time first: that is where a tutoring cycle spends its time
+        for key, s in sorted(summary.items(), key=lambda item: item[1]["total_latency"], reverse=True):
+            lines.append(f"| {key} | {s['calls']} | {s['cache_hit_rate']:.0%} | {s['p50']:.2f} | {s['p95']:.2f} | {s['p99']:.2f} "
+                         f"| {s['total_latency']:.1f} | {s['prompt_tokens']} | {s['completion_tokens']} |")
+        return "\n".join(lines)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.records.clear()
+            self.by_agent.clear()
+            self.by_state.clear()
+            self.by_transition.clear()
+
+
+def usage_totals(llm_client) -> Tuple[int, int]:
+    '''
+        Prompt and completion tokens so far from an OpenAIWrapper's usage summary.
+    '''
+    usage = getattr(llm_client, "total_usage_summary", None) or {}
+    prompt_tokens = completion_tokens = 0
+    for model, model_usage in usage.items():
+        if isinstance(model_usage, dict):
+            prompt_tokens += model_usage.get("prompt_tokens", 0)
+            completion_tokens += model_usage.get("completion_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+_registry = MetricsRegistry()
+
+def get_registry() -> MetricsRegistry:
+    return _registry
@@ -0,0 +1,231 @@
+####################################################################
+# LLM Request Scheduler
+#
+# One process-wide gate in front of the model. Every live LLM call
+# made by MyConversableAgent passes through it:
+#   - at most max_concurrency requests are in flight
+#   - per-model request and token budgets (token buckets)
+#   - student-blocking roles are admitted before background roles
+#   - rate-limit errors are retried with jittered exponential backoff,
+#     and pause the model's bucket so other callers back off too
+#
+# autogen runs LLM calls on executor threads (a_generate_oai_reply uses
+# run_in_executor), so the scheduler uses a threading.Condition rather
+# than asyncio primitives.
+#####################################################################
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from src.Models import llm_config
+
+
+# Lower values are admitted first
+PRIORITY_INTERACTIVE = 0   # the student is waiting on the reply
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2    # nobody is waiting (e.g. learner-model refresh)
+
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_NORMAL: "normal", PRIORITY_BACKGROUND: "background"}
+
+ROLE_PRIORITIES = {
+    "TeacherAgent": PRIORITY_INTERACTIVE,
+    "TutorAgent": PRIORITY_INTERACTIVE,
+    "ProblemGeneratorAgent": PRIORITY_INTERACTIVE,
+    "SolutionVerifierAgent": PRIORITY_INTERACTIVE,
+    "KnowledgeTracerAgent": PRIORITY_INTERACTIVE,
+    "StudentAgent": PRIORITY_INTERACTIVE,
+    "ProgrammerAgent": PRIORITY_NORMAL,
+    "CodeRunnerAgent": PRIORITY_NORMAL,
+    "LevelAdapterAgent": PRIORITY_NORMAL,
+    "MotivatorAgent": PRIORITY_NORMAL,
+    "GamificationAgent": PRIORITY_NORMAL,
+    "LearnerModelAgent": PRIORITY_BACKGROUND,
+}
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return type(error).__name__ == "RateLimitError" or getattr(error, "status_code", None) == 429
+
+
+class TokenBucket:
+    '''
+        Refills continuously at capacity per period seconds.
+    '''
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.available = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity)  # an oversized request waits for a full bucket, not forever
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def consume(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.available -= min(amount, self.capacity)
+
+
+class ModelRateLimit:
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.paused_until = 0.0
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        wait = max(0.0, self.paused_until - now)
+        if self.requests:
+            wait = max(wait, self.requests.wait_time(1, now))
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        return wait
+
+    def consume(self, tokens: int, now: float) -> None:
+        if self.requests:
+            self.requests.consume(1, now)
+        if self.tokens:
+            self.tokens.consume(tokens, now)
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int = 8, rate_limits: Optional[Dict[str, Dict]] = None,
+                 max_retries: int = 5, base_backoff: float = 1.0, max_backoff: float = 30.0):
+        self.max_concurrency = max_concurrency
+        self.rate_limits = {model: ModelRateLimit(**limits) for model, limits in (rate_limits or {}).items()}
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (priority, sequence, model, tokens)
+        self._sequence = itertools.count()
+        self._active = 0
+        self._random = random.Random()
+
+        # Metrics
+        self.max_queue_depth = 0
+        self.completed = 0
+        self.rate_limit_retries = 0
+        self.total_wait = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self.admitted = {name: 0 for name in PRIORITY_NAMES.values()}
+
+    def run(self, fn: Callable, priority: int = PRIORITY_NORMAL, model: Optional[str] = None, tokens: int = 0):
+        '''
+            Call fn() once admitted. Rate-limit errors are retried, all other errors propagate.
+        '''
+        for attempt in range(self.max_retries + 1):
+            self._acquire(priority, model, tokens)
+            try:
+                return fn()
+            except Exception as error:
+                if not is_rate_limit_error(error) or attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                print(f"Rate limited on {model}. Retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                self._pause(model, delay)
+            finally:
+                self._release()
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": a random delay up to the exponential cap spreads retries out
+        with self._cond:
+            self.rate_limit_retries += 1
+            return self._random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    def _pause(self, model: Optional[str], delay: float) -> None:
+        with self._cond:
+            limit = self.rate_limits.get(model)
+            if limit is None:
+                limit = self.rate_limits[model] = ModelRateLimit()
+            limit.paused_until = max(limit.paused_until, time.monotonic() + delay)
+            self._cond.notify_all()
+
+    def _next_admissible(self, now: float):
+        '''
+            The highest priority waiter whose model has budget now, and the
+            shortest time until any waiter could be admitted.
+        '''
+        shortest_wait = None
+        for ticket in sorted(self._waiting):
+            limit = self.rate_limits.get(ticket[2])
+            wait = limit.wait_time(ticket[3], now) if limit else 0.0
+            if wait == 0.0:
+                return ticket, 0.0
+            shortest_wait = wait if shortest_wait is None else min(shortest_wait, wait)
+        return None, shortest_wait
+
+    def _acquire(self, priority: int, model: Optional[str], tokens: int) -> None:
+        start = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._sequence), model, tokens)
+            heapq.heappush(self._waiting, ticket)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._waiting))
+            while True:
+                if self._active < self.max_concurrency:
+                    now = time.monotonic()
+                    winner, wait = self._next_admissible(now)
+                    if winner == ticket:
+                        break
+                    self._cond.wait(timeout=wait if winner is None else None)
+                else:
+                    self._cond.wait()
+
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            limit = self.rate_limits.get(model)
+            if limit:
+                limit.consume(tokens, time.monotonic())
+            self._active += 1
+
+            name = PRIORITY_NAMES.get(priority, str(priority))
+            self.total_wait[name] = self.total_wait.get(name, 0.0) + time.monotonic() - start
+            self.admitted[name] = self.admitted.get(name, 0) + 1
+            self._cond.notify_all()
+
+    def _release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self.completed += 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for ticket in self._waiting:
+                name = PRIORITY_NAMES.get(ticket[0], str(ticket[0]))
+                depth[name] = depth.get(name, 0) + 1
+            return {
+                "queue_depth": len(self._waiting),
+                "queue_depth_by_priority": depth,
+                "max_queue_depth": self.max_queue_depth,
+                "active": self._active,
+                "completed": self.completed,
+                "rate_limit_retries": self.rate_limit_retries,
+                "mean_wait": {name: self.total_wait[name] / self.admitted[name] if self.admitted.get(name) else 0.0
+                              for name in self.total_wait},
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(max_concurrency=llm_config.scheduler_max_concurrency,
+                                      rate_limits=llm_config.rate_limits,
+                                      max_retries=llm_config.scheduler_max_retries,
+                                      base_backoff=llm_config.scheduler_base_backoff,
+                                      max_backoff=llm_config.scheduler_max_backoff)
+    return _scheduler
@@ -0,0 +1,180 @@
+####################################################################
+# Bounded Message History
+#
+# groupchat.messages and every agent's chat_messages grow for the
+# whole session. SpillingMessageList keeps the newest messages in
+# memory and appends older ones to an on-disk segment, so resident
+# memory per session stays flat. It behaves like the list it replaces:
+# len(), indexing, slicing and iteration read through to disk.
+#
+# All lists of a session share one SpillSegment (one append-only
+# file), so a session never holds more than one file descriptor.
+#####################################################################
+import json
+import os
+import tempfile
+import threading
+from array import array
+from collections import deque
+from collections.abc import MutableSequence
+from typing import Dict, Iterable, List
+
+
+default_spill_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../.cache/spill')
+
+
+class SpillSegment:
+    '''
+        Append-only file of JSON records. Records are addressed by byte offset.
+        The file is created on the first write and deleted by close().
+    '''
+    def __init__(self, directory: str = default_spill_directory):
+        self.directory = directory
+        self.path = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, record) -> int:
+        line = (json.dumps(record, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            if self._file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                descriptor, self.path = tempfile.mkstemp(prefix="messages_", suffix=".jsonl", dir=self.directory)
+                self._file = os.fdopen(descriptor, "a+b")
+            self._file.seek(0, os.SEEK_END)
+            offset = self._file.tell()
+            self._file.write(line)
+            return offset
+
+    def read(self, offset: int):
+        with self._lock:
+            if self._file is None:
+                raise IndexError("nothing has been spilled")
+            self._file.flush()
+            self._file.seek(offset)
+            return json.loads(self._file.readline())
+
+    def read_many(self, offsets: Iterable[int]) -> List:
+        offsets = list(offsets)
+        with self._lock:
+            if self._file is None or not offsets:
+                return []
+            self._file.flush()
+            records = []
+            for offset in offsets:
+                self._file.seek(offset)
+                records.append(json.loads(self._file.readline()))
+            return records
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            if self._file is None:
+                return 0
+            self._file.seek(0, os.SEEK_END)
+            return self._file.tell()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                os.remove(self.path)
+
+
+class SpillingMessageList(MutableSequence):
+    '''
+        Keeps the last `capacity` messages in memory. Older messages live in the segment
+        and are read back on access. Spilled messages can be replaced but not removed.
+    '''
+    def __init__(self, segment: SpillSegment, capacity: int, messages: Iterable[Dict] = ()):
+        self.segment = segment
+        self.capacity = capacity
+        self._offsets = array('q')  # segment offset of each spilled message, oldest first
+        self._recent = deque()
+        for message in messages:
+            self.append(message)
+
+    @property
+    def spilled(self) -> int:
+        return len(self._offsets)
+
+    def append(self, message: Dict) -> None:
+        self._recent.append(message)
+        while len(self._recent) > self.capacity:
+            self._offsets.append(self.segment.write(self._recent.popleft()))
+
+    def _index(self, index: int) -> int:
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("message index out of range")
+        return index
+
+    def __len__(self) -> int:
+        return len(self._offsets) + len(self._recent)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            indices = range(*index.indices(len(self)))
+            spilled = [i for i in indices if i < self.spilled]
+            records = dict(zip(spilled, self.segment.read_many([self._offsets[i] for i in spilled]))) if spilled else {}
+            return [records[i] if i in records else self._recent[i - self.spilled] for i in indices]
+        index = self._index(index)
+        if index < self.spilled:
+            return self.segment.read(self._offsets[index])
+        return self._recent[index - self.spilled]
+
+    def __setitem__(self, index, message) -> None:
+        if isinstance(index, slice):
+            raise TypeError("slice assignment is not supported")
+        index = self._index(index)
+        if index < self.spilled:
+            self._offsets[index] = self.segment.write(message)
+        else:
+            self._recent[index - self.spilled] = message
+
+    def __delitem__(self, index) -> None:
+        if isinstance(index, slice):
+            raise TypeError("slice deletion is not supported")
+        index = self._index(index)
+        if index < self.spilled:
+            raise NotImplementedError("spilled messages cannot be removed")
+        del self._recent[index - self.spilled]
+
+    def insert(self, index: int, message: Dict) -> None:
+        if index < 0:
+            index = max(0, index + len(self))
+        if index < self.spilled:
+            raise NotImplementedError("messages cannot be inserted before spilled messages")
+        self._recent.insert(index - self.spilled, message)
+        while len(self._recent) > self.capacity:
+            self._offsets.append(self.segment.write(self._recent.popleft()))
+
+    def __iter__(self):
+        # Read the spilled part in one pass, then the in-memory tail
+        yield from self.segment.read_many(self._offsets) if self._offsets else []
+        yield from list(self._recent)
+
+    def clear(self) -> None:
+        self._offsets = array('q')
+        self._recent.clear()
+
+    def copy(self) -> List[Dict]:
+        return list(self)
+
+    # autogen prepends the system message with "+"
+    def __add__(self, other) -> List[Dict]:
+        return list(self) + list(other)
+
+    def __radd__(self, other) -> List[Dict]:
+        return list(other) + list(self)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, SpillingMessageList)):
+            return len(self) == len(other) and list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"SpillingMessageList({len(self)} messages, {self.spilled} on disk)"
@@ -0,0 +1,283 @@
+####################################################################
+# Offline Mock LLM Backend
+#
+# An autogen custom model client that never touches the network.
+# Replies either replay a recorded transcript (e.g. progress.json or a
+# cassette written by CassetteRecorder) or come from per-agent scripts.
+# Each call sleeps for a latency drawn from a configurable distribution
+# so the orchestration (FSM, GroupChat, Panel, persistence) can be
+# profiled and load-tested without a model.
+#
+# Enable with ADAPTIVE_LLM_BACKEND=mock (see llm_config.py).
+#####################################################################
+import atexit
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Union
+
+from src.Models import llm_config
+from src.Models.llm_cache import make_key
+from src.Models.session_log import SessionLog
+
+
+MOCK_MODEL_CLIENT_CLS = "MockModelClient"
+
+# Replies that keep the tutoring FSM moving from one state to the next
+DEFAULT_SCRIPTS = {
+    "TeacherAgent": ["Today we will study linear equations. To solve 2x + 5 = 17, subtract 5 from both sides and divide by 2."],
+    "TutorAgent": ["Let's practice with a problem. ProblemGeneratorAgent, please provide a question."],
+    "ProblemGeneratorAgent": ["Solve for x: 2x + 5 = 17"],
+    "SolutionVerifierAgent": ["Yes, the answer is correct."],
+    "ProgrammerAgent": ["```python\nx = (17 - 5) / 2\nprint(x)\n```"],
+    "CodeRunnerAgent": ["The program printed 6.0"],
+    "LearnerModelAgent": ["The student solves one-step linear equations correctly."],
+    "LevelAdapterAgent": ["The answer was correct. Increase the difficulty."],
+    "MotivatorAgent": ["Well done! Keep up the great work."],
+    "KnowledgeTracerAgent": ["The student knows how to solve linear equations."],
+    "GamificationAgent": ["You earned 10 points!"],
+}
+DEFAULT_REPLY = "OK."
+
+# Share of the simulated latency spent before the first streamed chunk
+FIRST_TOKEN_FRACTION = 0.2
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for English text
+    return max(1, len(text or "") // 4)
+
+
+class LatencyModel:
+    '''
+        Latency per call in seconds. kind is "fixed", "uniform" or "lognormal".
+        For lognormal, mean is the median and sigma the spread of log(latency).
+    '''
+    def __init__(self, kind: str = "lognormal", mean: float = 1.0, sigma: float = 0.5, low: float = 0.0, high: float = 2.0, seed: Optional[int] = None):
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.kind = kind
+        self.mean = mean
+        self.sigma = sigma
+        self.low = low
+        self.high = high
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.kind == "fixed":
+                return self.mean
+            if self.kind == "uniform":
+                return self._random.uniform(self.low, self.high)
+            if self.mean <= 0:
+                return 0.0
+            return self._random.lognormvariate(mu=math.log(self.mean), sigma=self.sigma)
+
+
+def cassette_key(agent_name: str, messages: List[Dict]) -> str:
+    # The agent and its client see slightly different configs, so only the name and messages are keyed
+    return make_key({"agent": agent_name}, messages)
+
+
+class MockBackend:
+    '''
+        Chooses the reply for an agent.
+
+        Lookup order:
+          1. A cassette entry recorded for exactly these messages
+          2. The next transcript message spoken by this agent
+          3. The next scripted reply for this agent (a list cycles, a callable gets the messages)
+          4. DEFAULT_REPLY
+    '''
+    def __init__(self, scripts: Optional[Dict[str, Union[List[str], Callable]]] = None,
+                 transcript: Optional[List[Dict]] = None,
+                 cassette: Optional[List[Dict]] = None,
+                 latency: Optional[LatencyModel] = None):
+        self.scripts = DEFAULT_SCRIPTS if scripts is None else scripts
+        self.latency = latency or LatencyModel(kind="fixed", mean=0.0)
+        self._lock = threading.Lock()
+        self._script_positions: Dict[str, int] = {}
+
+        self._transcript_by_agent: Dict[str, List[str]] = {}
+        for message in transcript or []:
+            if message.get("content"):
+                self._transcript_by_agent.setdefault(message.get("name", ""), []).append(message["content"])
+        self._transcript_positions: Dict[str, int] = {}
+
+        self._cassette = {entry["key"]: entry["reply"] for entry in cassette or []}
+
+    @classmethod
+    def from_file(cls, filename: str, **kwargs) -> "MockBackend":
+        '''
+            Load either a chat history (a list of messages, e.g. progress.json)
+            or a cassette ({"interactions": [...]}) written by CassetteRecorder.
+        '''
+        with open(filename, "r") as f:
+            data = json.load(f)
+        if isinstance(data, dict) and "interactions" in data:
+            return cls(cassette=data["interactions"], transcript=data["interactions"], **kwargs)
+        return cls(transcript=SessionLog(filename).read(), **kwargs)  # the snapshot plus messages not compacted yet
+
+    def reply(self, agent_name: str, messages: List[Dict]) -> str:
+        with self._lock:
+            key = cassette_key(agent_name, messages)
+            if key in self._cassette:
+                return self._cassette[key]
+
+            recorded = self._transcript_by_agent.get(agent_name)
+            if recorded:
+                position = self._transcript_positions.get(agent_name, 0)
+                self._transcript_positions[agent_name] = position + 1
+                return recorded[position % len(recorded)]
+
+            script = self.scripts.get(agent_name)
+            if callable(script):
+                return script(messages)
+            if script:
+                position = self._script_positions.get(agent_name, 0)
+                self._script_positions[agent_name] = position + 1
+                return script[position % len(script)]
+
+            return DEFAULT_REPLY
+
+
+class MockModelClient:
+    '''
+        Implements autogen's ModelClient protocol. Registered on each agent with
+        agent.register_model_client(model_client_cls=MockModelClient, backend=..., agent_name=...)
+    '''
+    def __init__(self, config: Dict, backend: Optional[MockBackend] = None, agent_name: str = "", **kwargs):
+        self.config = config
+        self.backend = backend or get_default_backend()
+        self.agent_name = agent_name
+
+    def create(self, params: Dict):
+        messages = params.get("messages", [])
+        content = self.backend.reply(self.agent_name, messages)
+        latency = self.backend.latency.sample()
+        if params.get("stream", False):
+            self._stream(content, latency)
+        else:
+            time.sleep(latency)
+
+        prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+        completion_tokens = estimate_tokens(content)
+        message = SimpleNamespace(content=content, role="assistant", function_call=None, tool_calls=None)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message, finish_reason="stop", index=0)],
+            model=params.get("model", self.config.get("model", "mock")),
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens,
+                                  completion_tokens=completion_tokens,
+                                  total_tokens=prompt_tokens + completion_tokens),
+            cost=0.0,
+        )
+
+    def _stream(self, content: str, latency: float) -> None:
+        '''
+            Print word-sized chunks through autogen's IOStream like OpenAIClient does,
+            spending FIRST_TOKEN_FRACTION of the latency before the first chunk.
+        '''
+        from autogen.io.base import IOStream
+
+        iostream = IOStream.get_default()
+        chunks = re.findall(r'\S+\s*|\s+', content) or [""]
+        time.sleep(latency * FIRST_TOKEN_FRACTION)
+        per_chunk = latency * (1 - FIRST_TOKEN_FRACTION) / len(chunks)
+        for chunk in chunks:
+            iostream.print(chunk, end="", flush=True)
+            time.sleep(per_chunk)
+        iostream.print("\033[0m\n")
+
+    def message_retrieval(self, response) -> List[str]:
+        return [choice.message.content for choice in response.choices]
+
+    def cost(self, response) -> float:
+        return 0.0
+
+    @staticmethod
+    def get_usage(response) -> Dict:
+        return {
+            "prompt_tokens": response.usage.prompt_tokens,
+            "completion_tokens": response.usage.completion_tokens,
+            "total_tokens": response.usage.total_tokens,
+            "cost": response.cost,
+            "model": response.model,
+        }
+
+
+def uses_mock_client(config) -> bool:
+    if not config:
+        return False
+    return any(c.get("model_client_cls") == MOCK_MODEL_CLIENT_CLS for c in config.get("config_list", []))
+
+
+class CassetteRecorder:
+    '''
+        Records live interactions so a session can be replayed offline later.
+        MyConversableAgent calls record() after every live LLM reply while recording.
+    '''
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.interactions: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def record(self, agent_name: str, messages: List[Dict], reply) -> None:
+        if not isinstance(reply, str):
+            return  # Only plain text replies can be replayed
+        with self._lock:
+            self.interactions.append({"key": cassette_key(agent_name, messages), "name": agent_name, "content": reply, "reply": reply})
+
+    def save(self) -> None:
+        with self._lock:
+            with open(self.filename, "w") as f:
+                json.dump({"interactions": self.interactions}, f, indent=4)
+        print(f"Cassette saved to: {self.filename}")
+
+
+_default_backend = None
+_recorder = None
+_module_lock = threading.Lock()
+
+def get_default_backend() -> MockBackend:
+    global _default_backend
+    with _module_lock:
+        if _default_backend is None:
+            latency = LatencyModel(kind=llm_config.mock_latency_kind,
+                                   mean=llm_config.mock_latency_mean,
+                                   sigma=llm_config.mock_latency_sigma,
+                                   seed=llm_config.mock_seed)
+            if llm_config.mock_transcript_path and os.path.exists(llm_config.mock_transcript_path):
+                _default_backend = MockBackend.from_file(llm_config.mock_transcript_path, latency=latency)
+            else:
+                _default_backend = MockBackend(latency=latency)
+    return _default_backend
+
+def set_default_backend(backend: MockBackend) -> None:
+    global _default_backend
+    with _module_lock:
+        _default_backend = backend
+
+def start_recording(filename: str) -> CassetteRecorder:
+    global _recorder
+    _recorder = CassetteRecorder(filename)
+    return _recorder
+
+def stop_recording() -> None:
+    global _recorder
+    if _recorder is not None:
+        _recorder.save()
+    _recorder = None
+
+def get_recorder() -> Optional[CassetteRecorder]:
+    return _recorder
+
+
+if llm_config.record_cassette_path:
+    start_recording(llm_config.record_cassette_path)
+    atexit.register(stop_recording)
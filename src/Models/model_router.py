@@ -0,0 +1,117 @@
+####################################################################
+# Model Tier Router
+#
+# Picks gpt3_config ("fast") or gpt4_config ("strong") per agent role
+# and FSM state. Each role declares its preferred tier and a latency
+# budget. When the observed latency of the strong tier breaks the
+# budget, the role falls back to the fast tier for a cool-down period
+# and then probes the strong tier again. A role never falls back to a
+# tier whose observed quality (non-empty, error-free replies) is poor.
+#####################################################################
+import threading
+import time
+from typing import Dict, Optional
+
+from src.Models.llm_config import gpt3_config, gpt4_config
+
+
+FAST = "fast"
+STRONG = "strong"
+
+TIER_CONFIGS = {
+    FAST: gpt3_config,
+    STRONG: gpt4_config,
+}
+
+# Fastest first. A tier that breaks its budget falls back to the one before it.
+TIER_ORDER = [FAST, STRONG]
+
+# Preferred tier and latency budget (seconds per call) for each role
+ROLE_MODEL_POLICIES = {
+    "TeacherAgent":          {"tier": STRONG, "latency_budget": 15.0},
+    "TutorAgent":            {"tier": STRONG, "latency_budget": 8.0},
+    "KnowledgeTracerAgent":  {"tier": STRONG, "latency_budget": 8.0},
+    "ProblemGeneratorAgent": {"tier": STRONG, "latency_budget": 8.0},
+    "SolutionVerifierAgent": {"tier": STRONG, "latency_budget": 8.0},
+    "ProgrammerAgent":       {"tier": STRONG, "latency_budget": 12.0},
+    "CodeRunnerAgent":       {"tier": FAST,   "latency_budget": 5.0},
+    "LearnerModelAgent":     {"tier": STRONG, "latency_budget": 20.0},
+    "LevelAdapterAgent":     {"tier": FAST,   "latency_budget": 3.0},
+    "MotivatorAgent":        {"tier": FAST,   "latency_budget": 3.0},
+    "GamificationAgent":     {"tier": FAST,   "latency_budget": 3.0},
+}
+DEFAULT_POLICY = {"tier": STRONG, "latency_budget": 10.0}
+
+# (role, FSM state) pairs that need a different tier than the role's default
+STATE_OVERRIDES = {
+    # The tutor only hands over to the ProblemGeneratorAgent here
+    ("TutorAgent", "AwaitingProblem"): FAST,
+}
+
+EWMA_ALPHA = 0.3          # weight of the newest latency/quality sample
+MIN_SAMPLES = 3           # observations before a tier can be judged
+COOLDOWN_SECONDS = 120.0  # time on the fallback tier before probing again
+MIN_QUALITY = 0.8         # a fallback tier must produce usable replies at least this often
+
+
+class TierStats:
+    def __init__(self):
+        self.samples = 0
+        self.latency = 0.0
+        self.quality = 1.0
+        self.fallback_until = 0.0
+
+    def observe(self, latency: float, ok: bool) -> None:
+        if self.samples == 0:
+            self.latency = latency
+        else:
+            self.latency = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency
+        self.quality = EWMA_ALPHA * float(ok) + (1 - EWMA_ALPHA) * self.quality
+        self.samples += 1
+
+
+class ModelRouter:
+    def __init__(self, policies: Optional[Dict] = None, state_overrides: Optional[Dict] = None):
+        self.policies = ROLE_MODEL_POLICIES if policies is None else policies
+        self.state_overrides = STATE_OVERRIDES if state_overrides is None else state_overrides
+        self._stats: Dict[tuple, TierStats] = {}
+        self._lock = threading.Lock()
+
+    def _tier_stats(self, role: str, tier: str) -> TierStats:
+        return self._stats.setdefault((role, tier), TierStats())
+
+    def choose(self, role: str, state: Optional[str] = None) -> str:
+        policy = self.policies.get(role, DEFAULT_POLICY)
+        tier = self.state_overrides.get((role, state), policy["tier"])
+        now = time.monotonic()
+        with self._lock:
+            # Step down while the current tier is cooling off and the faster one is good enough
+            while TIER_ORDER.index(tier) > 0 and self._tier_stats(role, tier).fallback_until > now:
+                faster = TIER_ORDER[TIER_ORDER.index(tier) - 1]
+                faster_stats = self._tier_stats(role, faster)
+                if faster_stats.samples >= MIN_SAMPLES and faster_stats.quality < MIN_QUALITY:
+                    break
+                tier = faster
+        return tier
+
+    def observe(self, role: str, tier: str, latency: float, ok: bool = True) -> None:
+        budget = self.policies.get(role, DEFAULT_POLICY)["latency_budget"]
+        with self._lock:
+            stats = self._tier_stats(role, tier)
+            stats.observe(latency, ok)
+            if TIER_ORDER.index(tier) > 0 and stats.samples >= MIN_SAMPLES and stats.latency > budget:
+                stats.fallback_until = time.monotonic() + COOLDOWN_SECONDS
+                print(f"{role}: {tier} tier averaging {stats.latency:.1f}s (budget {budget:.1f}s). "
+                      f"Falling back for {COOLDOWN_SECONDS:.0f}s")
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {f"{role}/{tier}": {"samples": s.samples, "latency": s.latency, "quality": s.quality,
+                                       "falling_back": s.fallback_until > time.monotonic()}
+                    for (role, tier), s in self._stats.items()}
+
+
+_router = ModelRouter()
+
+def get_router() -> ModelRouter:
+    return _router
@@ -0,0 +1,222 @@
+####################################################################
+# Write-behind Persistence
+#
+# Session logs, checkpoints and store writes used to run on the event
+# loop that serves every student's websocket, so a slow disk stalled
+# everyone on the process. They now go to one background thread per
+# process through a bounded queue:
+#   - appends to the same sink are batched into one write
+#     (append_many() when the sink has it)
+#   - jobs submitted with a key are coalesced: a newer job replaces
+#     the pending one (only the latest checkpoint matters)
+#   - when max_pending jobs are queued, submitters on other threads
+#     block until the worker catches up (backpressure). The event loop
+#     never blocks: its jobs are still queued and counted as overflow.
+#     Keyed jobs are coalesced and messages cannot be dropped, so this
+#     only grows the queue by the messages the loop produces.
+#   - flush() waits for everything submitted so far, and the queue is
+#     drained when the process exits
+#
+# Jobs run in submission order, so a checkpoint is written after the
+# messages it covers.
+#####################################################################
+import asyncio
+import atexit
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Hashable, Optional
+
+from src.Models.llm_metrics import ROLLING_WINDOW, percentile
+
+
+MAX_PENDING = 1000
+BATCH_SIZE = 64  # jobs taken from the queue per wakeup
+
+
+class _Job:
+    __slots__ = ("sink", "record", "fn", "key", "cancelled")
+
+    def __init__(self, sink=None, record=None, fn=None, key=None):
+        self.sink = sink
+        self.record = record
+        self.fn = fn
+        self.key = key
+        self.cancelled = False
+
+
+class PersistenceWorker:
+    def __init__(self, max_pending: int = MAX_PENDING, batch_size: int = BATCH_SIZE, window: int = ROLLING_WINDOW):
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self._queue = deque()
+        self._latest: Dict[Hashable, _Job] = {}  # key -> pending job
+        self._cond = threading.Condition()
+        self._submitted = 0   # jobs accepted, and jobs finished. flush() waits for them to meet.
+        self._finished = 0
+        self._stopping = False
+        self._thread = None
+
+        # Metrics
+        self.max_depth = 0
+        self.batches = 0
+        self.coalesced = 0
+        self.blocked = 0
+        self.blocked_seconds = 0.0
+        self.overflowed = 0  # jobs queued over max_pending by the event loop
+        self.errors = 0
+        self.write_latencies = deque(maxlen=window)
+
+    ########## Producers
+    def append(self, sink, record) -> None:
+        '''
+            sink.append(record) on the worker. Consecutive records for a sink are written together.
+        '''
+        self._put(_Job(sink=sink, record=record))
+
+    def submit(self, fn: Callable[[], None], key: Optional[Hashable] = None) -> None:
+        '''
+            Run fn on the worker. A pending job with the same key is dropped in favour of this one.
+        '''
+        self._put(_Job(fn=fn, key=key))
+
+    def _put(self, job: _Job) -> None:
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="persistence-worker", daemon=True)
+                self._thread.start()
+            if len(self._queue) >= self.max_pending and _on_event_loop():
+                self.overflowed += 1  # every session on the process would wait
+            elif len(self._queue) >= self.max_pending and threading.current_thread() is not self._thread:
+                self.blocked += 1
+                start = time.perf_counter()
+                while len(self._queue) >= self.max_pending and not self._stopping:
+                    self._cond.wait()
+                self.blocked_seconds += time.perf_counter() - start
+            if job.key is not None:
+                previous = self._latest.get(job.key)
+                if previous is not None:
+                    previous.cancelled = True
+                    self.coalesced += 1
+                self._latest[job.key] = job
+            self._queue.append(job)
+            self._submitted += 1
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        '''
+            Wait until every job submitted so far has run. False on timeout.
+        '''
+        with self._cond:
+            target = self._submitted
+            return self._cond.wait_for(lambda: self._finished >= target, timeout)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    ########## Worker
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._stopping)
+                if not self._queue and self._stopping:
+                    return
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                for job in batch:
+                    if job.key is not None and self._latest.get(job.key) is job:
+                        del self._latest[job.key]
+                self._cond.notify_all()  # room for blocked producers
+
+            start = time.perf_counter()
+            self._write(batch)
+            elapsed = time.perf_counter() - start
+
+            with self._cond:
+                self.batches += 1
+                self.write_latencies.append(elapsed)
+                self._finished += len(batch)
+                self._cond.notify_all()
+
+    def _write(self, batch) -> None:
+        pending = {}  # sink -> records, in order of first append
+        for job in batch:
+            if job.sink is not None:
+                pending.setdefault(job.sink, []).append(job.record)
+                continue
+            # Records appended before this job are written first
+            self._write_records(pending)
+            pending = {}
+            if not job.cancelled:
+                self._call(job.fn)
+        self._write_records(pending)
+
+    def _write_records(self, pending: Dict) -> None:
+        for sink, records in pending.items():
+            if hasattr(sink, "append_many"):
+                self._call(lambda: sink.append_many(records))
+            else:
+                for record in records:
+                    self._call(lambda: sink.append(record))
+
+    def _call(self, fn: Callable[[], None]) -> None:
+        try:
+            fn()
+        except Exception as e:
+            self.errors += 1
+            print(f"Persistence job failed: {type(e).__name__}: {e}")
+
+    ########## Metrics
+    def stats(self) -> Dict:
+        with self._cond:
+            latencies = sorted(self.write_latencies)
+            return {
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self.max_depth,
+                "jobs": self._finished,
+                "batches": self.batches,
+                "coalesced": self.coalesced,
+                "blocked": self.blocked,
+                "blocked_seconds": self.blocked_seconds,
+                "overflowed": self.overflowed,
+                "errors": self.errors,
+                "write_p50": percentile(latencies, 0.50),
+                "write_p95": percentile(latencies, 0.95),
+            }
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class WriteBehindSink:
+    '''
+        A groupchat message sink whose appends run on the persistence worker.
+    '''
+    def __init__(self, sink, worker: PersistenceWorker):
+        self.sink = sink
+        self.worker = worker
+
+    def append(self, message) -> None:
+        self.worker.append(self.sink, message)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def get_persistence_worker() -> PersistenceWorker:
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = PersistenceWorker()
+            atexit.register(_worker.stop, 30.0)  # write everything still queued before exiting
+    return _worker
@@ -0,0 +1,387 @@
+####################################################################
+# Append-only Session Log
+#
+# A chat history is a snapshot plus a tail:
+#   progress.json       JSON list of messages (the original format)
+#   progress.log.jsonl  one {"seq": n, "message": {...}} per line
+#
+# append() writes one line per message, so a save costs O(1) no
+# matter how long the history is. append_many() writes a batch at once. Lines reach the OS on every append
+# (they survive a crash of the process) and are fsync'ed in batches
+# (they survive a crash of the machine). compact() folds the tail into
+# a new snapshot, written to a temporary file and renamed over the old
+# one, so a crash never leaves the history half-written.
+#
+# read() rebuilds the history from the snapshot plus the tail. Tail
+# records already in the snapshot (a crash between the rename and the
+# truncation of the tail) are skipped by seq, and a torn last line is
+# dropped.
+#
+# A checkpoint (progress.checkpoint.json) holds what a resume needs:
+# the session state (FSM, learner model), the last page of messages
+# and a pointer into the log (message count and tail offset). resume()
+# reads the checkpoint and only the tail written after it, so reopening
+# a session does not parse the whole history.
+#
+# The snapshot holds one message per line. read_range() seeks to the
+# lines it needs through an index of byte offsets, built on first use
+# without parsing the messages, so paging back through a long history
+# does not parse all of it.
+#####################################################################
+import json
+import os
+import tempfile
+import threading
+import time
+from array import array
+from collections import deque
+from typing import Dict, List, Optional
+
+
+FSYNC_EVERY = 16              # messages
+FSYNC_INTERVAL_SECONDS = 1.0
+COMPACT_EVERY = 500           # tail records
+PAGE_SIZE = 20                # messages kept in the checkpoint
+CHECKPOINT_VERSION = 1
+
+
+def tail_path_for(snapshot_path: str) -> str:
+    return os.path.splitext(snapshot_path)[0] + ".log.jsonl"
+
+
+def checkpoint_path_for(snapshot_path: str) -> str:
+    return os.path.splitext(snapshot_path)[0] + ".checkpoint.json"
+
+
+def write_atomically(path: str, data, indent: Optional[int] = None) -> None:
+    '''
+        Write JSON to a temporary file and rename it over path, so readers see the old or the new file.
+    '''
+    write_bytes_atomically(path, json.dumps(data, indent=indent, default=str).encode("utf-8"))
+
+
+def write_snapshot(path: str, messages: List[Dict]) -> array:
+    '''
+        Write messages as a JSON list with one message per line. Returns the byte offset of each line.
+    '''
+    lines = [json.dumps(message, default=str).encode("utf-8") for message in messages]
+    offsets, position = array('q'), len(b"[\n")
+    for line in lines:
+        offsets.append(position)
+        position += len(line) + len(b",\n")
+    write_bytes_atomically(path, b"[\n" + b",\n".join(lines) + b"\n]\n")
+    return offsets
+
+
+def write_bytes_atomically(path: str, data: bytes) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+class SessionLog:
+    def __init__(self, path: str, fsync_every: int = FSYNC_EVERY, fsync_interval: float = FSYNC_INTERVAL_SECONDS,
+                 compact_every: int = COMPACT_EVERY, page_size: int = PAGE_SIZE):
+        self.path = path
+        self.tail_path = tail_path_for(path)
+        self.checkpoint_path = checkpoint_path_for(path)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._file = None
+        self._count = None        # messages in the log (snapshot + tail), known after the first read
+        self._tail_records = 0
+        self._recent = deque(maxlen=page_size)  # the last page of messages, for checkpoints
+        self._checkpoint_state = None           # state of the last checkpoint written or resumed
+        self._snapshot_offsets = None           # byte offset of each snapshot message, built by read_range()
+        self._tail_offsets = None               # byte offset of each tail message (seq from len(snapshot offsets))
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    ########## Reading
+    def _read_snapshot(self) -> List[Dict]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _read_tail(self, first_seq: int, offset: int = 0):
+        '''
+            Tail messages from first_seq on, the number of tail records, and the byte
+            offset where the valid records end. Reading starts at offset.
+        '''
+        messages, records, valid_end = [], 0, offset
+        try:
+            with open(self.tail_path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn write: nothing after it was acknowledged
+                    if not line.endswith(b"\n"):
+                        break
+                    valid_end += len(line)
+                    records += 1
+                    if record["seq"] == first_seq + len(messages):
+                        messages.append(record["message"])
+        except FileNotFoundError:
+            pass
+        return messages, records, valid_end
+
+    def read(self) -> List[Dict]:
+        with self._lock:
+            return self._read_locked()
+
+    def _read_locked(self) -> List[Dict]:
+        if self._file is not None:
+            self._file.flush()
+        messages = self._read_snapshot()
+        tail, self._tail_records, valid_end = self._read_tail(len(messages))
+        messages.extend(tail)
+        self._count = len(messages)
+        self._recent.clear()
+        self._recent.extend(messages[-self._recent.maxlen:])
+        self._drop_torn_line(valid_end)
+        return messages
+
+    def _drop_torn_line(self, valid_end: int) -> None:
+        # So the next append starts on a fresh line
+        if os.path.exists(self.tail_path) and os.path.getsize(self.tail_path) > valid_end:
+            if self._file is not None:
+                self._file.truncate(valid_end)
+            else:
+                os.truncate(self.tail_path, valid_end)
+
+    def read_range(self, start: int, stop: int) -> List[Dict]:
+        '''
+            Messages start..stop-1, read from their lines only.
+        '''
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            if not self._build_index_locked():
+                return self._read_locked()[start:stop]  # snapshot written before the index existed
+            snapshot, tail = self._snapshot_offsets, self._tail_offsets
+            start, stop, _ = slice(start, stop).indices(len(snapshot) + len(tail))
+            messages = self._read_lines(self.path, snapshot[start:min(stop, len(snapshot))])
+            records = self._read_lines(self.tail_path, tail[max(start - len(snapshot), 0):max(stop - len(snapshot), 0)])
+            return messages + [record["message"] for record in records]
+
+    def _build_index_locked(self) -> bool:
+        '''
+            Index the snapshot and the tail, scanning lines without parsing the snapshot's messages.
+            False when the snapshot does not hold one message per line.
+        '''
+        if self._snapshot_offsets is None:
+            offsets, position = array('q'), 0
+            try:
+                with open(self.path, "rb") as f:
+                    for number, line in enumerate(f):
+                        if line.startswith(b"{"):
+                            offsets.append(position)
+                        elif line.strip() != (b"[" if number == 0 else b"]"):
+                            offsets = False
+                            break
+                        position += len(line)
+            except FileNotFoundError:
+                pass
+            self._snapshot_offsets, self._tail_offsets = offsets, None
+        if self._snapshot_offsets is False:
+            return False
+        if self._tail_offsets is None:
+            self._tail_offsets = array('q')
+            first_seq, position = len(self._snapshot_offsets), 0
+            try:
+                with open(self.tail_path, "rb") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            break  # torn write
+                        if not line.endswith(b"\n"):
+                            break
+                        if record["seq"] == first_seq + len(self._tail_offsets):
+                            self._tail_offsets.append(position)
+                        position += len(line)
+            except FileNotFoundError:
+                pass
+        return True
+
+    def _read_lines(self, path: str, offsets) -> List[Dict]:
+        if not len(offsets):
+            return []
+        messages = []
+        with open(path, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                messages.append(json.loads(f.readline().rstrip().rstrip(b",")))
+        return messages
+
+    def recent(self) -> List[Dict]:
+        '''
+            The last page of messages. Known after read(), resume() or the first append.
+        '''
+        with self._lock:
+            return list(self._recent)
+
+    @property
+    def count(self) -> int:
+        with self._lock:
+            if self._count is None:
+                self._read_locked()
+            return self._count
+
+    ########## Writing
+    def append(self, message: Dict) -> None:
+        self.append_many([message])
+
+    def append_many(self, messages: List[Dict]) -> None:
+        '''
+            One write and at most one fsync for all of messages.
+        '''
+        with self._lock:
+            if self._count is None:
+                self._read_locked()
+            if self._file is None:
+                directory = os.path.dirname(self.tail_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.tail_path, "ab")
+            if self._tail_offsets is not None and len(self._snapshot_offsets) + len(self._tail_offsets) != self._count:
+                self._tail_offsets = None  # out of step with the log: rebuilt by the next read_range()
+            position = os.fstat(self._file.fileno()).st_size  # every append is flushed
+            lines = []
+            for message in messages:
+                line = json.dumps({"seq": self._count, "message": message}, default=str) + "\n"
+                lines.append(line)
+                if self._tail_offsets is not None:
+                    self._tail_offsets.append(position)
+                position += len(line.encode("utf-8"))
+                self._count += 1
+                self._recent.append(message)
+            self._file.write("".join(lines).encode("utf-8"))
+            self._file.flush()
+            self._tail_records += len(messages)
+            self._unsynced += len(messages)
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync_locked()
+            compact = self._tail_records >= self.compact_every
+        if compact:
+            self.compact()
+
+    def _sync_locked(self) -> None:
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def flush(self) -> None:
+        '''
+            Make every appended message durable.
+        '''
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            self._sync_locked()
+
+    ########## Checkpoints
+    def write_checkpoint(self, state: Dict) -> None:
+        '''
+            Make the log durable and record state, the last page of messages and the log position.
+        '''
+        with self._lock:
+            if self._count is None:
+                self._read_locked()
+            self._write_checkpoint_locked(state)
+
+    def _write_checkpoint_locked(self, state: Dict) -> None:
+        if self._file is not None:
+            self._file.flush()
+        self._sync_locked()
+        tail_offset = os.path.getsize(self.tail_path) if os.path.exists(self.tail_path) else 0
+        checkpoint = {"version": CHECKPOINT_VERSION,
+                      "state": state,
+                      "history": {"messages": self._count, "tail_offset": tail_offset,
+                                  "tail_records": self._tail_records},
+                      "recent": list(self._recent)}
+        write_atomically(self.checkpoint_path, checkpoint)
+        self._checkpoint_state = state
+
+    def resume(self) -> Optional[Dict]:
+        '''
+            {"state", "recent", "messages"} from the checkpoint plus the messages logged after it,
+            or None when there is no usable checkpoint (then read() the whole history).
+        '''
+        with self._lock:
+            try:
+                with open(self.checkpoint_path, "r") as f:
+                    checkpoint = json.load(f)
+            except (FileNotFoundError, ValueError):
+                return None
+            if checkpoint.get("version") != CHECKPOINT_VERSION:
+                return None
+            pointer = checkpoint["history"]
+            tail_size = os.path.getsize(self.tail_path) if os.path.exists(self.tail_path) else 0
+            if tail_size < pointer["tail_offset"]:
+                return None  # compacted after the checkpoint
+            newer, records, valid_end = self._read_tail(pointer["messages"], pointer["tail_offset"])
+            if len(newer) != records or self._complete_line_after(valid_end):
+                return None  # the pointer does not match the tail. Only a torn last line may follow it.
+            self._count = pointer["messages"] + len(newer)
+            self._tail_records = pointer["tail_records"] + records
+            self._recent.clear()
+            self._recent.extend(checkpoint["recent"] + newer)
+            self._drop_torn_line(valid_end)
+            self._checkpoint_state = checkpoint["state"]
+            return {"state": checkpoint["state"], "recent": list(self._recent), "messages": self._count}
+
+    def _complete_line_after(self, offset: int) -> bool:
+        try:
+            with open(self.tail_path, "rb") as f:
+                f.seek(offset)
+                return b"\n" in f.read()
+        except FileNotFoundError:
+            return False
+
+    def compact(self) -> None:
+        '''
+            Rewrite the snapshot with the whole history and empty the tail.
+        '''
+        with self._lock:
+            messages = self._read_locked()
+            if not self._tail_records:
+                return
+            self._snapshot_offsets, self._tail_offsets = write_snapshot(self.path, messages), array('q')
+            # The snapshot now holds every tail record. Tail records are skipped by seq if this is not reached.
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            os.truncate(self.tail_path, 0)
+            self._tail_records = 0
+            self._unsynced = 0
+            # The checkpoint points into the old tail. Move it to the new position.
+            if self._checkpoint_state is not None:
+                self._write_checkpoint_locked(self._checkpoint_state)
+            elif os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
+
+    def close(self, compact: bool = True) -> None:
+        if compact:
+            self.compact()
+        with self._lock:
+            if self._file is not None:
+                self._sync_locked()
+                self._file.close()
+                self._file = None
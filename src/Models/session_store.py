@@ -0,0 +1,150 @@
+####################################################################
+# Shared Session Store
+#
+# Session state that any Panel worker process needs to resume a
+# student: FSM state, groupchat messages and the learner model. The
+# session row holds the state, rewritten on every save; messages are
+# rows of their own, so a save only inserts the ones posted since the
+# last save.
+# SQLite in WAL mode lets every worker on the machine read and write
+# the same file. The store also holds worker heartbeats and the
+# student -> worker assignments used for sticky routing.
+#####################################################################
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+default_path = os.environ.get("ADAPTIVE_SESSION_STORE",
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../.cache/sessions.db'))
+
+# A worker whose last heartbeat is older than this is considered down
+WORKER_TIMEOUT_SECONDS = 15.0
+
+
+class SessionStore:
+    def __init__(self, path: str = default_path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                student_id TEXT PRIMARY KEY,
+                fsm TEXT NOT NULL,
+                learner TEXT NOT NULL,
+                messages TEXT NOT NULL,
+                updated REAL NOT NULL
+            )""")
+        # messages of sessions saved before session_messages existed stay in sessions.messages
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS session_messages (
+                student_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                message TEXT NOT NULL,
+                PRIMARY KEY (student_id, seq)
+            )""")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                heartbeat REAL NOT NULL
+            )""")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS assignments (
+                student_id TEXT PRIMARY KEY,
+                worker_id TEXT NOT NULL
+            )""")
+
+    ########## Sessions
+    def save_session(self, student_id: str, fsm: Dict, learner: Dict, new_messages: List[Dict]) -> None:
+        '''
+            Replace the session state and append new_messages, the messages posted since the last save.
+        '''
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                legacy = self._conn.execute("SELECT messages FROM sessions WHERE student_id = ?", (student_id,)).fetchone()
+                if legacy is not None and legacy[0] != "[]":
+                    # Move the messages of an old-format row to their own rows first
+                    self._append_messages(student_id, json.loads(legacy[0]))
+                self._append_messages(student_id, new_messages)
+                self._conn.execute("INSERT OR REPLACE INTO sessions (student_id, fsm, learner, messages, updated) VALUES (?, ?, ?, ?, ?)",
+                                   (student_id, json.dumps(fsm), json.dumps(learner), "[]", time.time()))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _append_messages(self, student_id: str, messages: List[Dict]) -> None:
+        first = self._conn.execute("SELECT COALESCE(MAX(seq) + 1, 0) FROM session_messages WHERE student_id = ?",
+                                   (student_id,)).fetchone()[0]
+        self._conn.executemany("INSERT INTO session_messages (student_id, seq, message) VALUES (?, ?, ?)",
+                               [(student_id, first + i, json.dumps(message, default=str)) for i, message in enumerate(messages)])
+
+    def load_session(self, student_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT fsm, learner, messages, updated FROM sessions WHERE student_id = ?",
+                                     (student_id,)).fetchone()
+            if row is None:
+                return None
+            messages = self._conn.execute("SELECT message FROM session_messages WHERE student_id = ? ORDER BY seq",
+                                          (student_id,)).fetchall()
+        fsm, learner, legacy, updated = row
+        return {"fsm": json.loads(fsm), "learner": json.loads(learner),
+                "messages": json.loads(legacy) + [json.loads(message) for message, in messages], "updated": updated}
+
+    ########## Workers
+    def heartbeat(self, worker_id: str, url: str) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO workers (worker_id, url, pid, heartbeat) VALUES (?, ?, ?, ?)",
+                               (worker_id, url, os.getpid(), time.time()))
+
+    def remove_worker(self, worker_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def healthy_workers(self, timeout: float = WORKER_TIMEOUT_SECONDS) -> Dict[str, str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT worker_id, url FROM workers WHERE heartbeat >= ? ORDER BY worker_id",
+                                      (time.time() - timeout,)).fetchall()
+        return dict(rows)
+
+    def assign_worker(self, student_id: str, timeout: float = WORKER_TIMEOUT_SECONDS) -> Optional[str]:
+        '''
+            The URL of the worker serving this student. A student stays on its worker while the
+            worker is healthy, otherwise moves to the healthy worker with the fewest students.
+        '''
+        workers = self.healthy_workers(timeout)
+        if not workers:
+            return None
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")  # two routers must not assign the same student differently
+            try:
+                row = self._conn.execute("SELECT worker_id FROM assignments WHERE student_id = ?", (student_id,)).fetchone()
+                if row is not None and row[0] in workers:
+                    worker_id = row[0]
+                else:
+                    load = dict(self._conn.execute("SELECT worker_id, COUNT(*) FROM assignments GROUP BY worker_id").fetchall())
+                    worker_id = min(workers, key=lambda w: (load.get(w, 0), w))
+                    self._conn.execute("INSERT OR REPLACE INTO assignments (student_id, worker_id) VALUES (?, ?)",
+                                       (student_id, worker_id))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return workers[worker_id]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,55 @@
+####################################################################
+# Token Stream
+#
+# autogen's OpenAIWrapper prints each streamed chunk through the
+# default IOStream. TokenStream is installed as the default IOStream
+# for the duration of a single LLM call so the chunks can be forwarded
+# to the UI as they arrive.
+#####################################################################
+import re
+import time
+from typing import Callable, Optional
+
+
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
+
+
+class TokenStream:
+    '''
+        Implements autogen's IOStream protocol (print/input/send).
+        on_token(agent_name, token) is called for every streamed chunk.
+        Everything is also echoed to the fallback stream (usually the console).
+    '''
+    def __init__(self, agent_name: str, on_token: Callable[[str, str], None], fallback=None):
+        self.agent_name = agent_name
+        self.on_token = on_token
+        self.fallback = fallback
+        self.start_time = time.perf_counter()
+        self.first_token_time: Optional[float] = None
+        self.num_chunks = 0
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        if self.first_token_time is None:
+            return None
+        return self.first_token_time - self.start_time
+
+    def print(self, *objects, sep: str = " ", end: str = "\n", flush: bool = False) -> None:
+        if self.fallback is not None:
+            self.fallback.print(*objects, sep=sep, end=end, flush=flush)
+
+        # Colour codes and the trailing newline autogen prints after the last chunk are not tokens
+        token = ANSI_ESCAPE.sub("", sep.join(str(o) for o in objects))
+        if token == "":
+            return
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+        self.num_chunks += 1
+        self.on_token(self.agent_name, token)
+
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        return self.fallback.input(prompt, password=password)
+
+    def send(self, message) -> None:
+        if self.fallback is not None and hasattr(self.fallback, "send"):
+            self.fallback.send(message)
@@ -0,0 +1,262 @@
+####################################################################
+# Headless Multi-student Simulation
+#
+#   python -m src.Simulation.simulate_students --students 200 --processes 4 \
+#       --concurrency 50 --flow lesson --policy skill_curve
+#
+# Runs N complete tutoring sessions without Panel, against the mock
+# LLM backend (scripted replies, or a recorded transcript/cassette
+# with --transcript). Students are scripted policies (see
+# student_policies.py). Sessions are spread over a process pool, and
+# each process runs many sessions concurrently on one event loop,
+# like a Panel worker.
+#
+# Reports sessions per second, latency per FSM state and memory per
+# session.
+#####################################################################
+import argparse
+import asyncio
+import json
+import os
+import resource
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+from typing import Dict, List
+
+# The harness never calls a live model. Must be set before llm_config is imported.
+os.environ["ADAPTIVE_LLM_BACKEND"] = "mock"
+os.environ["AUTOGEN_USE_DOCKER"] = "False"
+
+OPENINGS = {
+    "lesson": "I would like to learn how to solve linear equations.",
+    "graph": "I am ready to be tested.",
+}
+GRAPH_AGENTS = ["student", "knowledge_tracer", "problem_generator", "solution_verifier"]
+
+
+def configure_backend(options: Dict, seed: int) -> None:
+    from src.Models import llm_config, mock_llm
+    from src.Simulation.student_policies import verify_scripted_answer
+
+    if options["max_concurrency"]:
+        llm_config.scheduler_max_concurrency = options["max_concurrency"]
+    latency = mock_llm.LatencyModel(kind=options["latency_kind"], mean=options["latency"], seed=seed)
+    if options["transcript"]:
+        backend = mock_llm.MockBackend.from_file(options["transcript"], latency=latency)
+    else:
+        backend = mock_llm.MockBackend(scripts=dict(mock_llm.DEFAULT_SCRIPTS, SolutionVerifierAgent=verify_scripted_answer),
+                                       latency=latency)
+    mock_llm.set_default_backend(backend)
+
+
+async def run_session(index: int, options: Dict, state_latencies: Dict[str, List[float]], directory: str) -> Dict:
+    from src import globals
+    from src.Agents.agents import create_agents
+    from src.Agents.agent_factory import get_agent_factory
+    from src.Agents.chat_manager_fsms import FSM, FSMGraphTracerGUI
+    from src.Agents.group_chat_manager_agent import CustomGroupChat, CustomGroupChatManager
+    from src.Models.event_loop import run_blocking
+    from src.Simulation.student_policies import POLICIES
+
+    agents_dict = create_agents()
+    if options["flow"] == "graph":
+        agents_dict = {key: agents_dict[key] for key in GRAPH_AGENTS}
+        fsm = FSMGraphTracerGUI(agents_dict)
+        starter = agents_dict["knowledge_tracer"]
+    else:
+        fsm = FSM(agents_dict)
+        starter = agents_dict["tutor"]
+
+    def record_state(flow_name, transition, seconds):
+        state_latencies[transition.split(" -> ")[0]].append(seconds)
+    fsm.engine.add_hook(record_state)
+
+    policy = POLICIES[options["policy"]](questions=options["questions"], think_time=options["think_time"],
+                                         seed=options["seed"] + index)
+    agents_dict["student"].a_get_human_input = policy
+
+    groupchat = CustomGroupChat(agents=list(agents_dict.values()),
+                                messages=[],
+                                max_round=globals.MAX_ROUNDS,
+                                send_introductions=True,
+                                speaker_selection_method=fsm.next_speaker_selector)
+    manager = CustomGroupChatManager(groupchat=groupchat,
+                                     filename=os.path.join(directory, f"session_{index}.json"),
+                                     is_termination_msg=lambda x: x.get("content", "").rstrip().find("TERMINATE") >= 0)
+    manager.fsm = fsm
+    fsm.groupchat_manager = manager
+    manager.enable_history_spilling()
+    for agent in groupchat.agents:
+        agent.groupchat_manager = manager
+
+    start = time.perf_counter()
+    error = None
+    try:
+        await starter.a_initiate_chat(recipient=manager, clear_history=False, message=OPENINGS[options["flow"]])
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    if error is None and manager.chat_error is not None:
+        # a_run_chat does not raise, so a failed chat would otherwise count as completed
+        error = f"{type(manager.chat_error).__name__}: {manager.chat_error}"
+    duration = time.perf_counter() - start
+
+    memory = await run_blocking(get_agent_factory().memory_report, agents_dict)
+    result = {
+        "duration": duration,
+        "messages": len(groupchat.messages),
+        "answered": policy.answered,
+        "correct": policy.correct,
+        "memory": memory["total"],
+        "error": error,
+    }
+    manager.close()
+    return result
+
+
+async def run_batch_async(indices: List[int], options: Dict) -> Dict:
+    loop = asyncio.get_running_loop()
+    # autogen runs every LLM call on the default executor. Do not let its size cap the concurrency.
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max(32, options["concurrency"] * 2)))
+
+    from src.Models.persistence_worker import get_persistence_worker
+    from src.Models.event_loop import get_loop_lag_monitor, run_blocking
+    persistence = get_persistence_worker()
+    loop_lag = get_loop_lag_monitor()
+    loop_lag.start()  # how long the shared loop was blocked between wakeups
+    state_latencies = defaultdict(list)
+    semaphore = asyncio.Semaphore(options["concurrency"])
+    with tempfile.TemporaryDirectory() as directory:
+        async def limited(index):
+            async with semaphore:
+                return await run_session(index, options, state_latencies, directory)
+        sessions = await asyncio.gather(*(limited(index) for index in indices))
+        await run_blocking(persistence.flush)  # session logs are written behind, into the directory
+
+    from src.Models import llm_scheduler
+    return {
+        "sessions": sessions,
+        "state_latencies": dict(state_latencies),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "scheduler": llm_scheduler.get_scheduler().stats(),
+        "persistence": persistence.stats(),
+        "loop_lag": loop_lag.stats(),
+    }
+
+
+def run_batch(indices: List[int], options: Dict) -> Dict:
+    '''
+        Entry point of each pool process.
+    '''
+    configure_backend(options, seed=options["seed"] + indices[0] if indices else options["seed"])
+    return asyncio.run(run_batch_async(indices, options))
+
+
+def simulate(options: Dict) -> Dict:
+    indices = list(range(options["students"]))
+    processes = max(1, min(options["processes"], len(indices)))
+    batches = [indices[i::processes] for i in range(processes)]
+
+    start = time.perf_counter()
+    if processes == 1:
+        results = [run_batch(batches[0], options)]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(run_batch, batches, [options] * processes))
+    wall_time = time.perf_counter() - start
+    return summarize(results, wall_time, options)
+
+
+def summarize(results: List[Dict], wall_time: float, options: Dict) -> Dict:
+    from src.Models.llm_metrics import percentile
+
+    sessions = [session for result in results for session in result["sessions"]]
+    completed = [session for session in sessions if session["error"] is None]
+    state_latencies = defaultdict(list)
+    for result in results:
+        for state, latencies in result["state_latencies"].items():
+            state_latencies[state].extend(latencies)
+
+    answered = sum(session["answered"] for session in sessions)
+    states = {}
+    for state, latencies in state_latencies.items():
+        latencies.sort()
+        states[state] = {"count": len(latencies), "p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95),
+                         "max": latencies[-1], "total": sum(latencies)}
+    return {
+        "options": options,
+        "wall_time": wall_time,
+        "sessions": len(sessions),
+        "completed": len(completed),
+        "errors": sorted({session["error"] for session in sessions if session["error"]}),
+        "sessions_per_second": len(completed) / wall_time if wall_time else 0.0,
+        "mean_session_seconds": sum(s["duration"] for s in completed) / len(completed) if completed else 0.0,
+        "answers": answered,
+        "accuracy": sum(s["correct"] for s in sessions) / answered if answered else 0.0,
+        "messages_per_session": sum(s["messages"] for s in sessions) / len(sessions) if sessions else 0.0,
+        "memory_per_session_kb": sum(s["memory"] for s in sessions) / len(sessions) / 1024 if sessions else 0.0,
+        "max_rss_per_process_mb": [result["max_rss_kb"] / 1024 for result in results],
+        "scheduler_mean_wait": [result["scheduler"]["mean_wait"] for result in results],
+        "persistence": [result["persistence"] for result in results],
+        "loop_lag": [result["loop_lag"] for result in results],
+        "states": states,
+    }
+
+
+def to_markdown(report: Dict) -> str:
+    options = report["options"]
+    lines = [
+        f"**{report['completed']}/{report['sessions']} sessions** ({options['flow']} flow, {options['policy']} policy) "
+        f"in {report['wall_time']:.1f}s: **{report['sessions_per_second']:.2f} sessions/s**",
+        f"{options['processes']} processes x {options['concurrency']} concurrent sessions, "
+        f"mock latency {options['latency_kind']} {options['latency']:.2f}s",
+        f"Mean session {report['mean_session_seconds']:.1f}s, {report['messages_per_session']:.0f} messages, "
+        f"{report['answers']} answers ({report['accuracy']:.0%} correct)",
+        f"Memory: {report['memory_per_session_kb']:.0f} KB of agent state per session, "
+        f"peak RSS per process {', '.join(f'{mb:.0f} MB' for mb in report['max_rss_per_process_mb'])}",
+        "Persistence: " + ", ".join(f"max queue {p['max_queue_depth']}, write p95 {p['write_p95'] * 1000:.1f} ms, "
+                                    f"{p['coalesced']} coalesced, {p['blocked']} blocked, {p['overflowed']} over the limit" for p in report["persistence"]),
+        "Event loop lag: " + ", ".join(f"p95 {l['lag_p95'] * 1000:.1f} ms, max {l['lag_max'] * 1000:.1f} ms"
+                                       for l in report["loop_lag"]),
+        "",
+        "| State | Count | p50 (s) | p95 (s) | Max (s) | Total (s) |",
+        "|---|---|---|---|---|---|",
+    ]
+    for state, s in sorted(report["states"].items(), key=lambda item: item[1]["total"], reverse=True):
+        lines.append(f"| {state} | {s['count']} | {s['p50']:.2f} | {s['p95']:.2f} | {s['max']:.2f} | {s['total']:.1f} |")
+    for error in report["errors"]:
+        lines.append(f"\nError: {error}")
+    return "\n".join(lines)
+
+
+def main():
+    from src.Simulation.student_policies import POLICIES
+
+    parser = argparse.ArgumentParser(description="Load-test the tutoring FSMs with simulated students")
+    parser.add_argument("--students", type=int, default=20)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=10, help="concurrent sessions per process")
+    parser.add_argument("--flow", choices=sorted(OPENINGS), default="lesson")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="skill_curve")
+    parser.add_argument("--questions", type=int, default=5, help="answers per student before leaving")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean seconds a student takes to answer")
+    parser.add_argument("--latency", type=float, default=0.2, help="mean mock LLM latency in seconds")
+    parser.add_argument("--latency-kind", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="override the LLM scheduler's concurrency")
+    parser.add_argument("--transcript", default=None, help="replay a recorded chat history or cassette")
+    parser.add_argument("--seed", type=int, default=53)
+    parser.add_argument("--report", default=None, help="also write the report as JSON")
+    options = vars(parser.parse_args())
+
+    report = simulate(options)
+    print(to_markdown(report))
+    if options["report"]:
+        with open(options["report"], "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"Report saved to: {options['report']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+####################################################################
+# Simulated Student Policies
+#
+# Stand-ins for a human at the keyboard. A policy replaces the
+# StudentAgent's a_get_human_input and answers every question the
+# mock ProblemGeneratorAgent asks ("Solve for x: 2x + 5 = 17") right
+# or wrong according to its rule. After `questions` answers it types
+# "exit", which ends the chat like a student leaving.
+#
+# verify_scripted_answer() is the matching mock SolutionVerifierAgent
+# script, so the verdict follows the policy.
+#####################################################################
+import asyncio
+import math
+import random
+from typing import Dict, List, Optional
+
+
+CORRECT_ANSWER = "x = 6"
+WRONG_ANSWER = "x = 11"
+EXIT = "exit"  # autogen ends the chat when human input is "exit"
+
+
+class StudentPolicy:
+    def __init__(self, questions: int = 5, think_time: float = 0.0, seed: Optional[int] = None):
+        self.questions = questions
+        self.think_time = think_time
+        self.random = random.Random(seed)
+        self.answered = 0
+        self.correct = 0
+
+    def is_correct(self) -> bool:
+        raise NotImplementedError
+
+    async def __call__(self, prompt: str = "") -> str:
+        if self.answered >= self.questions:
+            return EXIT
+        if self.think_time:
+            await asyncio.sleep(self.random.uniform(0.5, 1.5) * self.think_time)
+        correct = self.is_correct()
+        self.answered += 1
+        self.correct += int(correct)
+        return CORRECT_ANSWER if correct else WRONG_ANSWER
+
+
+class AlwaysRight(StudentPolicy):
+    def is_correct(self) -> bool:
+        return True
+
+
+class RandomAnswers(StudentPolicy):
+    def __init__(self, accuracy: float = 0.5, **kwargs):
+        super().__init__(**kwargs)
+        self.accuracy = accuracy
+
+    def is_correct(self) -> bool:
+        return self.random.random() < self.accuracy
+
+
+class SkillCurve(StudentPolicy):
+    '''
+        Starts at initial_accuracy and approaches 1 as the student practices.
+    '''
+    def __init__(self, initial_accuracy: float = 0.3, learning_rate: float = 3.0, **kwargs):
+        super().__init__(**kwargs)
+        self.initial_accuracy = initial_accuracy
+        self.learning_rate = learning_rate
+
+    def is_correct(self) -> bool:
+        accuracy = 1 - (1 - self.initial_accuracy) * math.exp(-self.answered / self.learning_rate)
+        return self.random.random() < accuracy
+
+
+POLICIES = {
+    "always_right": AlwaysRight,
+    "random": RandomAnswers,
+    "skill_curve": SkillCurve,
+}
+
+
+def verify_scripted_answer(messages: List[Dict]) -> str:
+    answer = next((str(m.get("content", "")) for m in reversed(messages) if m.get("name") == "StudentAgent"), "")
+    if CORRECT_ANSWER in answer:
+        return "Yes, the answer is correct."
+    return "No, the answer is incorrect. 2x = 12, so x = 6."
@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+
+from src.Agents.concurrent_states import ConcurrentStates
+
+
+class FakeAgent:
+    def __init__(self, name, log, delay=0.0):
+        self.name = name
+        self.log = log
+        self.delay = delay
+        self.chat_messages = {}
+        self.pending_reply = None
+        self.prompts = []
+
+    async def a_generate_reply_in_background(self, messages, sender):
+        self.log.append(("start", self.name))
+        self.prompts.append(messages)
+        await asyncio.sleep(self.delay)
+        self.log.append(("done", self.name))
+        return {"content": f"{self.name} reply"}
+
+
+class TestConcurrentStates(unittest.TestCase):
+
+    def setUp(self):
+        self.log = []
+        self.sender = object()
+        self.programmer = FakeAgent("ProgrammerAgent", self.log, delay=0.02)
+        self.runner = FakeAgent("CodeRunnerAgent", self.log)
+        self.motivator = FakeAgent("MotivatorAgent", self.log)
+        self.states = ConcurrentStates({"Programming": self.programmer, "Running": self.runner,
+                                        "Motivating": self.motivator},
+                                       {"Running": ["Programming"]})
+
+    def test_independent_states_start_together(self):
+        async def main():
+            self.states.start(self.sender)
+            self.assertEqual(set(self.states.tasks), {"Programming", "Motivating"})
+            await asyncio.sleep(0.05)
+            return self.states.tasks["Running"].result()
+
+        self.assertEqual(asyncio.run(main()), {"content": "CodeRunnerAgent reply"})
+        # The runner only starts once the programmer has replied
+        self.assertLess(self.log.index(("done", "ProgrammerAgent")), self.log.index(("start", "CodeRunnerAgent")))
+        self.assertLess(self.log.index(("start", "MotivatorAgent")), self.log.index(("done", "ProgrammerAgent")))
+
+    def test_dependents_see_unmerged_replies(self):
+        self.runner.chat_messages[self.sender] = [{"content": "question", "role": "user", "name": "StudentAgent"}]
+
+        async def main():
+            self.states.start(self.sender)
+            await asyncio.sleep(0.05)
+
+        asyncio.run(main())
+        self.assertEqual(self.runner.prompts[0][-1],
+                         {"content": "ProgrammerAgent reply", "role": "user", "name": "ProgrammerAgent"})
+        self.assertEqual(len(self.runner.prompts[0]), 2)
+        self.assertEqual(self.motivator.prompts[0], [])
+        self.assertIs(self.runner.pending_reply, self.states.tasks["Running"])
+
+    def test_cancel_clears_pending_replies(self):
+        async def main():
+            self.states.start(self.sender)
+            task = self.states.tasks["Programming"]
+            self.states.cancel()
+            await asyncio.sleep(0)
+            return task
+
+        task = asyncio.run(main())
+        self.assertTrue(task.cancelled())
+        self.assertEqual(self.states.tasks, {})
+        self.assertIsNone(self.programmer.pending_reply)
+        self.assertNotIn(("start", "CodeRunnerAgent"), self.log)
+
+    def test_without_sender_nothing_runs(self):
+        self.states.start(None)
+        self.assertEqual(self.states.tasks, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
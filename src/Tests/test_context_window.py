@@ -0,0 +1,107 @@
+import asyncio
+import unittest
+
+from src.Agents.context_window import (DEFAULT_TOKEN_BUDGET, ROLE_TOKEN_BUDGETS, SUMMARY_PREFIX, ContextWindow,
+                                       extractive_summary)
+
+
+def count_words(text):
+    return max(1, len(text.split()))
+
+
+def message(i, words=10):
+    return {"role": "user", "name": f"Agent{i}", "content": " ".join([f"m{i}"] * words)}
+
+
+class TestContextWindow(unittest.TestCase):
+
+    def setUp(self):
+        # 100 token budget: 25 for the summary, 75 for verbatim messages (7 messages of 10 words)
+        self.window = ContextWindow(token_budget=100, token_counter=count_words)
+
+    def test_short_history_is_sent_verbatim(self):
+        messages = [message(i) for i in range(5)]
+        self.assertEqual(self.window(messages), messages)
+
+    def test_older_messages_are_summarized(self):
+        messages = [message(i) for i in range(10)]
+        prompt = self.window(messages)
+        self.assertEqual(prompt[0]["role"], "system")
+        self.assertTrue(prompt[0]["content"].startswith(SUMMARY_PREFIX))
+        self.assertEqual(prompt[1:], messages[3:])
+        self.assertIn("Agent2: m2", prompt[0]["content"])
+
+    def test_summary_is_extended_incrementally(self):
+        summarized = []
+
+        def summarizer(lines, new_messages):
+            summarized.append([m["name"] for m in new_messages])
+            return extractive_summary(lines, new_messages)
+
+        window = ContextWindow(token_budget=100, summarizer=summarizer, token_counter=count_words)
+        messages = [message(i) for i in range(10)]
+        window(messages)
+        messages.append(message(10))
+        window(messages)
+        self.assertEqual(summarized, [["Agent0", "Agent1", "Agent2"], ["Agent3"]])
+
+    def test_summary_stays_within_its_budget(self):
+        messages = [message(i) for i in range(40)]
+        prompt = self.window(messages)
+        self.assertLessEqual(count_words(prompt[0]["content"]) - count_words(SUMMARY_PREFIX), 25)
+        self.assertNotIn("Agent0:", prompt[0]["content"])
+
+    def test_newest_message_is_always_kept(self):
+        messages = [message(0), message(1, words=500)]
+        self.assertEqual(self.window(messages)[-1], messages[-1])
+
+    def test_a_different_conversation_resets_the_summary(self):
+        self.window([message(i) for i in range(10)])
+        other = [{"role": "user", "name": "Other", "content": f"o{i} " * 10} for i in range(10)]
+        prompt = self.window(other)
+        self.assertNotIn("Agent", prompt[0]["content"])
+        self.assertEqual(prompt[1:], other[3:])
+
+    def test_a_different_last_message_is_counted_again(self):
+        # A prefetch prompt ends with an instruction that is not stored at that position
+        messages = [message(i) for i in range(5)]
+        self.window(messages + [message(5, words=10)])
+        prompt = self.window(messages + [message(6, words=60)])
+        self.assertEqual(prompt[1:], [message(4), message(6, words=60)])
+
+    def test_tokens_are_counted_ahead(self):
+        counted = []
+
+        def counter(text):
+            if not text.startswith("Agent"):  # summary lines are counted as they are written
+                counted.append(text)
+            return count_words(text)
+
+        window = ContextWindow(token_budget=100, token_counter=counter)
+        messages = [message(i) for i in range(10)]
+        asyncio.run(window.a_count_tokens(messages))
+        self.assertEqual(len(counted), 10)
+        window(messages)
+        messages.append(message(10))
+        asyncio.run(window.a_count_tokens(messages))
+        self.assertEqual(len(counted), 11)  # only the new message
+        counted.clear()
+        window(messages)
+        self.assertEqual(counted, [])
+
+    def test_budget_per_role(self):
+        self.assertEqual(ContextWindow.for_agent("TutorAgent").token_budget, ROLE_TOKEN_BUDGETS["TutorAgent"])
+        self.assertEqual(ContextWindow.for_agent("UnknownAgent").token_budget, DEFAULT_TOKEN_BUDGET)
+        self.assertEqual(ContextWindow.for_agent("TutorAgent", token_budget=10).token_budget, 10)
+
+    def test_extractive_summary_keeps_first_sentence(self):
+        lines = extractive_summary([], [{"name": "TutorAgent", "content": "First  sentence. Second one."},
+                                        {"name": "Empty", "content": ""},
+                                        {"role": "user", "content": "x" * 300}])
+        self.assertEqual(lines[0], "TutorAgent: First sentence")
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith("user: ") and lines[1].endswith("..."))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import time
+import unittest
+
+from src.Models.conversation_store import ConversationRecorder, ConversationStore
+
+
+TOPIC = "Algebra->Linear_Equations->One_Variable"
+
+
+class TestConversationStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ConversationStore(os.path.join(self.directory.name, "conversations.db"))
+        self.topic = TOPIC
+        self.recorder = ConversationRecorder(self.store, "alice", flow="graph_tracer_gui",
+                                             describe=lambda: (self.topic, "VerifySolution"), batch_size=4)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def post(self, name, content, recorder=None):
+        (recorder or self.recorder).append({"content": content, "role": "user", "name": name})
+
+    def test_inserts_in_batches(self):
+        for i in range(3):
+            self.post("StudentAgent", f"x = {i}")
+        self.assertEqual(self.store.messages(student_id="alice"), [])
+        self.post("StudentAgent", "x = 3")
+        self.assertEqual(len(self.store.messages(student_id="alice")), 4)
+
+    def test_query_by_student_agent_topic_and_time(self):
+        start = time.time()
+        self.post("ProblemGeneratorAgent", "Solve for x: 2x + 5 = 17")
+        self.post("StudentAgent", "x = 6")
+        self.topic = "Geometry->Angles->Acute"
+        self.post("StudentAgent", "45 degrees")
+        self.post("StudentAgent", "bob's answer", ConversationRecorder(self.store, "bob", batch_size=1))
+        self.recorder.flush()
+
+        self.assertEqual([m["content"] for m in self.store.messages(student_id="alice", topic="Algebra->Linear_Equations")],
+                         ["Solve for x: 2x + 5 = 17", "x = 6"])
+        self.assertEqual(len(self.store.messages(agent="StudentAgent")), 3)
+        self.assertEqual(len(self.store.messages(student_id="alice", since=start)), 3)
+        self.assertEqual(self.store.messages(student_id="alice", until=start), [])
+
+    def test_topic_matches_subtopics_but_not_siblings(self):
+        arrangements = "Combinatorics->Counting->Arrangements"
+        for topic in ["->Permutations", "->Permutations->Circular", "->Permutations_with_Repetition"]:
+            self.topic = arrangements + topic
+            self.post("StudentAgent", topic)
+        self.recorder.flush()
+        self.assertEqual([m["content"] for m in self.store.messages(topic=arrangements + "->Permutations")],
+                         ["->Permutations", "->Permutations->Circular"])
+        self.assertEqual(len(self.store.messages(topic=arrangements)), 3)
+
+    def test_verdicts_and_accuracy(self):
+        self.post("SolutionVerifierAgent", "Yes, the answer is correct.")
+        self.post("SolutionVerifierAgent", "No, the answer is incorrect.")
+        self.post("StudentAgent", "x = 6")
+        self.recorder.close()
+        self.assertEqual([v["correct"] for v in self.store.verdicts(student_id="alice")], [1, 0])
+        self.assertEqual(self.store.accuracy_by_topic("alice"), {TOPIC: (1, 2)})
+        self.assertIsNotNone(self.store.sessions("alice")[0]["ended"])
+
+    def test_history_continues_across_sessions(self):
+        for i in range(3):
+            self.post("StudentAgent", f"first {i}")
+        self.recorder.close()
+        second = ConversationRecorder(self.store, "alice", batch_size=1)
+        self.assertEqual(second.seq, 3)
+        self.post("StudentAgent", "second 0", second)
+        self.assertEqual([m["content"] for m in self.store.history_page("alice", 2, 4)], ["first 2", "second 0"])
+        self.assertEqual(len(self.store.sessions("alice")), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
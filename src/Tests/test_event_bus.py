@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+
+from src.Models.event_bus import EventBus, MasteryUpdated, MessagePosted, StateChanged, VerdictIssued
+
+
+def posted(i):
+    return MessagePosted({"content": f"message {i}", "role": "user", "name": "TutorAgent"}, "TutorAgent")
+
+
+class TestEventBus(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = EventBus()
+        self.learn, self.progress = [], []
+        self.bus.subscribe(self.learn.append, MessagePosted, StateChanged)
+        self.bus.subscribe(self.progress.append, VerdictIssued)
+
+    def test_subscribers_get_only_their_event_types(self):
+        self.bus.publish(posted(0))
+        self.bus.publish(VerdictIssued(True, "Yes, correct."))
+        self.assertEqual([[type(e) for e in batch] for batch in self.learn], [[MessagePosted]])
+        self.assertEqual([batch[0].correct for batch in self.progress], [True])
+
+    def test_events_without_subscribers_are_dropped(self):
+        self.bus.publish(MasteryUpdated("Algebra", 3, True))
+        self.assertEqual(self.bus.stats()["dropped"], 1)
+        self.assertEqual(self.bus.stats()["batches"], 0)
+
+    def test_burst_is_delivered_as_one_batch_in_order(self):
+        async def burst():
+            for i in range(5):
+                self.bus.publish(posted(i))
+                self.bus.publish(StateChanged("Lesson", "A", "B"))
+            self.assertEqual(self.learn, [])
+            await asyncio.sleep(0)
+
+        asyncio.run(burst())
+        self.assertEqual(len(self.learn), 1)
+        contents = [e.message["content"] for e in self.learn[0] if isinstance(e, MessagePosted)]
+        self.assertEqual(contents, [f"message {i}" for i in range(5)])
+        self.assertEqual(len(self.learn[0]), 10)
+
+    def test_failing_subscriber_does_not_block_others(self):
+        def fail(events):
+            raise RuntimeError("broken tab")
+        bus = EventBus()
+        received = []
+        bus.subscribe(fail, MessagePosted)
+        bus.subscribe(received.append, MessagePosted)
+        bus.publish(posted(0))
+        self.assertEqual(len(received), 1)
+        self.assertEqual(bus.stats()["errors"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
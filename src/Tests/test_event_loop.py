@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from src.Models.event_loop import BlockingPool, LoopLagMonitor
+
+
+class TestBlockingPool(unittest.TestCase):
+
+    def test_blocking_calls_leave_the_loop_free(self):
+        pool = BlockingPool(max_workers=2)
+        monitor = LoopLagMonitor(interval=0.01)
+
+        async def main():
+            monitor.start()
+            results = await asyncio.gather(*(pool.run(time.sleep, 0.1) for _ in range(4)))
+            monitor.stop()
+            return results
+
+        asyncio.run(main())
+        pool.shutdown()
+        stats = pool.stats()
+        self.assertEqual(stats["calls"], 4)
+        self.assertEqual(stats["max_active"], 2)  # bounded
+        self.assertGreater(monitor.stats()["samples"], 5)
+        self.assertLess(monitor.stats()["lag_max"], 0.08)
+
+    def test_result_and_errors_reach_the_caller(self):
+        pool = BlockingPool(max_workers=1)
+
+        async def main():
+            self.assertNotEqual(await pool.run(threading.get_ident), threading.get_ident())
+            with self.assertRaises(ZeroDivisionError):
+                await pool.run(lambda: 1 / 0)
+
+        asyncio.run(main())
+        pool.shutdown()
+        self.assertEqual(pool.stats()["active"], 0)
+
+
+class TestLoopLagMonitor(unittest.TestCase):
+
+    def test_blocked_loop_shows_as_lag(self):
+        monitor = LoopLagMonitor(interval=0.01)
+
+        async def main():
+            monitor.start()
+            await asyncio.sleep(0.02)
+            time.sleep(0.1)  # a sync call on the loop
+            await asyncio.sleep(0.02)
+            monitor.stop()
+
+        asyncio.run(main())
+        self.assertGreater(monitor.stats()["lag_max"], 0.05)
+
+    def test_no_running_loop(self):
+        self.assertFalse(LoopLagMonitor().start())
+
+
+if __name__ == '__main__':
+    unittest.main()
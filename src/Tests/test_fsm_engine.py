@@ -0,0 +1,92 @@
+import asyncio
+import unittest
+
+from src.Agents.fsm_engine import compile_flow, FSMEngine, TransitionTimer
+
+
+FLOW = compile_flow("Test", {
+    "initial": "Ask",
+    "states": {
+        "Ask":    {"speaker": "tutor",    "next": "Answer", "action": "count"},
+        "Answer": {"speaker": "student",  "next": "Ask",
+                   "transitions": [{"guard": "finished", "to": "Done"}]},
+        "Done":   {"speaker": "teacher",  "next": "Done"},
+    },
+})
+
+
+class Owner:
+    def __init__(self):
+        self.asked = 0
+        self.done = False
+
+    def count(self, groupchat):
+        self.asked += 1
+
+    def finished(self):
+        return self.done
+
+
+class TestFSMEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.owner = Owner()
+        self.engine = FSMEngine(FLOW, {"tutor": "T", "student": "S", "teacher": "P"}, self.owner)
+
+    def test_compiled_tables(self):
+        self.assertEqual(FLOW.names, ["Ask", "Answer", "Done"])
+        self.assertEqual(FLOW.next_states, [1, 0, 2])
+        self.assertEqual(FLOW.guards[1], (("finished", 2),))
+        self.assertEqual(FLOW.transition_names[(1, 2)], "Answer -> Done")
+
+    def test_step_runs_actions_and_selects_speakers(self):
+        self.assertEqual([self.engine.step() for _ in range(4)], ["T", "S", "T", "S"])
+        self.assertEqual(self.owner.asked, 2)
+        self.assertEqual(self.engine.current_state, "Ask")
+        self.assertEqual(self.engine.last_transition, "Answer -> Ask")
+
+    def test_guard_overrides_default_transition(self):
+        self.engine.step()
+        self.owner.done = True
+        self.engine.step()
+        self.assertEqual(self.engine.current_state, "Done")
+        self.assertEqual(self.engine.step(), "P")
+
+    def test_set_current_state(self):
+        self.engine.current_state = "Answer"
+        self.assertEqual(self.engine.step(), "S")
+        with self.assertRaises(ValueError):
+            self.engine.current_state = "Missing"
+
+    def test_unknown_target_is_rejected(self):
+        with self.assertRaises(ValueError):
+            compile_flow("Broken", {"initial": "A", "states": {"A": {"speaker": "x", "next": "B"}}})
+
+    def test_a_step_awaits_coroutine_actions(self):
+        class AsyncOwner(Owner):
+            async def count(self, groupchat):
+                await asyncio.sleep(0)
+                self.asked += 1
+        owner = AsyncOwner()
+        engine = FSMEngine(FLOW, {"tutor": "T", "student": "S", "teacher": "P"}, owner)
+
+        async def steps():
+            return [await engine.a_step() for _ in range(3)]
+        self.assertEqual(asyncio.run(steps()), ["T", "S", "T"])
+        self.assertEqual(owner.asked, 2)
+        self.assertEqual(engine.current_state, "Answer")
+
+    def test_hooks_time_completed_transitions(self):
+        timer = TransitionTimer()
+        self.engine.add_hook(timer.record)
+        self.engine.step()
+        self.assertEqual(timer.summary(), {})
+        self.engine.step()
+        summary = timer.summary()
+        self.assertEqual(list(summary), ["Test: Ask -> Answer"])
+        self.assertEqual(summary["Test: Ask -> Answer"]["calls"], 1)
+        self.assertIn("Test: Ask -> Answer", timer.to_markdown())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from src.KnowledgeGraphs.graph_layout import ALWAYS_DRAWN_LEVELS, TaxonomyLayout, get_taxonomy_layout
+
+
+class TestTaxonomyLayout(unittest.TestCase):
+
+    def setUp(self):
+        self.layout = get_taxonomy_layout()
+
+    def test_layout_is_computed_once(self):
+        self.assertIs(get_taxonomy_layout(), self.layout)
+        self.assertEqual(self.layout.level_end[-1], len(self.layout))
+        self.assertEqual(self.layout.level_end[0], 12)
+
+    def test_parents_come_before_children(self):
+        for i, parent in enumerate(self.layout.parents):
+            if parent >= 0:
+                self.assertLess(parent, i)
+                self.assertEqual(self.layout.levels[parent], self.layout.levels[i] - 1)
+
+    def test_zoomed_out_draws_only_the_top_levels(self):
+        extent = self.layout.extent
+        visible = self.layout.visible(-extent, extent, -extent, extent, pixels=700)
+        self.assertEqual(len(visible), self.layout.level_end[ALWAYS_DRAWN_LEVELS - 1])
+
+    def test_zoomed_in_draws_deeper_levels_inside_the_view(self):
+        skill = self.layout.level_end[-2]  # first node of the deepest level
+        x, y = self.layout.x[skill], self.layout.y[skill]
+        visible = self.layout.visible(x - 500, x + 500, y - 500, y + 500, pixels=700)
+        self.assertIn(skill, visible)
+        self.assertLess(len(visible), 40)
+        for i in visible:
+            self.assertLessEqual(abs(self.layout.x[i] - x), 500)
+
+    def test_mastery_rolls_up_the_taxonomy(self):
+        layout = TaxonomyLayout(({"Algebra": (0, 0), "Geometry": (1, 0)},
+                                 {"Algebra->Equations": (0, 1), "Algebra->Graphs": (0, 2)}))
+        scores = layout.mastery({"Algebra->Equations": (3, 4), "Algebra->Graphs": (0, 2), "Unknown": (1, 1)})
+        self.assertEqual(scores[layout.index["Algebra"]], 0.5)
+        self.assertEqual(scores[layout.index["Algebra->Equations"]], 0.75)
+        self.assertIsNone(scores[layout.index["Geometry"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+# Importing the manager creates the app's agents. No model is called here.
+os.environ.setdefault("ADAPTIVE_LLM_BACKEND", "mock")
+os.environ.setdefault("OPENAI_API_KEY", "sk-unused")
+
+import autogen
+
+from src.Agents.group_chat_manager_agent import CustomGroupChat, CustomGroupChatManager
+from src.Models.message_history import SpillingMessageList
+from src.Models.persistence_worker import get_persistence_worker
+from src.Models.session_store import SessionStore
+
+
+def scripted_agent(name):
+    return autogen.ConversableAgent(name, llm_config=False, code_execution_config=False,
+                                    human_input_mode="NEVER", default_auto_reply=f"{name} reply")
+
+
+def create_manager():
+    agents = [scripted_agent("TeacherAgent"), scripted_agent("StudentAgent")]
+    groupchat = CustomGroupChat(agents=agents, messages=[], max_round=12, speaker_selection_method="round_robin")
+    return CustomGroupChatManager(groupchat=groupchat, filename=None, llm_config=False)
+
+
+class TestCustomGroupChatManager(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = create_manager()
+        self.agents = self.manager.groupchat.agents
+
+    def tearDown(self):
+        self.manager.close()
+
+    def run_chat(self):
+        asyncio.run(self.agents[0].a_initiate_chat(recipient=self.manager, clear_history=False, message="Hello"))
+
+    def test_running_chat_posts_to_spilling_history(self):
+        self.manager.enable_history_spilling(capacity=3)
+        self.run_chat()
+        messages = self.manager.groupchat.messages
+        self.assertIsInstance(messages, SpillingMessageList)
+        self.assertEqual(len(messages), 12)
+        self.assertEqual(messages.spilled, 9)
+        self.assertEqual(messages[0]["content"], "Hello")
+        self.assertEqual(messages[-1]["content"], "StudentAgent reply")
+
+    def test_chat_error_is_kept(self):
+        def fail(recipient, messages, sender, config):
+            raise RuntimeError("model unavailable")
+        self.agents[1].register_reply([autogen.Agent, None], fail)
+        self.run_chat()
+        self.assertIsInstance(self.manager.chat_error, RuntimeError)
+        self.assertEqual(len(self.manager.groupchat.messages), 1)
+
+    def test_saved_session_restores_the_chat(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        store = SessionStore(os.path.join(directory.name, "sessions.db"))
+        self.addCleanup(store.close)
+        self.addCleanup(get_persistence_worker().flush, 5)  # the saves of close()
+        self.manager.session_store, self.manager.student_id = store, "ada"
+        self.manager.enable_history_spilling(capacity=3)
+        self.run_chat()
+        self.manager.save_session()
+        self.manager.save_session()  # nothing new
+        self.assertTrue(get_persistence_worker().flush(5))
+        posted = list(self.manager.groupchat.messages)
+
+        resumed = create_manager()
+        self.addCleanup(resumed.close)
+        resumed.session_store, resumed.student_id = store, "ada"
+        resumed.enable_history_spilling(capacity=3)
+        restored = asyncio.run(resumed.a_restore_session())
+        self.assertEqual(len(restored), 12)
+        self.assertEqual(list(resumed.groupchat.messages), posted)
+        self.assertEqual(len(resumed.groupchat.agents[0].chat_messages[resumed]), 12)
+        self.assertEqual(resumed.session_saved, 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
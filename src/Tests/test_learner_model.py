@@ -0,0 +1,70 @@
+import asyncio
+import os
+import unittest
+
+# Importing the agents creates the app's agents. Only the mock model is called here.
+os.environ.setdefault("ADAPTIVE_LLM_BACKEND", "mock")
+os.environ.setdefault("OPENAI_API_KEY", "sk-unused")
+
+import autogen
+
+from src.Agents.group_chat_manager_agent import CustomGroupChat, CustomGroupChatManager
+from src.Agents.learner_model_agent import LearnerModelAgent
+from src.Models import llm_config, mock_llm
+
+
+def scripted_agent(name):
+    return autogen.ConversableAgent(name, llm_config=False, code_execution_config=False,
+                                    human_input_mode="NEVER", default_auto_reply=f"{name} reply")
+
+
+class TestLearnerModelRefresh(unittest.TestCase):
+
+    def setUp(self):
+        self.requests = []
+
+        def assess(messages):
+            self.requests.append(messages[-1]["content"])
+            return f"Assessment {len(self.requests)}"
+
+        previous = mock_llm.get_default_backend()
+        self.addCleanup(mock_llm.set_default_backend, previous)
+        mock_llm.set_default_backend(mock_llm.MockBackend(scripts={"LearnerModelAgent": assess}))
+        self.learner_model = LearnerModelAgent(llm_config={"config_list": llm_config.mock_config_list, "cache_seed": None})
+
+        agents = [scripted_agent("TeacherAgent"), scripted_agent("StudentAgent")]
+        self.groupchat = CustomGroupChat(agents=agents, messages=[], max_round=6, speaker_selection_method="round_robin")
+        self.manager = CustomGroupChatManager(groupchat=self.groupchat, filename=None, llm_config=False)
+        self.manager.enable_history_spilling(capacity=3)
+        self.addCleanup(self.manager.close)
+
+    def chat(self, message):
+        agent = self.groupchat.agents[0]
+        asyncio.run(agent.a_initiate_chat(recipient=self.manager, clear_history=False, message=message))
+
+    def refresh(self):
+        return asyncio.run(self.learner_model.a_refresh(self.manager.groupchat.get_messages()))
+
+    def test_refresh_from_spilling_groupchat(self):
+        self.chat("First lesson")
+        self.assertGreater(self.manager.groupchat.messages.spilled, 0)
+        self.assertEqual(self.refresh(), "Assessment 1")
+        self.assertEqual(self.learner_model.watermark, 6)
+        self.assertIn("TeacherAgent: First lesson", self.requests[0])
+        self.assertIn("StudentAgent: StudentAgent reply", self.requests[0])
+
+        # Nothing new: the cached state, no request
+        self.assertEqual(self.refresh(), "Assessment 1")
+        self.assertEqual(len(self.requests), 1)
+
+        # Only the messages after the watermark, which has spilled to disk by now
+        self.chat("Second lesson")
+        self.assertEqual(self.refresh(), "Assessment 2")
+        self.assertEqual(self.learner_model.watermark, 12)
+        self.assertIn("Assessment 1", self.requests[1])
+        self.assertIn("TeacherAgent: Second lesson", self.requests[1])
+        self.assertNotIn("First lesson", self.requests[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+
+from src.Agents.chat_manager_fsms import topic_from_text
+
+
+class TestLessonTopic(unittest.TestCase):
+
+    def test_names_a_main_topic(self):
+        self.assertEqual(topic_from_text("I want to learn about algebra."), "Algebra")
+
+    def test_prefers_the_longest_name(self):
+        self.assertEqual(topic_from_text("Permutations with repetition, please"),
+                         "Statistics_and_Probability->Combinations_and_Permutations->Arrangements->Permutations_with_Repetition")
+
+    def test_prefers_the_most_general_node_for_shared_names(self):
+        self.assertEqual(topic_from_text("linear equations"), "Algebra->Linear_Equations")
+
+    def test_no_topic(self):
+        self.assertIsNone(topic_from_text("hello"))
+        self.assertIsNone(topic_from_text(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import time
+import unittest
+
+from src.Models.llm_cache import LLMResponseCache, CacheStats, make_key
+
+
+class TestLLMResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.db")
+        self.config = {"config_list": [{"model": "gpt-4o"}], "temperature": 0}
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_key_ignores_trailing_whitespace_line_endings_and_timestamps(self):
+        a = [{"role": "user", "name": "TutorAgent", "content": "Solve for x:  \r\n2x + 5 = 17\r\n", "timestamp": "2024-07-01"}]
+        b = [{"role": "user", "name": "TutorAgent", "content": "Solve for x:\n2x + 5 = 17 "}]
+        self.assertEqual(make_key(self.config, a), make_key(self.config, b))
+
+    def test_key_keeps_indentation(self):
+        nested = "for x in range(3):\n    if x:\n        print(x)"
+        flat = "for x in range(3):\n    if x:\n    print(x)"
+        self.assertNotEqual(make_key(self.config, [{"role": "user", "content": nested}]),
+                            make_key(self.config, [{"role": "user", "content": flat}]))
+        self.assertNotEqual(make_key(self.config, [{"role": "user", "content": "a  b"}]),
+                            make_key(self.config, [{"role": "user", "content": "a b"}]))
+
+    def test_key_depends_on_model(self):
+        messages = [{"role": "user", "content": "hello"}]
+        other = {"config_list": [{"model": "gpt-3.5-turbo"}], "temperature": 0}
+        self.assertNotEqual(make_key(self.config, messages), make_key(other, messages))
+
+    def test_get_and_set(self):
+        cache = LLMResponseCache(self.path)
+        cache.set("k", "x = 6")
+        self.assertEqual(cache.get("k"), "x = 6")
+        self.assertIsNone(cache.get("missing"))
+        cache.close()
+
+    def test_shared_between_instances(self):
+        writer = LLMResponseCache(self.path)
+        reader = LLMResponseCache(self.path)
+        writer.set("k", {"content": "x = 6"})
+        self.assertEqual(reader.get("k"), {"content": "x = 6"})
+        writer.close()
+        reader.close()
+
+    def test_lru_eviction(self):
+        cache = LLMResponseCache(self.path, max_entries=2)
+        cache.set("a", "1")
+        time.sleep(0.01)
+        cache.set("b", "2")
+        time.sleep(0.01)
+        cache.get("a")  # "b" is now least recently used
+        time.sleep(0.01)
+        cache.set("c", "3")
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "1")
+        cache.close()
+
+    def test_expired_entries_are_misses(self):
+        cache = LLMResponseCache(self.path, max_age_seconds=0.01)
+        cache.set("a", "1")
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+        cache.close()
+
+    def test_stats(self):
+        stats = CacheStats()
+        stats.hits += 3
+        stats.misses += 1
+        self.assertEqual(stats.hit_rate, 0.75)
+
+
+if __name__ == '__main__':
+    unittest.main()
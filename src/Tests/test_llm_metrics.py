@@ -0,0 +1,46 @@
+import csv
+import io
+import unittest
+
+from src.Models.llm_metrics import MetricsRegistry, percentile, usage_totals
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def test_percentiles(self):
+        values = sorted(float(i) for i in range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 51.0)
+        self.assertEqual(percentile(values, 0.99), 99.0)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_record_groups_by_agent_state_and_transition(self):
+        registry = MetricsRegistry()
+        registry.record("ProgrammerAgent", 2.0, 100, 50, state="RunningCode", transition="VisualizingAnswer -> RunningCode")
+        registry.record("ProgrammerAgent", 4.0, 100, 50, cache_hit=True, state="RunningCode", transition="VisualizingAnswer -> RunningCode")
+        registry.record("MotivatorAgent", 1.0, 10, 5)
+
+        by_agent = registry.summary("agent")
+        self.assertEqual(by_agent["ProgrammerAgent"]["calls"], 2)
+        self.assertEqual(by_agent["ProgrammerAgent"]["cache_hit_rate"], 0.5)
+        self.assertEqual(by_agent["ProgrammerAgent"]["total_latency"], 6.0)
+        self.assertEqual(by_agent["MotivatorAgent"]["prompt_tokens"], 10)
+        self.assertIn("VisualizingAnswer -> RunningCode", registry.summary("transition"))
+        self.assertNotIn("", registry.summary("state"))
+
+    def test_csv_export(self):
+        registry = MetricsRegistry()
+        registry.record("TeacherAgent", 3.5, 200, 300, state="AwaitingProblem")
+        rows = list(csv.DictReader(io.StringIO(registry.to_csv())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["agent"], "TeacherAgent")
+        self.assertEqual(rows[0]["completion_tokens"], "300")
+
+    def test_usage_totals(self):
+        class Client:
+            total_usage_summary = {"total_cost": 0.1, "gpt-4o": {"prompt_tokens": 10, "completion_tokens": 4}}
+        self.assertEqual(usage_totals(Client()), (10, 4))
+        self.assertEqual(usage_totals(object()), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import threading
+import time
+import unittest
+
+from src.Models.llm_scheduler import (PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, LLMScheduler, TokenBucket,
+                                      is_rate_limit_error)
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_waits_for_refill(self):
+        bucket = TokenBucket(60, period=60.0)  # one per second
+        bucket.consume(60, now=bucket.updated)
+        self.assertAlmostEqual(bucket.wait_time(2, now=bucket.updated), 2.0)
+        self.assertEqual(bucket.wait_time(2, now=bucket.updated + 2.0), 0.0)
+
+    def test_oversized_request_waits_for_a_full_bucket(self):
+        bucket = TokenBucket(10, period=10.0)
+        self.assertEqual(bucket.wait_time(100, now=bucket.updated), 0.0)
+        bucket.consume(100, now=bucket.updated)
+        self.assertEqual(bucket.available, 0)
+
+
+class TestLLMScheduler(unittest.TestCase):
+
+    def test_is_rate_limit_error(self):
+        error = Exception()
+        error.status_code = 429
+        self.assertTrue(is_rate_limit_error(RateLimitError()))
+        self.assertTrue(is_rate_limit_error(error))
+        self.assertFalse(is_rate_limit_error(ValueError()))
+
+    def test_run_returns_the_result(self):
+        scheduler = LLMScheduler()
+        self.assertEqual(scheduler.run(lambda: 42), 42)
+        stats = scheduler.stats()
+        self.assertEqual(stats["completed"], 1)
+        self.assertEqual(stats["active"], 0)
+
+    def test_concurrency_is_bounded(self):
+        scheduler = LLMScheduler(max_concurrency=2)
+        lock, active, peak = threading.Lock(), [0], [0]
+
+        def call():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+
+        threads = [threading.Thread(target=scheduler.run, args=(call,)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(scheduler.completed, 6)
+
+    def test_interactive_requests_are_admitted_first(self):
+        scheduler = LLMScheduler(max_concurrency=1)
+        started, gate, order = threading.Event(), threading.Event(), []
+        holder = threading.Thread(target=scheduler.run, args=(lambda: (started.set(), gate.wait(5)),))
+        holder.start()
+        started.wait(5)
+
+        waiters = []
+        for priority in (PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE):
+            waiters.append(threading.Thread(target=scheduler.run, args=(lambda p=priority: order.append(p), priority)))
+            waiters[-1].start()
+        while scheduler.stats()["queue_depth"] < 2:
+            time.sleep(0.001)
+        gate.set()
+        for thread in [holder] + waiters:
+            thread.join(5)
+        self.assertEqual(order, [PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND])
+
+    def test_rate_limit_errors_are_retried(self):
+        scheduler = LLMScheduler(max_retries=3, base_backoff=0.001, max_backoff=0.001)
+        attempts = []
+
+        def call():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise RateLimitError()
+            return "reply"
+
+        self.assertEqual(scheduler.run(call, model="gpt-4o"), "reply")
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(scheduler.rate_limit_retries, 2)
+        self.assertIn("gpt-4o", scheduler.rate_limits)
+
+    def test_other_errors_and_exhausted_retries_propagate(self):
+        scheduler = LLMScheduler(max_retries=1, base_backoff=0.001, max_backoff=0.001)
+        with self.assertRaises(ValueError):
+            scheduler.run(lambda: (_ for _ in ()).throw(ValueError()))
+        with self.assertRaises(RateLimitError):
+            scheduler.run(lambda: (_ for _ in ()).throw(RateLimitError()))
+        self.assertEqual(scheduler.rate_limit_retries, 1)
+        self.assertEqual(scheduler.stats()["active"], 0)
+
+    def test_request_budget_delays_admission(self):
+        scheduler = LLMScheduler(rate_limits={"gpt-4o": {"requests_per_minute": 600}})  # one per 0.1s
+        scheduler.rate_limits["gpt-4o"].requests.available = 0
+        start = time.monotonic()
+        scheduler.run(lambda: None, model="gpt-4o")
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+import unittest
+
+from src.Models.message_history import SpillSegment, SpillingMessageList
+
+
+def message(i):
+    return {"content": f"message {i}", "role": "user", "name": "StudentAgent"}
+
+
+class TestSpillingMessageList(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.segment = SpillSegment(self.directory.name)
+        self.messages = SpillingMessageList(self.segment, capacity=3)
+
+    def tearDown(self):
+        self.segment.close()
+        self.directory.cleanup()
+
+    def test_keeps_only_capacity_in_memory(self):
+        for i in range(10):
+            self.messages.append(message(i))
+        self.assertEqual(len(self.messages), 10)
+        self.assertEqual(self.messages.spilled, 7)
+        self.assertEqual(len(self.messages._recent), 3)
+
+    def test_reads_through_to_disk(self):
+        for i in range(10):
+            self.messages.append(message(i))
+        self.assertEqual(self.messages[0], message(0))
+        self.assertEqual(self.messages[-1], message(9))
+        self.assertEqual(self.messages[5:8], [message(5), message(6), message(7)])
+        self.assertEqual(list(self.messages), [message(i) for i in range(10)])
+        self.assertEqual(json.loads(json.dumps(list(self.messages)))[2], message(2))
+        with self.assertRaises(IndexError):
+            self.messages[10]
+
+    def test_slices_before_anything_spilled(self):
+        messages = SpillingMessageList(self.segment, capacity=5, messages=[message(0), message(1)])
+        self.assertEqual(messages[0:1], [message(0)])
+        self.assertEqual(messages[1:], [message(1)])
+        self.assertEqual(messages[2:], [])
+        self.assertEqual(self.segment.read_many([]), [])
+        self.assertIsNone(self.segment.path)
+
+    def test_replace_spilled_message(self):
+        for i in range(5):
+            self.messages.append(message(i))
+        self.messages[0] = message(42)
+        self.assertEqual(self.messages[0], message(42))
+        self.assertEqual(self.messages[1], message(1))
+
+    def test_lists_share_one_segment(self):
+        other = SpillingMessageList(self.segment, capacity=1, messages=[message(i) for i in range(3)])
+        for i in range(4):
+            self.messages.append(message(10 + i))
+        self.assertEqual(other[0], message(0))
+        self.assertEqual(self.messages[0], message(10))
+
+    def test_behaves_like_a_list_for_autogen(self):
+        self.assertFalse(self.messages)
+        for i in range(5):
+            self.messages.append(message(i))
+        combined = [{"content": "system", "role": "system"}] + self.messages
+        self.assertEqual(len(combined), 6)
+        self.assertEqual(self.messages.copy(), [message(i) for i in range(5)])
+        self.messages.clear()
+        self.assertEqual(len(self.messages), 0)
+
+    def test_close_removes_segment_file(self):
+        for i in range(5):
+            self.messages.append(message(i))
+        path = self.segment.path
+        self.assertTrue(os.path.exists(path))
+        self.segment.close()
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
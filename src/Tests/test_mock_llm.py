@@ -0,0 +1,48 @@
+import unittest
+
+from src.Models.mock_llm import MockBackend, MockModelClient, LatencyModel, CassetteRecorder, uses_mock_client
+
+
+class TestMockLLM(unittest.TestCase):
+
+    def test_scripted_replies_cycle(self):
+        backend = MockBackend(scripts={"TeacherAgent": ["lesson 1", "lesson 2"]})
+        replies = [backend.reply("TeacherAgent", []) for _ in range(3)]
+        self.assertEqual(replies, ["lesson 1", "lesson 2", "lesson 1"])
+
+    def test_transcript_replay_by_agent(self):
+        transcript = [
+            {"name": "TeacherAgent", "content": "Today: fractions"},
+            {"name": "StudentAgent", "content": "ok"},
+            {"name": "TeacherAgent", "content": "Next: decimals"},
+        ]
+        backend = MockBackend(transcript=transcript)
+        self.assertEqual(backend.reply("TeacherAgent", []), "Today: fractions")
+        self.assertEqual(backend.reply("TeacherAgent", []), "Next: decimals")
+
+    def test_cassette_matches_messages(self):
+        messages = [{"role": "user", "content": "Solve 2x = 4"}]
+        recorder = CassetteRecorder("unused.json")
+        recorder.record("SolutionVerifierAgent", messages, "x = 2")
+        backend = MockBackend(scripts={}, cassette=recorder.interactions)
+        self.assertEqual(backend.reply("SolutionVerifierAgent", messages), "x = 2")
+
+    def test_client_usage(self):
+        client = MockModelClient({"model": "mock-tutor"}, backend=MockBackend(), agent_name="MotivatorAgent")
+        response = client.create({"messages": [{"role": "user", "content": "How am I doing?"}]})
+        self.assertEqual(client.message_retrieval(response), ["Well done! Keep up the great work."])
+        usage = MockModelClient.get_usage(response)
+        self.assertEqual(usage["total_tokens"], usage["prompt_tokens"] + usage["completion_tokens"])
+
+    def test_latency_is_reproducible(self):
+        a = LatencyModel(kind="lognormal", mean=1.0, seed=1)
+        b = LatencyModel(kind="lognormal", mean=1.0, seed=1)
+        self.assertEqual([a.sample() for _ in range(5)], [b.sample() for _ in range(5)])
+
+    def test_uses_mock_client(self):
+        self.assertTrue(uses_mock_client({"config_list": [{"model": "m", "model_client_cls": "MockModelClient"}]}))
+        self.assertFalse(uses_mock_client({"config_list": [{"model": "gpt-4o"}]}))
+
+
+if __name__ == '__main__':
+    unittest.main()
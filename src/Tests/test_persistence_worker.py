@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import unittest
+
+from src.Models.persistence_worker import PersistenceWorker, WriteBehindSink
+
+
+class RecordingSink:
+    def __init__(self):
+        self.batches = []
+
+    def append_many(self, records):
+        self.batches.append(list(records))
+
+
+class TestPersistenceWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.worker = PersistenceWorker(max_pending=4)
+        self.gate = threading.Event()
+
+    def tearDown(self):
+        self.gate.set()
+        self.worker.stop(5)
+
+    def hold(self):
+        # Keep the worker busy so that jobs pile up behind this one
+        started = threading.Event()
+        self.worker.submit(lambda: (started.set(), self.gate.wait(5)))
+        started.wait(5)
+
+    def test_appends_are_batched_and_ordered_with_jobs(self):
+        sink, events = RecordingSink(), []
+        self.hold()
+        for i in range(3):
+            WriteBehindSink(sink, self.worker).append(i)
+        self.worker.submit(lambda: events.append(len(sink.batches)))
+        self.gate.set()
+        self.assertTrue(self.worker.flush(5))
+        self.assertEqual(sink.batches, [[0, 1, 2]])
+        self.assertEqual(events, [1])  # ran after the appends before it
+
+    def test_keyed_jobs_are_coalesced(self):
+        written = []
+        self.hold()
+        for i in range(3):
+            self.worker.submit(lambda i=i: written.append(i), key="checkpoint")
+        self.gate.set()
+        self.worker.flush(5)
+        self.assertEqual(written, [2])
+        self.assertEqual(self.worker.stats()["coalesced"], 2)
+
+    def test_backpressure_blocks_when_full(self):
+        self.hold()
+        for i in range(4):
+            self.worker.submit(lambda: None)
+        producer = threading.Thread(target=self.worker.submit, args=(lambda: None,))
+        producer.start()
+        producer.join(0.2)
+        self.assertTrue(producer.is_alive())
+        self.gate.set()
+        producer.join(5)
+        self.assertFalse(producer.is_alive())
+        self.worker.flush(5)
+        self.assertEqual(self.worker.stats()["blocked"], 1)
+
+    def test_event_loop_is_not_blocked_when_full(self):
+        self.hold()
+        for i in range(4):
+            self.worker.submit(lambda: None)
+
+        async def produce():
+            self.worker.submit(lambda: None)
+
+        asyncio.run(asyncio.wait_for(produce(), 1))
+        self.gate.set()
+        self.worker.flush(5)
+        self.assertEqual(self.worker.stats()["overflowed"], 1)
+        self.assertEqual(self.worker.stats()["blocked"], 0)
+
+    def test_failed_job_does_not_stop_the_worker(self):
+        written = []
+        self.worker.submit(lambda: 1 / 0)
+        self.worker.submit(lambda: written.append(True))
+        self.worker.flush(5)
+        self.assertEqual(written, [True])
+        self.assertEqual(self.worker.stats()["errors"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
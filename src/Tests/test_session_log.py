@@ -0,0 +1,166 @@
+import json
+import os
+import tempfile
+import unittest
+
+from src.Models.session_log import SessionLog
+
+
+def message(i):
+    return {"content": f"message {i}", "role": "user", "name": "StudentAgent"}
+
+
+class TestSessionLog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "progress.json")
+        self.log = SessionLog(self.path, compact_every=1000)
+
+    def tearDown(self):
+        self.log.close(compact=False)
+        self.directory.cleanup()
+
+    def test_read_rebuilds_snapshot_plus_tail(self):
+        for i in range(3):
+            self.log.append(message(i))
+        self.log.compact()
+        for i in range(3, 5):
+            self.log.append(message(i))
+        self.assertEqual(SessionLog(self.path).read(), [message(i) for i in range(5)])
+
+    def test_snapshot_is_a_plain_message_list(self):
+        for i in range(3):
+            self.log.append(message(i))
+        self.log.close()
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), [message(i) for i in range(3)])
+        self.assertEqual(os.path.getsize(self.log.tail_path), 0)
+
+    def test_appends_do_not_rewrite_the_snapshot(self):
+        self.log.append(message(0))
+        self.log.compact()
+        modified = os.stat(self.path).st_mtime_ns
+        for i in range(1, 50):
+            self.log.append(message(i))
+        self.assertEqual(os.stat(self.path).st_mtime_ns, modified)
+        self.assertEqual(len(SessionLog(self.path).read()), 50)
+
+    def test_tail_already_in_snapshot_is_skipped(self):
+        # A crash after the snapshot was replaced but before the tail was emptied
+        for i in range(3):
+            self.log.append(message(i))
+        self.log.flush()
+        with open(self.log.tail_path, "rb") as f:
+            tail = f.read()
+        self.log.compact()
+        with open(self.log.tail_path, "wb") as f:
+            f.write(tail)
+        self.assertEqual(SessionLog(self.path).read(), [message(i) for i in range(3)])
+
+    def test_torn_last_line_is_dropped(self):
+        for i in range(2):
+            self.log.append(message(i))
+        self.log.close(compact=False)
+        with open(self.log.tail_path, "ab") as f:
+            f.write(b'{"seq": 2, "mess')
+        log = SessionLog(self.path)
+        self.assertEqual(log.read(), [message(0), message(1)])
+        log.append(message(2))
+        log.close(compact=False)
+        self.assertEqual(SessionLog(self.path).read(), [message(i) for i in range(3)])
+
+    def test_compacts_automatically(self):
+        log = SessionLog(self.path, compact_every=4)
+        for i in range(10):
+            log.append(message(i))
+        with open(self.path) as f:
+            self.assertEqual(len(json.load(f)), 8)
+        self.assertEqual(log.read(), [message(i) for i in range(10)])
+        log.close(compact=False)
+
+    def test_read_range_spans_snapshot_and_tail(self):
+        for i in range(6):
+            self.log.append({"content": f"line one\nline two {i}", "role": "user", "name": "Ünïcode"})
+        self.log.compact()
+        for i in range(6, 9):
+            self.log.append(message(i))
+        log = SessionLog(self.path)
+        self.assertEqual(log.read_range(4, 8), log.read()[4:8])
+        self.assertEqual(log.read_range(7, 20), [message(7), message(8)])
+        log.append(message(9))  # indexed as it is appended
+        self.assertEqual(log.read_range(8, 10), [message(8), message(9)])
+        log.close(compact=False)
+
+    def test_read_range_of_an_indented_snapshot(self):
+        # Snapshots written before read_range() was indexed
+        with open(self.path, "w") as f:
+            json.dump([message(i) for i in range(4)], f, indent=4)
+        log = SessionLog(self.path)
+        self.assertEqual(log.read_range(1, 3), [message(1), message(2)])
+        log.append(message(4))
+        log.compact()  # rewritten one message per line
+        self.assertEqual(SessionLog(self.path).read_range(3, 5), [message(3), message(4)])
+        log.close(compact=False)
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "progress.json")
+        self.state = {"fsm": {"current_state": "Tutor", "skill_level": 2}}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_resume_returns_state_and_last_page(self):
+        log = SessionLog(self.path, page_size=5)
+        for i in range(30):
+            log.append(message(i))
+        log.write_checkpoint(self.state)
+        log.close(compact=False)
+
+        resumed = SessionLog(self.path, page_size=5).resume()
+        self.assertEqual(resumed["state"], self.state)
+        self.assertEqual(resumed["recent"], [message(i) for i in range(25, 30)])
+        self.assertEqual(resumed["messages"], 30)
+
+    def test_resume_includes_messages_after_the_checkpoint(self):
+        log = SessionLog(self.path, page_size=5)
+        for i in range(10):
+            log.append(message(i))
+        log.write_checkpoint(self.state)
+        for i in range(10, 12):
+            log.append(message(i))
+        log.close(compact=False)
+
+        resumed_log = SessionLog(self.path, page_size=5)
+        resumed = resumed_log.resume()
+        self.assertEqual(resumed["recent"], [message(i) for i in range(7, 12)])
+        resumed_log.append(message(12))
+        resumed_log.close(compact=False)
+        self.assertEqual(SessionLog(self.path).read(), [message(i) for i in range(13)])
+
+    def test_checkpoint_follows_compaction(self):
+        log = SessionLog(self.path, page_size=5, compact_every=8)
+        for i in range(5):
+            log.append(message(i))
+        log.write_checkpoint(self.state)
+        for i in range(5, 10):
+            log.append(message(i))  # compacts at 8
+        log.close(compact=False)
+
+        resumed = SessionLog(self.path, page_size=5).resume()
+        self.assertEqual(resumed["messages"], 10)
+        self.assertEqual(resumed["recent"], [message(i) for i in range(5, 10)])
+
+    def test_no_checkpoint(self):
+        log = SessionLog(self.path)
+        log.append(message(0))
+        self.assertIsNone(log.resume())
+        log.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import time
+import unittest
+
+from src.Models.session_store import SessionStore
+
+
+class TestSessionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = SessionStore(os.path.join(self.directory.name, "sessions.db"))
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_save_and_load_session(self):
+        self.assertIsNone(self.store.load_session("ada"))
+        messages = [{"content": "Hi", "role": "user", "name": "StudentAgent"}]
+        self.store.save_session("ada", {"current_state": "VerifyingAnswer", "awaiting": "StudentAgent"},
+                                {"learner_state": "Knows fractions", "watermark": 1}, messages)
+        session = self.store.load_session("ada")
+        self.assertEqual(session["fsm"]["current_state"], "VerifyingAnswer")
+        self.assertEqual(session["learner"]["watermark"], 1)
+        self.assertEqual(session["messages"], messages)
+
+    def test_saves_append_only_new_messages(self):
+        messages = [{"content": f"message {i}", "role": "user", "name": "StudentAgent"} for i in range(5)]
+        self.store.save_session("ada", {"current_state": "AwaitingAnswer"}, {}, messages[:3])
+        self.store.save_session("ada", {"current_state": "VerifyingAnswer"}, {}, messages[3:])
+        self.store.save_session("ada", {"current_state": "VerifyingAnswer"}, {}, [])
+        session = self.store.load_session("ada")
+        self.assertEqual(session["messages"], messages)
+        self.assertEqual(session["fsm"]["current_state"], "VerifyingAnswer")
+
+    def test_second_connection_sees_saved_session(self):
+        self.store.save_session("ada", {}, {}, [])
+        other = SessionStore(self.store.path)
+        self.assertIsNotNone(other.load_session("ada"))
+        other.close()
+
+    def test_students_stick_to_healthy_workers(self):
+        self.store.heartbeat("worker-0", "http://localhost:5007")
+        self.store.heartbeat("worker-1", "http://localhost:5008")
+        first = self.store.assign_worker("ada")
+        second = self.store.assign_worker("bob")
+        self.assertNotEqual(first, second)  # least loaded worker
+        self.assertEqual(self.store.assign_worker("ada"), first)
+
+    def test_students_move_off_dead_workers(self):
+        self.store.heartbeat("worker-0", "http://localhost:5007")
+        self.assertEqual(self.store.assign_worker("ada"), "http://localhost:5007")
+        self.store.remove_worker("worker-0")
+        self.assertIsNone(self.store.assign_worker("ada"))
+        self.store.heartbeat("worker-1", "http://localhost:5008")
+        self.assertEqual(self.store.assign_worker("ada"), "http://localhost:5008")
+
+    def test_stale_heartbeat_is_unhealthy(self):
+        self.store.heartbeat("worker-0", "http://localhost:5007")
+        time.sleep(0.05)
+        self.assertEqual(self.store.healthy_workers(timeout=0.01), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
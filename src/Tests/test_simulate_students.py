@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestSimulateStudents(unittest.TestCase):
+    '''
+        One short session per flow against the mock LLM. Run as a separate process:
+        llm_config picks the backend when it is first imported.
+    '''
+
+    def simulate(self, flow):
+        with tempfile.TemporaryDirectory() as directory:
+            report_path = os.path.join(directory, "report.json")
+            result = subprocess.run([sys.executable, "-m", "src.Simulation.simulate_students", "--students", "1",
+                                     "--flow", flow, "--policy", "always_right", "--questions", "1", "--latency", "0",
+                                     "--latency-kind", "fixed", "--report", report_path],
+                                    cwd=ROOT, timeout=300, capture_output=True, text=True)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            with open(report_path) as f:
+                return json.load(f)
+
+    def test_one_session_per_flow(self):
+        # The state where the answer is judged: the session got past the student's answer
+        for flow, verifying in (("lesson", "VerifyingAnswer"), ("graph", "VerifySolution")):
+            with self.subTest(flow=flow):
+                report = self.simulate(flow)
+                self.assertEqual(report["errors"], [])
+                self.assertEqual(report["completed"], 1)
+                self.assertEqual(report["answers"], 1)
+                self.assertEqual(report["accuracy"], 1.0)
+                self.assertGreater(report["messages_per_session"], 1)
+                self.assertGreater(report["memory_per_session_kb"], 0)
+                self.assertIn(verifying, report["states"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from src.Models.token_stream import TokenStream
+
+
+class RecordingStream:
+    def __init__(self):
+        self.printed = []
+        self.sent = []
+
+    def print(self, *objects, sep=" ", end="\n", flush=False):
+        self.printed.append(sep.join(str(o) for o in objects) + end)
+
+    def input(self, prompt="", *, password=False):
+        return "typed"
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+class TestTokenStream(unittest.TestCase):
+
+    def setUp(self):
+        self.tokens = []
+        self.fallback = RecordingStream()
+        self.stream = TokenStream("TutorAgent", lambda agent, token: self.tokens.append((agent, token)), self.fallback)
+
+    def test_chunks_are_forwarded_without_colour_codes(self):
+        self.stream.print("\x1b[32mHel\x1b[0m", end="")
+        self.stream.print("lo", end="")
+        self.assertEqual(self.tokens, [("TutorAgent", "Hel"), ("TutorAgent", "lo")])
+        self.assertEqual(self.stream.num_chunks, 2)
+
+    def test_empty_chunks_are_not_tokens(self):
+        self.stream.print("\x1b[0m")
+        self.stream.print()
+        self.assertEqual(self.tokens, [])
+        self.assertIsNone(self.stream.time_to_first_token)
+
+    def test_time_to_first_token(self):
+        self.stream.print("a", end="")
+        first = self.stream.time_to_first_token
+        self.stream.print("b", end="")
+        self.assertGreaterEqual(first, 0.0)
+        self.assertEqual(self.stream.time_to_first_token, first)
+
+    def test_everything_is_echoed_to_the_fallback(self):
+        self.stream.print("\x1b[0m")
+        self.stream.print("x", "y", sep="-", end="")
+        self.stream.send("message")
+        self.assertEqual(self.fallback.printed, ["\x1b[0m\n", "x-y"])
+        self.assertEqual(self.fallback.sent, ["message"])
+        self.assertEqual(self.stream.input("?"), "typed")
+
+    def test_without_fallback(self):
+        stream = TokenStream("TutorAgent", lambda agent, token: self.tokens.append(token))
+        stream.print("a", end="")
+        stream.send("message")
+        self.assertEqual(self.tokens, ["a"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import asyncio
+import unittest
+
+from src.UI.ui_batcher import UIUpdateBatcher
+
+
+class TestUIUpdateBatcher(unittest.TestCase):
+
+    def test_outside_a_loop_changes_apply_right_away(self):
+        batcher, applied = UIUpdateBatcher(), []
+        batcher.post(lambda: applied.append("message"))
+        batcher.schedule("dashboard", lambda: applied.append("dashboard"))
+        self.assertEqual(applied, ["message", "dashboard"])
+        self.assertEqual(batcher.stats()["frames"], 2)
+
+    def test_changes_of_a_frame_are_applied_together(self):
+        batcher, applied = UIUpdateBatcher(frame_seconds=0.01), []
+
+        async def main():
+            batcher.post(lambda: applied.append("first"))
+            batcher.schedule("dashboard", lambda: applied.append("old dashboard"))
+            batcher.append_text("TutorAgent", "Hel", applied.append)
+            batcher.append_text("TutorAgent", "lo", applied.append)
+            batcher.schedule("dashboard", lambda: applied.append("dashboard"))
+            batcher.post(lambda: applied.append("last"))
+            self.assertEqual(applied, [])
+            await asyncio.sleep(0.05)
+
+        asyncio.run(main())
+        # Ordered changes first, then the latest of each scheduled key
+        self.assertEqual(applied, ["first", "Hello", "last", "dashboard"])
+        stats = batcher.stats()
+        self.assertEqual((stats["frames"], stats["updates"], stats["coalesced"]), (1, 6, 2))
+
+    def test_texts_are_joined_only_when_adjacent(self):
+        batcher, applied = UIUpdateBatcher(frame_seconds=0.01), []
+
+        async def main():
+            batcher.append_text("TutorAgent", "a", applied.append)
+            batcher.append_text("MotivatorAgent", "b", applied.append)
+            batcher.append_text("TutorAgent", "c", applied.append)
+            batcher.flush()
+
+        asyncio.run(main())
+        self.assertEqual(applied, ["a", "b", "c"])
+
+    def test_a_failing_update_does_not_drop_the_frame(self):
+        batcher, applied = UIUpdateBatcher(), []
+
+        async def main():
+            batcher.post(lambda: 1 / 0)
+            batcher.post(lambda: applied.append("after"))
+            batcher.flush()
+            batcher.flush()  # nothing left
+
+        asyncio.run(main())
+        self.assertEqual(applied, ["after"])
+        self.assertEqual(batcher.stats()["frames"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -34,12 +34,17 @@ fsm = fsm.FSMGraphTracerConsole(agents_dict)
 
 
 
+async def run():
+    # The FSM's agent calls are coroutines. Reading the student's answer runs on the blocking pool.
+    while True:        
+        next_agent = await fsm.next_speaker_selector()
+        if next_agent is None:
+            break
+
+
 if __name__ == "__main__":
 
 #    manager.initiate_chat(student)
 
-    while True:        
-        next_agent = fsm.next_speaker_selector()
-        if next_agent is None:
-            break
+    asyncio.run(run())
  
\ No newline at end of file
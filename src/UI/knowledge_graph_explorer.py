@@ -0,0 +1,177 @@
+####################################################################
+# Knowledge Graph Explorer
+#
+# A tab showing the math taxonomy in the radial layout of
+# compute_gephi.py, colored by the student's mastery. The layout is
+# computed once per process (graph_layout.py); each session only
+# keeps the mastery of its student.
+#
+# The browser never receives the whole graph. After every zoom or pan
+# the server sends the nodes inside the view, down to the deepest
+# level that is legible at that zoom, and labels only when few enough
+# nodes are drawn. Mastery and the current topic come from the
+# session's VerdictIssued and MasteryUpdated events.
+#####################################################################
+import asyncio
+
+import panel as pn
+from bokeh.events import RangesUpdate
+from bokeh.models import ColumnDataSource, HoverTool, LabelSet
+from bokeh.plotting import figure
+
+from src.KnowledgeGraphs.graph_layout import LEVEL_NAMES, get_taxonomy_layout
+from src.KnowledgeGraphs.math_taxonomy import topic_colors
+from src.Models.event_bus import MasteryUpdated, VerdictIssued
+from src.Models.event_loop import run_blocking
+
+
+PLOT_SIZE = 700       # pixels
+MAX_LABELS = 80       # nodes in view before labels are left out
+NODE_SIZES = [22, 14, 9, 6]  # pixels, per level
+UNTRIED_ALPHA = 0.35  # nodes without verdicts keep their topic color, faded
+
+# Mastery from 0 (red) to 1 (green)
+NO_MASTERY = (220, 70, 60)
+FULL_MASTERY = (60, 170, 80)
+
+
+def mastery_color(score: float) -> str:
+    red, green, blue = (round(low + (high - low) * score) for low, high in zip(NO_MASTERY, FULL_MASTERY))
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+
+def topic_color(root: str) -> str:
+    red, green, blue = topic_colors.get(root, "200,200,200").split(",")
+    return f"#{int(red):02x}{int(green):02x}{int(blue):02x}"
+
+
+class KnowledgeGraphExplorer:
+    def __init__(self, groupchat_manager, ui):
+        '''
+            ui: the session's UIUpdateBatcher. Redraws are applied in its frames.
+        '''
+        self.groupchat_manager = groupchat_manager
+        self.ui = ui
+        self.layout = get_taxonomy_layout()
+        self.accuracy = {}  # topic -> (correct answers, verdicts)
+        self.current_topic = getattr(groupchat_manager.fsm, "current_topic", None)
+        self._color_nodes()
+
+        extent = self.layout.extent * 1.05
+        self.view = (-extent, extent, -extent, extent)
+        self.nodes = ColumnDataSource(data=self._node_columns([]))
+        self.edges = ColumnDataSource(data={"x0": [], "y0": [], "x1": [], "y1": []})
+        self.labels = ColumnDataSource(data={"x": [], "y": [], "label": []})
+
+        self.figure = figure(width=PLOT_SIZE, height=PLOT_SIZE, match_aspect=True,
+                             x_range=(-extent, extent), y_range=(-extent, extent),
+                             tools="pan,wheel_zoom,reset", active_scroll="wheel_zoom", toolbar_location="above")
+        self.figure.axis.visible = False
+        self.figure.grid.visible = False
+        self.figure.segment(x0="x0", y0="y0", x1="x1", y1="y1", source=self.edges, line_color="#bbbbbb", line_width=1)
+        nodes = self.figure.scatter(x="x", y="y", size="size", source=self.nodes, fill_color="color", fill_alpha="alpha",
+                                    line_color="outline", line_width="outline_width")
+        self.figure.add_layout(LabelSet(x="x", y="y", text="label", source=self.labels, text_font_size="9pt",
+                                        x_offset=6, y_offset=6))
+        self.figure.add_tools(HoverTool(renderers=[nodes], tooltips=[("", "@label"), ("", "@kind"), ("Mastery", "@mastery")]))
+        self.figure.on_event(RangesUpdate, self.handle_ranges)
+
+        self.summary = pn.pane.Markdown("")
+        groupchat_manager.events.subscribe(self.handle_events, VerdictIssued, MasteryUpdated)
+        self._draw()
+        self._load_accuracy()
+
+    ########## Mastery
+    def _load_accuracy(self):
+        # Verdicts of earlier sessions. The store query runs on the blocking pool, off the shared event loop.
+        recorder = self.groupchat_manager.conversation_recorder
+        if recorder is None:
+            return
+        store, student_id = recorder.store, self.groupchat_manager.student_id
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._add_accuracy(store.accuracy_by_topic(student_id))
+            self._draw()
+            return
+        self.loading = asyncio.ensure_future(self._a_load_accuracy(store, student_id))
+
+    async def _a_load_accuracy(self, store, student_id):
+        self._add_accuracy(await run_blocking(store.accuracy_by_topic, student_id))
+        self.ui.schedule("knowledge_graph", self._draw)
+
+    def _add_accuracy(self, accuracy):
+        # Verdicts of this session may already have arrived
+        for topic, (correct, total) in accuracy.items():
+            now_correct, now_total = self.accuracy.get(topic, (0, 0))
+            self.accuracy[topic] = (now_correct + (correct or 0), now_total + total)
+        self._color_nodes()
+
+    def _color_nodes(self):
+        # Per node of the shared layout, recomputed only when a verdict arrives
+        self.scores = self.layout.mastery(self.accuracy)
+        self.colors = [topic_color(root) if score is None else mastery_color(score)
+                       for root, score in zip(self.layout.roots, self.scores)]
+        skill = len(LEVEL_NAMES) - 1
+        self.mastered = sum(1 for level, score in zip(self.layout.levels, self.scores)
+                            if level == skill and score is not None and score >= 0.5)
+
+    def handle_events(self, events):
+        verdicts = False
+        for event in events:
+            if isinstance(event, MasteryUpdated):
+                self.current_topic = event.topic
+            elif event.topic is not None:
+                correct, total = self.accuracy.get(event.topic, (0, 0))
+                self.accuracy[event.topic] = (correct + int(event.correct), total + 1)
+                verdicts = True
+        if verdicts:
+            self._color_nodes()
+        self.ui.schedule("knowledge_graph", self._draw)
+
+    ########## Level of detail
+    def handle_ranges(self, event):
+        # At the end of each zoom or pan
+        if None in (event.x0, event.x1, event.y0, event.y1):
+            return
+        self.view = (event.x0, event.x1, event.y0, event.y1)
+        self.ui.schedule("knowledge_graph", self._draw)
+
+    def _node_columns(self, indices):
+        layout, scores = self.layout, self.scores
+        return {
+            "x": [layout.x[i] for i in indices],
+            "y": [layout.y[i] for i in indices],
+            "label": [layout.labels[i] for i in indices],
+            "kind": [LEVEL_NAMES[layout.levels[i]] for i in indices],
+            "size": [NODE_SIZES[layout.levels[i]] for i in indices],
+            "color": [self.colors[i] for i in indices],
+            "alpha": [UNTRIED_ALPHA if scores[i] is None else 1.0 for i in indices],
+            "mastery": ["no answers yet" if scores[i] is None else f"{scores[i]:.0%}" for i in indices],
+            "outline": ["black" if layout.names[i] == self.current_topic else "white" for i in indices],
+            "outline_width": [3 if layout.names[i] == self.current_topic else 1 for i in indices],
+        }
+
+    def _draw(self):
+        layout = self.layout
+        indices = layout.visible(*self.view, pixels=PLOT_SIZE)
+        edges = [(layout.parents[i], i) for i in indices if layout.parents[i] >= 0]  # the parent may be outside the view
+        # Each source is replaced in one message
+        self.nodes.data = self._node_columns(indices)
+        self.edges.data = {"x0": [layout.x[p] for p, _ in edges], "y0": [layout.y[p] for p, _ in edges],
+                           "x1": [layout.x[c] for _, c in edges], "y1": [layout.y[c] for _, c in edges]}
+        labelled = indices if len(indices) <= MAX_LABELS else [i for i in indices if layout.levels[i] == 0]
+        self.labels.data = {"x": [layout.x[i] for i in labelled], "y": [layout.y[i] for i in labelled],
+                            "label": [layout.labels[i] for i in labelled]}
+
+        deepest = max((layout.levels[i] for i in indices), default=0)
+        summary = f"{len(indices)} of {len(layout)} topics shown, down to {LEVEL_NAMES[deepest].lower()} level."
+        if deepest < len(LEVEL_NAMES) - 1:
+            summary += " Zoom in for more detail."
+        summary += f"\n\nSkills with mostly correct answers: {self.mastered}"
+        if self.current_topic:
+            summary += f"\n\nWorking on: {self.current_topic.replace('->', ' → ').replace('_', ' ')}"
+        self.summary.object = summary
+
+    def view_panel(self):
+        return pn.Column(self.summary, pn.pane.Bokeh(self.figure))
@@ -0,0 +1,116 @@
+####################################################################
+# Multi-process Panel Deployment
+#
+#   python -m src.UI.panel_cluster --workers 4 --port 5006
+#
+# Starts N worker processes. Each serves the tutor app on its own
+# port (port+1 ... port+N), and all of them share one SessionStore.
+# A small router on --port redirects each student to their assigned
+# worker. A student sticks to that worker while its heartbeat, sent
+# from the worker's event loop, stays fresh. When a worker stops
+# responding or dies, its students move to another worker, which
+# resumes them from the store, and a dead worker is restarted.
+#####################################################################
+import argparse
+import multiprocessing
+import os
+import urllib.parse
+import uuid
+
+from tornado import ioloop, web
+
+from src.Models.session_store import SessionStore, default_path
+
+
+HEARTBEAT_SECONDS = 5.0
+
+
+def run_worker(worker_id: str, port: int, address: str, public_host: str, store_path: str):
+    import panel as pn
+    from src.UI import panel_gui_tabs
+
+    os.environ["AUTOGEN_USE_DOCKER"] = "False"
+    store = SessionStore(store_path)
+    panel_gui_tabs.session_store = store
+    url = f"http://{public_host}:{port}"
+
+    server = pn.serve(panel_gui_tabs.create_app, port=port, address=address, show=False, start=False,
+                      allow_websocket_origin=[f"{public_host}:{port}", f"localhost:{port}"],
+                      callback_exception='verbose')
+    # Beats from the event loop, so a worker whose loop is stuck stops receiving new students
+    store.heartbeat(worker_id, url)
+    ioloop.PeriodicCallback(lambda: store.heartbeat(worker_id, url), HEARTBEAT_SECONDS * 1000).start()
+    print(f"{worker_id} (pid {os.getpid()}) serving {url}")
+    server.start()
+    server.io_loop.start()
+
+
+class RouteHandler(web.RequestHandler):
+    def initialize(self, store: SessionStore):
+        self.store = store
+
+    def get(self):
+        student_id = self.get_argument("student", None) or f"anonymous-{uuid.uuid4().hex}"
+        url = self.store.assign_worker(student_id)
+        if url is None:
+            self.set_status(503)
+            self.write("No tutor workers are running. Please try again shortly.")
+            return
+        self.redirect(f"{url}/?{urllib.parse.urlencode({'student': student_id})}")
+
+
+class Cluster:
+    def __init__(self, workers: int, port: int, address: str, public_host: str, store_path: str):
+        self.workers = workers
+        self.port = port
+        self.address = address
+        self.public_host = public_host
+        self.store_path = store_path
+        self.store = SessionStore(store_path)
+        self.context = multiprocessing.get_context("spawn")
+        self.processes = {}
+
+    def worker_id(self, index: int) -> str:
+        return f"worker-{index}"
+
+    def start_worker(self, index: int) -> None:
+        process = self.context.Process(target=run_worker, daemon=True,
+                                       args=(self.worker_id(index), self.port + 1 + index, self.address,
+                                             self.public_host, self.store_path))
+        process.start()
+        self.processes[index] = process
+
+    def supervise(self) -> None:
+        for index, process in list(self.processes.items()):
+            if not process.is_alive():
+                print(f"{self.worker_id(index)} exited with code {process.exitcode}. Restarting it.")
+                self.store.remove_worker(self.worker_id(index))  # route its students elsewhere right away
+                self.start_worker(index)
+
+    def run(self) -> None:
+        for index in range(self.workers):
+            self.start_worker(index)
+        app = web.Application([(r"/", RouteHandler, {"store": self.store})])
+        app.listen(self.port, address=self.address)
+        ioloop.PeriodicCallback(self.supervise, HEARTBEAT_SECONDS * 1000).start()
+        print(f"Routing students on http://{self.public_host}:{self.port}/?student=<id> to {self.workers} workers")
+        try:
+            ioloop.IOLoop.current().start()
+        finally:
+            for process in self.processes.values():
+                process.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Adaptive Tutor from several worker processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--port", type=int, default=5006, help="router port. Workers use the following ports.")
+    parser.add_argument("--address", default="0.0.0.0")
+    parser.add_argument("--public-host", default="localhost", help="host name students use to reach the workers")
+    parser.add_argument("--store", default=default_path, help="SQLite session store shared by the workers")
+    args = parser.parse_args()
+    Cluster(args.workers, args.port, args.address, args.public_host, args.store).run()
+
+
+if __name__ == "__main__":
+    main()
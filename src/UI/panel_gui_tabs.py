@@ -7,10 +7,12 @@ import asyncio
 from typing import List, Dict
 import logging
 from src import globals
-from src.Agents.agents import *
+from src.Agents.agents import create_agents
 from src.Agents.chat_manager_fsms import FSM
 from src.Agents.group_chat_manager_agent import CustomGroupChatManager, CustomGroupChat
+from src.Models.conversation_store import get_conversation_store
 from src.UI.reactive_chat import ReactiveChat
+from src.UI.session_student import DEFAULT_STUDENT, student_file, student_from_request
 from src.UI.avatar import avatar
 
 # logging.basicConfig(filename='debug.log', level=logging.DEBUG, 
@@ -22,48 +24,67 @@ os.environ["AUTOGEN_USE_DOCKER"] = "False"
 ##############################################
 # Main Adaptive Learning Application
 ############################################## 
-globals.input_future = None
 script_dir = os.path.dirname(os.path.abspath(__file__))
 progress_file_path = os.path.join(script_dir, '../../progress.json')
-   
-fsm = FSM(agents_dict)
 
-groupchat = CustomGroupChat(agents=list(agents_dict.values()), 
-                              messages=[],
-                              max_round=globals.MAX_ROUNDS,
-                              send_introductions=True,
-                              speaker_selection_method=fsm.next_speaker_selector
-                              )
+# Set by panel_cluster workers: sessions are kept in the shared store instead of progress files
+session_store = None
 
 
-manager = CustomGroupChatManager(groupchat=groupchat,
-                                filename=progress_file_path, 
-                                is_termination_msg=lambda x: x.get("content", "").rstrip().find("TERMINATE") >= 0 )    
+def create_session(student_id: str = DEFAULT_STUDENT):
+    '''
+        Agents, FSM, groupchat and GUI for one student. Nothing is shared with other sessions.
+    '''
+    agents_dict = create_agents()
+    fsm = FSM(agents_dict)
 
-# Begin GUI components
-reactive_chat = ReactiveChat(groupchat_manager=manager)
+    groupchat = CustomGroupChat(agents=list(agents_dict.values()), 
+                                  messages=[],
+                                  max_round=globals.MAX_ROUNDS,
+                                  send_introductions=True,
+                                  speaker_selection_method=fsm.next_speaker_selector
+                                  )
 
-# Register groupchat_manager and reactive_chat gui interface with ConversableAgents
-# Register autogen reply function
-# TODO: Consider having each conversible agent register the reply function at init
-for agent in groupchat.agents:
-    agent.groupchat_manager = manager
-    agent.reactive_chat = reactive_chat
-    agent.register_reply([autogen.Agent, None], reply_func=agent.autogen_reply_func, config={"callback": None})
+    filename = student_file(progress_file_path, student_id) if session_store is None else None  # the store holds the history
+    manager = CustomGroupChatManager(groupchat=groupchat,
+                                    filename=filename, 
+                                    is_termination_msg=lambda x: x.get("content", "").rstrip().find("TERMINATE") >= 0 )    
+    manager.fsm = fsm
+    fsm.groupchat_manager = manager
+    manager.session_store = session_store
+    manager.student_id = student_id
+    manager.enable_history_spilling()
+    manager.attach_conversation_store(get_conversation_store())
 
+    # Begin GUI components
+    reactive_chat = ReactiveChat(groupchat_manager=manager, agents_dict=agents_dict)
 
-#Load chat history on startup
-manager.get_chat_history_and_initialize_chat(filename=progress_file_path, chat_interface=reactive_chat.learn_tab_interface) 
-reactive_chat.update_dashboard()    #Call after history loaded
+    # Register groupchat_manager and reactive_chat gui interface with ConversableAgents
+    # Register autogen reply function
+    # TODO: Consider having each conversible agent register the reply function at init
+    for agent in groupchat.agents:
+        agent.groupchat_manager = manager
+        agent.reactive_chat = reactive_chat
+        agent.register_reply([autogen.Agent, None], reply_func=agent.autogen_reply_func, config={"callback": None})
+
+    # Load chat history once the page is shown. The reads run on the blocking pool, off the shared event loop.
+    async def a_load_history():
+        await manager.a_get_chat_history_and_initialize_chat(filename=filename, chat_interface=reactive_chat.learn_tab_interface)
+        reactive_chat.update_dashboard()    #Call after history loaded
+        reactive_chat.button_load_earlier.visible = reactive_chat.has_earlier_messages
+    pn.state.onload(a_load_history)
+
+    return manager, reactive_chat
 
 
 
 # --- Panel Interface ---
 def create_app():    
+    # Called by Panel once per browser session. ?student=<id> selects the student's history.
+    manager, reactive_chat = create_session(student_from_request())
+    pn.state.on_session_destroyed(lambda session_context: manager.close())
     return reactive_chat.draw_view()
 
 if __name__ == "__main__":    
-    app = create_app()
-    #pn.serve(app, debug=True)
-    pn.serve(app, callback_exception='verbose')
- 
\ No newline at end of file
+    #pn.serve(create_app, debug=True)
+    pn.serve(create_app, callback_exception='verbose')
@@ -3,26 +3,62 @@
 import param
 import panel as pn
 import asyncio
-import re
+import io
+from array import array
 import autogen as autogen
 from src.UI.avatar import avatar
 import src.Agents.agents as agents
 from src import globals as globals
+from src.Models import llm_metrics
+from src.Models import llm_scheduler
+from src.Models import persistence_worker
+from src.Models import event_loop
+from src.Models.event_bus import InputRequested, MasteryUpdated, MessagePosted, StateChanged, VerdictIssued
+from src.Agents import fsm_engine
+from src.Agents.agent_factory import get_agent_factory
+from src.Models.message_history import SpillSegment
+from src.UI.ui_batcher import UIUpdateBatcher
+from src.UI.knowledge_graph_explorer import KnowledgeGraphExplorer
 
 class ReactiveChat(param.Parameterized):
-    def __init__(self, groupchat_manager=None, **params):
+    def __init__(self, groupchat_manager=None, agents_dict=None, **params):
         super().__init__(**params)
         
         pn.extension(design="material")
 
         self.groupchat_manager = groupchat_manager
+        self.agents_dict = agents.agents_dict if agents_dict is None else agents_dict  # this session's agents
+        self.ui = UIUpdateBatcher(document=pn.state.curdoc)  # one websocket patch per frame
+        event_loop.get_loop_lag_monitor().start()  # the loop every session shares (dashboard)
  
         # Learn tab
         self.LEARN_TAB_NAME = "LearnTab"
         self.learn_tab_interface = pn.chat.ChatInterface(callback=self.a_learn_tab_callback, name=self.LEARN_TAB_NAME)
+        self.streaming_messages = {}  # agent name -> {"message": ChatMessage receiving streamed tokens, once drawn}
+        self.loop = None              # Panel's event loop. Tokens arrive on autogen's executor threads.
+        self.button_load_earlier = pn.widgets.Button(name='Show earlier messages', button_type='light', visible=False)
+        self.button_load_earlier.on_click(self.handle_button_load_earlier)
+        # Messages scrolled out of the rendered window: segment offsets, newest last. Redrawn on scroll up.
+        if self.groupchat_manager.history_segment is None:
+            self.groupchat_manager.history_segment = SpillSegment()  # closed with the manager
+        self.hidden_segment = self.groupchat_manager.history_segment
+        self.hidden_offsets = array('q')
+        self.visible_start = None  # index of the first message in the browser's viewport
+        self.loading_earlier = False
+        chat_log = getattr(self.learn_tab_interface, "_chat_log", None)  # the Feed holding the messages
+        if chat_log is not None and "visible_range" in chat_log.param:
+            chat_log.param.watch(self.handle_scroll, "visible_range")
 
         # Dashboard tab
         self.dashboard_view = pn.pane.Markdown(f"Total messages: {len(self.groupchat_manager.groupchat.messages)}")
+        self.time_to_first_token = {}
+        self.fsm_state = None
+        self.metrics_view = pn.pane.Markdown("")
+        self.metrics_download = pn.widgets.FileDownload(callback=self.export_metrics_csv, filename="llm_metrics.csv",
+                                                        label="Export LLM metrics (CSV)", button_type="primary")
+        self.button_measure_memory = pn.widgets.Button(name='Measure agent memory', button_type='light')
+        self.button_measure_memory.on_click(self.handle_button_measure_memory)
+        self.memory_view = pn.pane.Markdown("")
         
         # Progress tab
         self.progress_text = pn.pane.Markdown(f"**Student Progress**")
@@ -30,103 +66,259 @@ class ReactiveChat(param.Parameterized):
         self.max_questions = 10
         self.progress_bar = pn.widgets.Progress(name='Progress', value=self.progress, max=self.max_questions)        
         self.progress_info = pn.pane.Markdown(f"{self.progress} out of {self.max_questions}", width=60)
+        self.topic_info = pn.pane.Markdown("")
+
+        # Knowledge Graph tab. The taxonomy colored by the student's mastery.
+        self.knowledge_graph = KnowledgeGraphExplorer(self.groupchat_manager, self.ui)
 
         # Model tab. Capabilities for the LearnerModel
         self.MODEL_TAB_NAME = "ModelTab"
         self.model_tab_interface = pn.chat.ChatInterface(callback=self.a_model_tab_callback, name=self.MODEL_TAB_NAME)
         self.button_update_learner_model = pn.widgets.Button(name='Update Learner Model', button_type='primary')
         self.button_update_learner_model.on_click(self.handle_button_update_model)
-        self.is_model_tab = False
 
-        # TODO: Consider whether groupchat_manager or this class should manage the chat_interface
-        #       Currently, I have placed it in CustomGroupChatManager
-        self.groupchat_manager.chat_interface = self.learn_tab_interface  # default chat tab
+        # The session history is drawn in the Learn tab
+        self.groupchat_manager.chat_interface = self.learn_tab_interface
+
+        # Each tab takes only the events it draws
+        events = self.groupchat_manager.events
+        events.subscribe(self.update_learn_tab, MessagePosted, InputRequested)
+        events.subscribe(self.handle_dashboard_events, MessagePosted, StateChanged)
+        events.subscribe(self.update_progress, VerdictIssued, MasteryUpdated)
 
     ############ tab1: Learn interface
     async def a_learn_tab_callback(self, contents: str, user: str, instance: pn.chat.ChatInterface):
         '''
-            All panel callbacks for the learn tab come through this callback function
-            Because there are two chat panels, we need to save the instance
-            Then, when update is called, check the instance name
+            The student's messages in the Learn tab start the chat or answer the agent waiting for input.
+            Agent output comes back through the session's events (see update_learn_tab).
         '''                      
-        self.groupchat_manager.chat_interface = instance
-        if not globals.initiate_chat_task_created:
-            asyncio.create_task(self.groupchat_manager.delayed_initiate_chat(agents.tutor, self.groupchat_manager, contents))  
+        self.loop = asyncio.get_running_loop()
+        event_loop.get_loop_lag_monitor().start(self.loop)
+        await self.groupchat_manager.history_loaded.wait()  # the restored session decides who answers
+        if not self.groupchat_manager.initiate_chat_task_created:
+            self.groupchat_manager.start_chat(self.agents_dict["tutor"], contents)
         else:
-            if globals.input_future and not globals.input_future.done():                
-                globals.input_future.set_result(contents)                 
-            else:
+            if not self.groupchat_manager.submit_input(contents):
                 print("No input being awaited.")
     
-    def update_learn_tab(self, recipient, messages, sender, config):
-        if self.groupchat_manager.chat_interface.name is not self.LEARN_TAB_NAME: return
-        last_content = messages[-1]['content'] 
-        if all(key in messages[-1] for key in ['name']):
-            self.learn_tab_interface.send(last_content, user=messages[-1]['name'], avatar=avatar[messages[-1]['name']], respond=False)
+    def update_learn_tab(self, events):
+        for event in events:
+            if isinstance(event, InputRequested):
+                self.ui.post(lambda prompt=event.prompt: self.learn_tab_interface.send(prompt, user="System", respond=False))
+                continue
+            # A streamed reply is already on screen. Replace the streamed text with the finished message.
+            stream = self.streaming_messages.pop(event.user, None)
+            self.ui.post(lambda content=event.message['content'], user=event.user, stream=stream:
+                         self._show_message(content, user, stream))
+        self.ui.schedule("hide", self._hide_oldest_messages)
+
+    def _show_message(self, content, user, stream=None):
+        if stream is not None and stream["message"] is not None:
+            stream["message"].object = content
         else:
-            self.learn_tab_interface.send(last_content, user=recipient.name, avatar=avatar[recipient.name], respond=False)
+            self.learn_tab_interface.send(content, user=user, avatar=avatar[user], respond=False)
         
+    ############ Rendered window of the Learn tab
+    @property
+    def has_earlier_messages(self) -> bool:
+        return bool(self.hidden_offsets) or self.groupchat_manager.history_start > 0
+
+    def _hide_oldest_messages(self):
+        '''
+            Keep at most MESSAGES_RENDERED messages in the document. Older ones go to disk.
+        '''
+        objects = list(self.learn_tab_interface.objects)
+        excess = len(objects) - globals.MESSAGES_RENDERED
+        if excess <= 0 or (self.visible_start is not None and self.visible_start < excess):
+            return  # nothing to hide, or the student is reading those messages
+        for message in objects[:excess]:
+            content = message.object if isinstance(message.object, str) else str(message.object)
+            avatar_value = message.avatar if isinstance(message.avatar, str) else None
+            self.hidden_offsets.append(self.hidden_segment.write({"content": content, "user": message.user, "avatar": avatar_value}))
+        self.learn_tab_interface.objects = objects[excess:]
+        self.button_load_earlier.visible = True
+
+    async def a_show_earlier_messages(self):
+        '''
+            Draw the page before the first rendered message: from the hidden messages,
+            then from the session's history on disk.
+        '''
+        if self.loading_earlier:
+            return  # scroll events arrive while the page is read
+        if self.hidden_offsets:
+            count = min(globals.HISTORY_PAGE_SIZE, len(self.hidden_offsets))
+            records = self.hidden_segment.read_many(self.hidden_offsets[-count:])
+            del self.hidden_offsets[-count:]
+            earlier = [pn.chat.ChatMessage(record["content"], user=record["user"], avatar=record["avatar"]) for record in records]
+        else:
+            self.loading_earlier = True
+            try:
+                messages = await self.groupchat_manager.a_earlier_messages(globals.HISTORY_PAGE_SIZE)
+            finally:
+                self.loading_earlier = False
+            earlier = self.groupchat_manager.history_chat_messages(messages)
+        self.learn_tab_interface.objects = earlier + list(self.learn_tab_interface.objects)
+        self.button_load_earlier.visible = self.has_earlier_messages
+
+    async def handle_button_load_earlier(self, event=None):
+        await self.a_show_earlier_messages()
+
+    async def handle_scroll(self, event):
+        # Scrolled to the first rendered message: draw the page before it
+        self.visible_start = event.new[0] if event.new else None
+        if self.visible_start == 0 and self.has_earlier_messages:
+            await self.a_show_earlier_messages()
+
+    def stream_token(self, agent_name, token):
+        '''
+            Called from autogen's executor thread for every streamed chunk.
+            Panel objects are only touched on the event loop.
+        '''
+        if self.loop is None: return
+        self.loop.call_soon_threadsafe(self._append_token, agent_name, token)
+
+    def _append_token(self, agent_name, token):
+        # Tokens arriving within a frame are drawn as one chunk
+        stream = self.streaming_messages.setdefault(agent_name, {"message": None})
+        self.ui.append_text(("stream", id(stream)), token, lambda text: self._stream_text(agent_name, stream, text))
+
+    def _stream_text(self, agent_name, stream, text):
+        if stream["message"] is None:
+            stream["message"] = self.learn_tab_interface.stream(text, user=agent_name, avatar=avatar[agent_name])
+        else:
+            self.learn_tab_interface.stream(text, user=agent_name, message=stream["message"])
+
+    def report_time_to_first_token(self, agent_name, seconds):
+        if self.loop is None: return
+        self.loop.call_soon_threadsafe(self._set_time_to_first_token, agent_name, seconds)
+
+    def _set_time_to_first_token(self, agent_name, seconds):
+        self.time_to_first_token[agent_name] = seconds
+        self.update_dashboard()
+
     ########## tab2: Dashboard
+    def handle_dashboard_events(self, events):
+        for event in events:
+            if isinstance(event, StateChanged):
+                self.fsm_state = event.state
+        self.update_dashboard()
+
     def update_dashboard(self):
-        self.dashboard_view.object = f"Total messages: {len(self.groupchat_manager.groupchat.get_messages())}"
+        self.ui.schedule("dashboard", self._draw_dashboard)
+
+    def _draw_dashboard(self):
+        dashboard = f"Total messages: {len(self.groupchat_manager.groupchat.get_messages())}"
+        if self.fsm_state is not None:
+            dashboard += f"\n\nFSM state: {self.fsm_state}"
+        if self.time_to_first_token:
+            dashboard += "\n\n**Time to first token (last reply)**\n"
+            for agent_name, seconds in sorted(self.time_to_first_token.items()):
+                dashboard += f"\n- {agent_name}: {seconds:.2f}s"
+        ui = self.ui.stats()
+        events = self.groupchat_manager.events.stats()
+        dashboard += f"\n\nUI: {ui['updates']} updates in {ui['frames']} frames. Events: {events['published']} published, {events['batches']} deliveries"
+        self.dashboard_view.object = dashboard
+        self.update_metrics_view()
+
+    def handle_button_measure_memory(self, event=None):
+        # Walks every object the agents hold, so only on request
+        memory = get_agent_factory().memory_report(self.agents_dict)
+        largest = sorted(((size, key) for key, size in memory.items() if key != "total"), reverse=True)[:3]
+        self.memory_view.object = (f"**Agent memory**: {memory['total'] / 1024:.0f} KB. Largest: "
+                                   + ", ".join(f"{key} {size / 1024:.0f} KB" for size, key in largest))
+
+    def update_metrics_view(self):
+        registry = llm_metrics.get_registry()
+        sections = []
+        for group_by, title in (("agent", "LLM calls by agent"), ("transition", "LLM calls by FSM transition")):
+            table = registry.to_markdown(group_by)
+            if table:
+                sections.append(f"**{title}**\n\n{table}")
+        transitions = fsm_engine.get_transition_timer().to_markdown()
+        if transitions:
+            sections.append(f"**Time per FSM transition**\n\n{transitions}")
+        stats = llm_scheduler.get_scheduler().stats()
+        waits = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in stats["mean_wait"].items())
+        sections.append(f"**LLM scheduler**: {stats['queue_depth']} queued (max {stats['max_queue_depth']}), "
+                        f"{stats['active']} in flight, {stats['rate_limit_retries']} rate-limit retries. Mean wait: {waits}")
+        writes = persistence_worker.get_persistence_worker().stats()
+        sections.append(f"**Persistence**: {writes['queue_depth']} queued (max {writes['max_queue_depth']}), "
+                        f"write p50 {writes['write_p50'] * 1000:.1f} ms, p95 {writes['write_p95'] * 1000:.1f} ms, "
+                        f"{writes['coalesced']} coalesced, {writes['blocked']} blocked ({writes['blocked_seconds']:.2f}s), "
+                        f"{writes['overflowed']} over the limit, "
+                        f"{writes['errors']} errors")
+        lag = event_loop.get_loop_lag_monitor().stats()
+        blocking = event_loop.get_blocking_pool().stats()
+        sections.append(f"**Event loop**: lag p50 {lag['lag_p50'] * 1000:.1f} ms, p95 {lag['lag_p95'] * 1000:.1f} ms, "
+                        f"max {lag['lag_max'] * 1000:.1f} ms. Blocking calls: {blocking['active']} of {blocking['workers']} threads busy, "
+                        f"{blocking['waiting']} waiting, run p95 {blocking['run_p95']:.2f}s")
+        self.metrics_view.object = "\n\n".join(sections)
+
+    def export_metrics_csv(self):
+        return io.StringIO(llm_metrics.get_registry().to_csv())
 
     ########### tab3: Progress
-    def update_progress(self, contents, user):
-        # Parse the agent's output for keywords                 
-        if user == "LevelAdapterAgent":            
-            pattern = re.compile(r'\b(correct|correctly|verified|yes|well done|excellent|successfully|that\'s right|good job|excellent|right|good|affirmative)\b', re.IGNORECASE)            
-            is_correct = pattern.search(contents)
-            if is_correct:
-               print("################ CORRECT ANSWER #################")
-               if self.progress < self.max_questions:  
+    def update_progress(self, events):
+        for event in events:
+            if isinstance(event, MasteryUpdated):
+                self.topic_info.object = f"Working on: {event.topic}" if event.topic else ""
+            elif event.correct:
+                print("################ CORRECT ANSWER #################")
+                if self.progress < self.max_questions:
                     self.progress += 1
-                    self.progress_bar.value = self.progress
-                    self.progress_info.object = f"**{self.progress} out of {self.max_questions}**"
-
             else:
                 print("################ WRONG ANSWER #################")
+        self.ui.schedule("progress", self._draw_progress)
+
+    def _draw_progress(self):
+        self.progress_bar.value = self.progress
+        self.progress_info.object = f"**{self.progress} out of {self.max_questions}**"
 
     ########## Model Tab
     async def handle_button_update_model(self, event=None):
-        self.groupchat_manager.chat_interface = self.model_tab_interface
         await self.a_update_model()
      
     async def a_update_model(self):
         '''
             This is a long latency operation therefore async
         '''
-        if self.groupchat_manager.chat_interface.name is not self.MODEL_TAB_NAME: return
         messages = self.groupchat_manager.groupchat.get_messages()
-        for m in messages:
-            agents.learner_model.send(m, recipient=agents.learner_model, request_reply=False)
-        await agents.learner_model.a_send("What is the student's current capabilities", recipient=agents.learner_model, request_reply=True)
-        response = agents.learner_model.last_message(agent=agents.learner_model)["content"]
-        self.model_tab_interface.send(response, user=agents.learner_model.name,avatar=avatar[agents.learner_model.name])
+        # Only messages since the last refresh are sent, in one request
+        learner_model = self.agents_dict['learner_model']
+        response = await learner_model.a_refresh(messages)
+        self.model_tab_interface.send(response, user=learner_model.name,avatar=avatar[learner_model.name])
 
 
     async def a_model_tab_callback(self, contents: str, user: str, instance: pn.chat.ChatInterface):
         '''
             Receive any input from the ChatInterface of the Model tab
         '''
-        self.groupchat_manager.chat_interface = instance
         if user == "System" or user == "User":
-            response = agents.learner_model.last_message(agent=agents.learner_model)["content"]
-            self.learn_tab_interface.send(response, user=agents.learner_model.name,avatar=avatar[agents.learner_model.name])
+            learner_model = self.agents_dict['learner_model']
+            response = learner_model.learner_state or "The learner model has not been updated yet."
+            self.learn_tab_interface.send(response, user=learner_model.name,avatar=avatar[learner_model.name])
     
 
     ########## Create the "windows" and draw the tabs
     def draw_view(self):         
+        self.button_load_earlier.visible = self.has_earlier_messages
         tabs = pn.Tabs(  
-            ("Learn", pn.Column(self.learn_tab_interface)
+            ("Learn", pn.Column(self.button_load_earlier,
+                                self.learn_tab_interface)
                     ),
-            ("Dashboard", pn.Column(self.dashboard_view)
+            ("Dashboard", pn.Column(self.dashboard_view,
+                                    self.metrics_view,
+                                    self.metrics_download,
+                                    pn.Row(self.button_measure_memory, self.memory_view))
                     ),
             ("Progress", pn.Column(
                     self.progress_text,
                     pn.Row(                        
                         self.progress_bar,
-                        self.progress_info))
+                        self.progress_info),
+                    self.topic_info)
                     ),
+            ("Knowledge Graph", self.knowledge_graph.view_panel()),
             ("Model", pn.Column(
                       pn.Row(self.button_update_learner_model),
                       pn.Row(self.model_tab_interface))
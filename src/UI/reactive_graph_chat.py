@@ -8,19 +8,30 @@ import autogen as autogen
 from src.UI.avatar import avatar
 import src.Agents.agents as agents
 from src import globals as globals
+from src.Models.event_bus import InputRequested, MessagePosted
+from src.Models.event_loop import get_loop_lag_monitor
+from src.UI.ui_batcher import UIUpdateBatcher
+from src.UI.knowledge_graph_explorer import KnowledgeGraphExplorer
 
 class ReactiveGraphChat(param.Parameterized):
-    def __init__(self, groupchat_manager=None, graph_groupchat_manager=None, **params):
+    def __init__(self, groupchat_manager=None, graph_groupchat_manager=None, agents_dict=None, **params):
         super().__init__(**params)
         
         pn.extension(design="material")
 
         self.groupchat_manager = groupchat_manager
+        self.agents_dict = agents.agents_dict if agents_dict is None else agents_dict  # this session's agents
         self.graph_groupchat_manager = graph_groupchat_manager
 
         # Learn tab
         self.GRAPH_TAB_NAME = "GraphTab"
         self.graph_tab_interface = pn.chat.ChatInterface(callback=self.a_graph_tab_callback, name=self.GRAPH_TAB_NAME)
+        self.groupchat_manager.events.subscribe(self.update_graph_tab, MessagePosted, InputRequested)
+        get_loop_lag_monitor().start()
+
+        # Knowledge Graph tab
+        self.ui = UIUpdateBatcher(document=pn.state.curdoc)
+        self.knowledge_graph = KnowledgeGraphExplorer(self.groupchat_manager, self.ui)
 
 
     ############ tab1: Learn interface
@@ -31,28 +42,26 @@ class ReactiveGraphChat(param.Parameterized):
             Then, when update is called, check the instance name
         '''                      
         #self.groupchat_manager.chat_interface = instance
-        if not globals.initiate_chat_task_created:
-            asyncio.create_task(self.groupchat_manager.delayed_initiate_chat(agents.knowledge_tracer, self.groupchat_manager, contents))  
+        if not self.groupchat_manager.initiate_chat_task_created:
+            self.groupchat_manager.start_chat(self.agents_dict["knowledge_tracer"], contents)
         else:
-            if globals.input_future and not globals.input_future.done():                
-                globals.input_future.set_result(contents)                 
-            else:
+            if not self.groupchat_manager.submit_input(contents):
                 print("No input being awaited.")
     
-    def update_graph_tab(self, recipient, messages, sender, config):
-        #if self.groupchat_manager.chat_interface.name is not self.GRAPH_TAB_NAME: return
-        last_content = messages[-1]['content'] 
-        if all(key in messages[-1] for key in ['name']):
-            self.graph_tab_interface.send(last_content, user=messages[-1]['name'], avatar=avatar[messages[-1]['name']], respond=False)
-        else:
-            self.graph_tab_interface.send(last_content, user=recipient.name, avatar=avatar[recipient.name], respond=False)
+    def update_graph_tab(self, events):
+        for event in events:
+            if isinstance(event, InputRequested):
+                self.graph_tab_interface.send(event.prompt, user="System", respond=False)
+            else:
+                self.graph_tab_interface.send(event.message['content'], user=event.user, avatar=avatar[event.user], respond=False)
         
     
        ########## Create the "windows" and draw the tabs
     def draw_view(self):         
         tabs = pn.Tabs(  
             ("Graph", pn.Column(self.graph_tab_interface)
-                    ))
+                    ),
+            ("Knowledge Graph", self.knowledge_graph.view_panel()))
         return tabs
 
     @property
@@ -0,0 +1,33 @@
+####################################################################
+# Session Student
+#
+# Which student a browser session belongs to. ?student=<id> selects
+# a student (panel_cluster's router always adds it); a session
+# opened without one gets a fresh anonymous id, so two anonymous
+# tabs never share a progress file or conversation store rows.
+#####################################################################
+import os
+import re
+import uuid
+
+import panel as pn
+
+
+DEFAULT_STUDENT = "default"  # keeps the original progress.json / graph.json
+
+
+def student_from_request() -> str:
+    student = pn.state.session_args.get("student") if pn.state.session_args else None
+    if student and student[0]:
+        return student[0].decode()
+    return f"anonymous-{uuid.uuid4().hex}"
+
+
+def student_file(path: str, student_id: str) -> str:
+    '''
+        path with the student id added before the extension: progress.json -> progress_<id>.json
+    '''
+    if student_id == DEFAULT_STUDENT:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}_{re.sub(r'[^A-Za-z0-9_-]', '_', student_id)}{extension}"
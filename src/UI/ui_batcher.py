@@ -0,0 +1,106 @@
+####################################################################
+# UI Update Batcher
+#
+# Every agent message used to update the Learn tab, the dashboard and
+# the progress bar at once, each change a separate websocket patch.
+# A burst of agent messages became a burst of small Bokeh document
+# updates, all contending for the session's document lock.
+#
+# One batcher per session collects changes for a frame (FRAME_SECONDS)
+# and applies them together under one document hold, so the browser
+# gets one patch per frame:
+#   post(fn)               runs every time, in order (chat messages)
+#   append_text(key, ...)  ordered too; adjacent texts with the same key
+#                          are joined (streamed tokens)
+#   schedule(key, fn)      runs once per frame with the latest fn, after
+#                          the ordered changes (dashboard, progress)
+#
+# Only used on the event loop. Outside a running loop changes are
+# applied right away.
+#####################################################################
+import asyncio
+import time
+from typing import Callable, Dict, Hashable, List
+
+from panel.io import hold
+
+
+FRAME_SECONDS = 0.05
+
+
+class UIUpdateBatcher:
+    def __init__(self, frame_seconds: float = FRAME_SECONDS, document=None):
+        self.frame_seconds = frame_seconds
+        self.document = document
+        self._ordered: List[List] = []  # [key, fn, texts]. key and texts only for append_text
+        self._latest: Dict[Hashable, Callable[[], None]] = {}
+        self._handle = None
+
+        # Metrics
+        self.frames = 0
+        self.updates = 0
+        self.coalesced = 0
+        self.last_frame_seconds = 0.0
+
+    def post(self, fn: Callable[[], None]) -> None:
+        self._ordered.append([None, fn, None])
+        self._changed()
+
+    def append_text(self, key: Hashable, text: str, fn: Callable[[str], None]) -> None:
+        '''
+            fn(text) in order. Text appended again before the frame, with nothing in between, is joined.
+        '''
+        if self._ordered and self._ordered[-1][0] == key:
+            self._ordered[-1][2].append(text)
+            self.coalesced += 1
+        else:
+            self._ordered.append([key, fn, [text]])
+        self._changed()
+
+    def schedule(self, key: Hashable, fn: Callable[[], None]) -> None:
+        if key in self._latest:
+            self.coalesced += 1
+        self._latest[key] = fn
+        self._changed()
+
+    def _changed(self) -> None:
+        self.updates += 1
+        if self._handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._handle = loop.call_later(self.frame_seconds, self.flush)
+
+    def flush(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        ordered, self._ordered = self._ordered, []
+        latest, self._latest = self._latest, {}
+        if not ordered and not latest:
+            return
+        start = time.perf_counter()
+        with hold(self.document):
+            for key, fn, texts in ordered:
+                if texts is None:
+                    self._apply(fn)
+                else:
+                    self._apply(lambda: fn("".join(texts)))
+            for fn in latest.values():
+                self._apply(fn)
+        self.frames += 1
+        self.last_frame_seconds = time.perf_counter() - start
+
+    def _apply(self, fn: Callable[[], None]) -> None:
+        # One failing update must not drop the rest of the frame
+        try:
+            fn()
+        except Exception as e:
+            print(f"UI update failed: {type(e).__name__}: {e}")
+
+    def stats(self) -> Dict:
+        return {"frames": self.frames, "updates": self.updates, "coalesced": self.coalesced,
+                "last_frame_seconds": self.last_frame_seconds}
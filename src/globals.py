@@ -1,8 +1,12 @@
 # globals.py
+# Only read by the Deprecated UIs. Each session keeps its own on CustomGroupChatManager.
 input_future = None
 initiate_chat_task_created = None
 
 
 MAX_ROUNDS = 300
+MESSAGES_IN_MEMORY = 60  # per history. Older messages spill to disk (see message_history.py)
+HISTORY_PAGE_SIZE = 20   # messages restored and shown when a session resumes. Earlier ones load on request.
+MESSAGES_RENDERED = 60   # chat messages kept in the Learn tab. Older ones move to disk until scrolled back to.
 APP_NAME = "AdaptiveTutor"
 IS_TERMINATION_MSG = "TERMINATE"
\ No newline at end of file